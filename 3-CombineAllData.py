@@ -6,38 +6,43 @@ Citations: The code referenced the notes from class
 """
 
 import numpy as np
-import pandas as pd
 import sys
 import os
-
-def monthly_weather(data):
-    data['year'] = data['date'].dt.year
-    data['month'] = data['date'].dt.month
-    monthly_grouped = data.groupby(['year', 'month', 'city', 'state_or_province']).agg({
-    'temperature_2m_max': 'max',
-    'temperature_2m_min': 'min',
-    'precipitation_sum': 'sum',
-    'wind_speed_10m_max': 'max'
-        }).reset_index()
-    return monthly_grouped
+import argparse
+from common.storage import read_dataset, write_dataset
+from common.weather_aggregation import monthly_weather, stream_monthly_weather
+from common.multi_join import KeyIndex, join_sources, dropped_report
 
 def main():
-    weather_file = "Weather/combined_weather_data.csv"
-    emissions_file = "Emissions/city_emissions_data.csv"
-    population_file = "Population/Population_density.csv"
-    GDP_file = "GDP_Data/GDP_per_Capita_Data.csv"
+    parser = argparse.ArgumentParser(description='Combine the weather, emissions, population and GDP data')
+    parser.add_argument('--stream-weather', action='store_true',
+                        help='aggregate the per-city daily weather files to monthly rows chunk by chunk '
+                             'instead of loading the combined daily weather files')
+    parser.add_argument('--chunksize', type=int, default=100_000, help='daily rows read at a time with --stream-weather')
+    args = parser.parse_args()
+
+    weather_file = "Weather/combined_weather_data"
+    weather_folder = "Weather/weather_data"
+    emissions_file = "Emissions/city_emissions_data"
+    population_file = "Population/Population_density"
+    GDP_file = "GDP_Data/GDP_per_Capita_Data"
     
     #2011 to 2013 data
-    weather_file2013 = "Weather/combined_weather_data_2011_2013.csv"
-    emissions_file2013 = "Emissions/city_emissions_2011_2013.csv"
+    weather_file2013 = "Weather/combined_weather_data_2011_2013"
+    weather_folder2013 = "Weather/weather_data_ML_testing"
+    emissions_file2013 = "Emissions/city_emissions_2011_2013"
     
-    weather_data = pd.read_csv(weather_file,parse_dates=['date'])
-    emissions_data = pd.read_csv(emissions_file,parse_dates=['date'])
-    weather_data2013 = pd.read_csv(weather_file2013,parse_dates=['date'])
-    emissions_data2013 = pd.read_csv(emissions_file2013,parse_dates=['date'])
-    population_data = pd.read_csv(population_file,parse_dates=['date'])
-    GDP_data = pd.read_csv(GDP_file,parse_dates=['date'])
-    data = monthly_weather(weather_data)
+    emissions_data = read_dataset(emissions_file, schema='city_emissions')
+    emissions_data2013 = read_dataset(emissions_file2013, schema='city_emissions')
+    population_data = read_dataset(population_file, schema='population_density')
+    GDP_data = read_dataset(GDP_file, schema='gdp_per_capita')
+    if args.stream_weather:
+        # never holds all the daily rows, only one chunk and the monthly accumulators
+        data = stream_monthly_weather(weather_folder, chunksize=args.chunksize)
+        data2013 = stream_monthly_weather(weather_folder2013, chunksize=args.chunksize)
+    else:
+        data = monthly_weather(read_dataset(weather_file, schema='weather_daily'))
+        data2013 = monthly_weather(read_dataset(weather_file2013, schema='weather_daily'))
     
     population_data.rename(columns={'City': 'city'}, inplace=True)
     GDP_data.rename(columns={'City': 'city'}, inplace=True)
@@ -49,23 +54,18 @@ def main():
     population_data['year'] = population_data['date'].dt.year
     population_data['month'] = population_data['date'].dt.month
     
-    merged_data = pd.merge(data, emissions_data, on=['city', 'year', 'month'], how='inner')
-    merged_data = pd.merge(merged_data, population_data, on=['city', 'year', 'month'], how='inner')
-    merged_data = pd.merge(merged_data, GDP_data, on=['city', 'year', 'month'], how='inner')
+    # Population and GDP are indexed once and reused for both periods, every period is joined in one pass
+    population_index = KeyIndex('population', population_data,
+                                {'date': 'date', 'Population': 'Population', 'Area(km^2)': 'Area(km^2)',
+                                 'Population Density': 'Population Density'})
+    GDP_index = KeyIndex('GDP', GDP_data, {'GDP per Capita': 'GDP per Capita'})
 
-    
-    merged_data.drop(['date_x', 'Year', 'Month', 'State'], axis=1, inplace=True)
-    merged_data.rename(columns={'date_y': 'date'}, inplace=True)
-
-    merged_data.to_csv('Combined_Data.csv', index=False)
-    
-    data2013 = monthly_weather(weather_data2013)
-    merged_data2013 = pd.merge(data2013, emissions_data2013, on=['city', 'year', 'month'], how='inner')
-    merged_data2013 = pd.merge(merged_data2013, population_data, on=['city', 'year', 'month'], how='inner')
-    merged_data2013 = pd.merge(merged_data2013, GDP_data, on=['city', 'year', 'month'], how='inner')
-    merged_data2013.drop(['date_x', 'Year', 'Month', 'State'], axis=1, inplace=True)
-    merged_data2013.rename(columns={'date_y': 'date'}, inplace=True)
-    merged_data2013.to_csv('Combined_Data_2011_2013.csv', index=False)
+    for name, weather_data, emissions, output in [('2000-2010', data, emissions_data, 'Combined_Data'),
+                                                  ('2011-2013', data2013, emissions_data2013, 'Combined_Data_2011_2013')]:
+        emissions_index = KeyIndex('emissions', emissions, {'megatonnes CO2': 'megatonnes CO2'})
+        merged_data, dropped = join_sources(weather_data, [emissions_index, population_index, GDP_index])
+        print(dropped_report(name, len(weather_data), len(merged_data), dropped))
+        write_dataset(merged_data, output, schema='combined')
 
 
 if __name__ == '__main__':
@@ -3,43 +3,62 @@ import pandas as pd
 import matplotlib.pyplot as plt
 import sys
 import os
+import argparse
+from concurrent.futures import ProcessPoolExecutor
 from shared import state_abbv_map, province_abbv_map
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.excel_cache import read_excel_cached, cache_stats, add_cache_stats, cache_report
 
 YEAR_ROW = 2
 TRANSPORTATION_TOTAL_ROW = 25
 
-# Reads all of the raw state data files, extracts the relevant fields and puts it into a nice dataframe
-def extract_state_data(state_data_path):
-    all_state_data = None
-    for file in sorted(os.scandir(state_data_path), key=lambda f: f.name):
-        # determine the state from the file name
-        state = file.name.split('.')[0].title()
-        state_abbv = state_abbv_map[state]
-
-        # read the state data
-        state_data = pd.read_excel(file)
-
-        # extract the years and Transportation Sector (best estimate for vehicle emissions)
-        narrowed_data = state_data.iloc[[YEAR_ROW, TRANSPORTATION_TOTAL_ROW]]
-
-        # drop the first two columns since they are labels in the excel sheet
-        data = narrowed_data.drop(axis=1, columns=narrowed_data.columns[[0, 1]])
-        
-        # pivot the data to use the years and co2 measures as the columns, and add state
-        data = data.transpose()
-        data.columns = ['year', 'megatonnes CO2']
-        data['year'] = data['year'].apply(np.int64)
-        data = data.reset_index()
-        data = data.drop(axis=1, columns=data.columns[[0]])
-        data['state'] = state_abbv
-
-        # rearrange the data and add it to the big list
-        data = data[['state', 'year', 'megatonnes CO2']]
-        if all_state_data is None:
-            all_state_data = data
-        else:
-            all_state_data = pd.concat([all_state_data, data])
-    return all_state_data
+# Reads a single raw state data file and extracts the year and Transportation Sector rows into a nice dataframe.
+# Only the rows up to the transportation total are parsed, the rest of the sheet is never read.
+def read_state_file(file_path):
+    # determine the state from the file name
+    state = os.path.basename(file_path).split('.')[0].title()
+    state_abbv = state_abbv_map[state]
+
+    # read the state data
+    state_data = read_excel_cached(file_path, nrows=TRANSPORTATION_TOTAL_ROW + 1)
+
+    # extract the years and Transportation Sector (best estimate for vehicle emissions)
+    narrowed_data = state_data.iloc[[YEAR_ROW, TRANSPORTATION_TOTAL_ROW]]
+
+    # drop the first two columns since they are labels in the excel sheet
+    data = narrowed_data.drop(axis=1, columns=narrowed_data.columns[[0, 1]])
+    
+    # pivot the data to use the years and co2 measures as the columns, and add state
+    data = data.transpose()
+    data.columns = ['year', 'megatonnes CO2']
+    data['year'] = data['year'].apply(np.int64)
+    data = data.reset_index()
+    data = data.drop(axis=1, columns=data.columns[[0]])
+    data['state'] = state_abbv
+
+    # rearrange the data
+    return data[['state', 'year', 'megatonnes CO2']]
+
+# Runs in the worker processes, the Excel cache hits/misses are sent back so the main process can report them
+def _read_state_file_with_stats(file_path):
+    before = cache_stats()
+    data = read_state_file(file_path)
+    return data, {name: count - before[name] for name, count in cache_stats().items()}
+
+# Reads all of the raw state data files, extracts the relevant fields and puts it into a nice dataframe.
+# The workbooks are independent so they are parsed on a pool of worker processes (workers=1 reads them
+# in this process). Results come back in file name order and are concatenated once at the end.
+def extract_state_data(state_data_path, workers=None):
+    files = [file.path for file in sorted(os.scandir(state_data_path), key=lambda f: f.name)]
+    if workers == 1:
+        state_frames = [read_state_file(file) for file in files]
+    else:
+        state_frames = []
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for data, stats in executor.map(_read_state_file_with_stats, files):
+                state_frames.append(data)
+                add_cache_stats(stats)
+    return pd.concat(state_frames)
 
 def extract_province_data(province_data_file):
     # Read in the data file
@@ -59,12 +78,17 @@ def extract_province_data(province_data_file):
     return data
 
 def main():
+    parser = argparse.ArgumentParser(description='Extract the state and province emissions data')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='processes used to read the state workbooks (default: one per CPU, 1 to read serially)')
+    args = parser.parse_args()
+
     # The state emissions data consists of 50 files, one for each state
     # So we need to read them one by one, extract the relevant data/fields
     # And save them to a more usable format
     # to read the xlsx files with Pandas you need to pip install openpyxl
     state_data_path = './state_emissions_data/'
-    state_yearly_emission_data = extract_state_data(state_data_path)
+    state_yearly_emission_data = extract_state_data(state_data_path, workers=args.workers)
 
     # The province emissions data on the other hand is a single csv file.
     # Therefore, we just need to load it, filter down the table and we'll
@@ -80,6 +104,7 @@ def main():
         os.mkdir('./extracted_data/')
     state_yearly_emission_data.to_csv('./extracted_data/state_emission_data.csv', index=False)
     province_yearly_emission_data.to_csv('./extracted_data/province_emission_data.csv', index=False)
+    print(cache_report())
 
 
 if __name__ == '__main__':
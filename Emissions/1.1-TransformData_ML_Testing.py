@@ -4,6 +4,9 @@ import matplotlib.pyplot as plt
 import sys
 import os
 from shared import state_abbv_map, province_abbv_map
+from population_scaling import scale_using_population, map_region_to_city
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.storage import read_dataset, write_dataset
 
 def read_state_province_population_data(population_file):
     # Read the combined state/province population file
@@ -16,40 +19,6 @@ def read_state_province_population_data(population_file):
     )
     return pop_data
 
-
-def interpolate_monthly(data, state_or_province, interpolate_field, starting_month='01'):
-    interpolated_data = []
-    for name, group in data.groupby(state_or_province):
-        group['date'] = pd.to_datetime(group['year'].astype(str) + f'-{starting_month}-01')
-        group.set_index('date', inplace=True)
-        monthly_index = pd.date_range(start=group.index.min(), end=group.index.max(), freq='MS')
-        group = group.reindex(monthly_index)
-        group[state_or_province] = name  # Fill NaN values
-        group[interpolate_field] = group[interpolate_field].interpolate(method='time')
-        group.reset_index(inplace=True)
-        group.rename(columns={'index': 'date'}, inplace=True)
-        group['year'] = group['date'].dt.year
-        group['month'] = group['date'].dt.month
-        interpolated_data.append(group)
-    return pd.concat(interpolated_data, ignore_index=True)
-
-def scale_using_population(row, city_pop_data, national_pop_data, state_or_province):
-    city_col = 'city' if 'city' in city_pop_data.columns else 'City'
-
-    city_cond = (city_pop_data[city_col] == row['city']) & (city_pop_data['date'] == row['date'])
-    if city_cond.sum() == 0:
-        raise ValueError(f"No matching city population data for city: {row['city']}, date: {row['date']}")
-    city_pop = city_pop_data.loc[city_cond, 'Population'].values[0]
-
-    state_cond = (national_pop_data['state_province'] == row[state_or_province]) & \
-                 (national_pop_data['date'] == row['date'])
-    if state_cond.sum() == 0:
-        raise ValueError(f"No matching state population data for state/province: {row[state_or_province]}, date: {row['date']}")
-    state_pop = national_pop_data.loc[state_cond, 'population'].values[0]
-
-    return row['megatonnes CO2'] * (city_pop / state_pop)
-
-
 def transform_to_cities(emissions_data, cities_data, city_population_data, state_province_population_data, region_col):
     print("Emissions Data Columns:", emissions_data.columns)
     print("Cities Data Columns:", cities_data.columns)
@@ -57,16 +26,16 @@ def transform_to_cities(emissions_data, cities_data, city_population_data, state
     if region_col not in emissions_data.columns:
         raise ValueError(f"Expected region column '{region_col}' not found in emissions data")
 
-    emissions_data['city'] = emissions_data[region_col].apply(
-        lambda x: cities_data[cities_data[region_col] == x].index[0]
-    )
-    emissions_data['megatonnes CO2'] = emissions_data.apply(scale_using_population, axis=1,
-        args=(city_population_data, state_province_population_data, region_col))
+    emissions_data['city'] = map_region_to_city(emissions_data[region_col], cities_data, region_col)
+    city_col = 'city' if 'city' in city_population_data.columns else 'City'
+    emissions_data['megatonnes CO2'] = scale_using_population(
+        emissions_data, city_population_data, state_province_population_data, region_col,
+        national_key='state_province', national_value='population', city_key=city_col)
     return emissions_data[['date', 'city', 'megatonnes CO2', 'year', 'month']]
 
 def plot_city_emissions(new_emissions_file, original_emissions_file, city_name):
-    new_data = pd.read_csv(new_emissions_file, parse_dates=['date'])
-    original_data = pd.read_csv(original_emissions_file, parse_dates=['date'])
+    new_data = read_dataset(new_emissions_file, schema='city_emissions')
+    original_data = read_dataset(original_emissions_file, schema='city_emissions')
     
     new_city_data = new_data[new_data['city'] == city_name]
     original_city_data = original_data[original_data['city'] == city_name]
@@ -113,10 +82,10 @@ def main():
     )
 
     combined_city_emissions = pd.concat([us_city_emissions, canada_city_emissions])
-    combined_city_emissions.to_csv('city_emissions_2011_2013.csv', index=False)
+    write_dataset(combined_city_emissions, 'city_emissions_2011_2013', schema='city_emissions')
     print("City emissions data for 2011–2013 has been processed and saved.")
 
-    plot_city_emissions('./city_emissions_2011_2013.csv', './city_emissions_data.csv', city_name='Edmonton')
+    plot_city_emissions('./city_emissions_2011_2013', './city_emissions_data', city_name='Edmonton')
 
 
 if __name__ == '__main__':
@@ -0,0 +1,80 @@
+import numpy as np
+import pandas as pd
+import argparse
+import time
+from population_scaling import scale_using_population, scale_using_population_rowwise
+
+# Current project size: 60 capital cities (50 states + 10 provinces), monthly for 2000-2010
+BASE_CITY_COUNT = 60
+MONTHS = pd.date_range('2000-01-01', '2010-12-01', freq='MS')
+
+# Builds emissions and population frames shaped like the real ones for scale * 60 cities.
+# Each state/province gets `scale` cities so both population frames grow with the city count.
+def make_synthetic_data(scale, seed=0):
+    rng = np.random.default_rng(seed)
+    regions = [f'R{r:03d}' for r in range(BASE_CITY_COUNT)]
+    cities = [f'City {r:03d}-{c:03d}' for r in range(BASE_CITY_COUNT) for c in range(scale)]
+    city_regions = np.repeat(regions, scale)
+
+    dates = np.tile(MONTHS.values, len(cities))
+    emissions_data = pd.DataFrame({
+        'date': dates,
+        'city': np.repeat(cities, len(MONTHS)),
+        'state': np.repeat(city_regions, len(MONTHS)),
+        'megatonnes CO2': rng.uniform(1, 50, len(dates)),
+    })
+    city_pop_data = pd.DataFrame({
+        'date': dates,
+        'City': emissions_data['city'],
+        'Population': rng.uniform(3e4, 3e6, len(dates)),
+    })
+    state_pop_data = pd.DataFrame({
+        'date': np.tile(MONTHS.values, len(regions)),
+        'state': np.repeat(regions, len(MONTHS)),
+        'value': rng.integers(5e5, 4e7, len(regions) * len(MONTHS)),
+    })
+    # shuffle the population frames so the join cannot rely on both sides already being aligned
+    city_pop_data = city_pop_data.sample(frac=1, random_state=seed).reset_index(drop=True)
+    state_pop_data = state_pop_data.sample(frac=1, random_state=seed).reset_index(drop=True)
+    return emissions_data, city_pop_data, state_pop_data
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare row-wise and vectorized population scaling')
+    parser.add_argument('--scales', type=int, nargs='+', default=[1, 10, 100],
+                        help='multiples of the current 60-city count to benchmark')
+    parser.add_argument('--rowwise-sample', type=int, default=500,
+                        help='rows timed with the row-wise version, extrapolated to the full frame '
+                             '(its per-row cost is constant for a given population frame size)')
+    args = parser.parse_args()
+
+    results = []
+    for scale in args.scales:
+        emissions_data, city_pop_data, state_pop_data = make_synthetic_data(scale)
+        n_rows = len(emissions_data)
+
+        start = time.perf_counter()
+        vectorized = scale_using_population(emissions_data, city_pop_data, state_pop_data, 'state')
+        vectorized_time = time.perf_counter() - start
+
+        sample = emissions_data.sample(n=min(args.rowwise_sample, n_rows), random_state=0)
+        start = time.perf_counter()
+        rowwise = sample.apply(scale_using_population_rowwise, axis=1,
+            args=(city_pop_data, state_pop_data, 'state'))
+        rowwise_time = (time.perf_counter() - start) * n_rows / len(sample)
+
+        if not np.allclose(rowwise.values, vectorized.loc[sample.index].values, rtol=1e-12, atol=0):
+            raise AssertionError(f'Vectorized scaling does not match the row-wise version at {scale}x')
+
+        results.append({
+            'cities': BASE_CITY_COUNT * scale,
+            'rows': n_rows,
+            'rowwise_seconds (extrapolated)': rowwise_time,
+            'vectorized_seconds': vectorized_time,
+            'speedup': rowwise_time / vectorized_time,
+        })
+        print(f'{scale}x done')
+
+    print(pd.DataFrame(results).to_string(index=False))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+import numpy as np
+import pandas as pd
+
+
+class MissingPopulationError(ValueError):
+    # Raised once with every (city, date) and (state/province, date) pair that has no population,
+    # instead of stopping at the first bad row like the row-wise lookup did
+    def __init__(self, missing_city, missing_region, state_or_province):
+        self.missing_city = missing_city
+        self.missing_region = missing_region
+        lines = []
+        if len(missing_city) > 0:
+            lines.append(f'No matching city population data for {len(missing_city)} (city, date) pairs:')
+            lines += [f'  city: {city}, date: {date}' for city, date in missing_city.itertuples(index=False)]
+        if len(missing_region) > 0:
+            lines.append(f'No matching {state_or_province} population data for {len(missing_region)} '
+                         f'({state_or_province}, date) pairs:')
+            lines += [f'  {state_or_province}: {region}, date: {date}'
+                      for region, date in missing_region.itertuples(index=False)]
+        super().__init__('\n'.join(lines))
+
+
+# Original per-row version, kept as the reference implementation for the benchmark.
+# Scale using a ratio of City population / State population, for a given date
+def scale_using_population_rowwise(row, city_pop_data, national_pop_data, state_or_province,
+                                   national_key=None, national_value='value', city_key='City'):
+    national_key = national_key or state_or_province
+    city_cond = (city_pop_data[city_key] == row['city']) & (city_pop_data['date'] == row['date'])
+    city_pop = city_pop_data.loc[city_cond, 'Population'].values[0]
+    state_cond = (national_pop_data[national_key] == row[state_or_province]) \
+        & (national_pop_data['date'] == row['date'])
+    state_pop = national_pop_data.loc[state_cond, national_value].values[0]
+    return row['megatonnes CO2'] * (city_pop / state_pop)
+
+
+# Map every state/province to its capital city in one lookup instead of filtering cities_data per row
+def map_region_to_city(regions, cities_data, state_or_province):
+    region_to_city = pd.Series(cities_data.index, index=cities_data[state_or_province]).dropna()
+    region_to_city = region_to_city[~region_to_city.index.duplicated()] # first city wins, like .index[0]
+    cities = regions.map(region_to_city)
+    if cities.isna().any():
+        missing = sorted(regions[cities.isna()].unique())
+        raise KeyError(f'No city found for {state_or_province}: {missing}')
+    return cities
+
+
+# Scale all rows at once using a ratio of City population / State population, for a given date.
+# The population frames are joined on (city, date) and (state/province, date) in a single pass
+# rather than scanned twice per row, and every missing population is reported together.
+def scale_using_population(data, city_pop_data, national_pop_data, state_or_province,
+                           national_key=None, national_value='value', city_key='City'):
+    national_key = national_key or state_or_province
+
+    # only the first match is used by the row-wise lookup (.values[0]), so drop duplicate keys the same way
+    city_pop = city_pop_data[[city_key, 'date', 'Population']] \
+        .drop_duplicates(subset=[city_key, 'date']) \
+        .rename(columns={city_key: 'city', 'Population': 'city_pop'})
+    state_pop = national_pop_data[[national_key, 'date', national_value]] \
+        .drop_duplicates(subset=[national_key, 'date']) \
+        .rename(columns={national_key: state_or_province, national_value: 'state_pop'})
+
+    # left joins keep the row order of data, and the deduplicated keys keep the row count
+    joined = data[['city', state_or_province, 'date']].reset_index(drop=True)
+    joined = joined.merge(city_pop, on=['city', 'date'], how='left')
+    joined = joined.merge(state_pop, on=[state_or_province, 'date'], how='left')
+
+    missing_city = joined.loc[joined['city_pop'].isna(), ['city', 'date']].drop_duplicates()
+    missing_region = joined.loc[joined['state_pop'].isna(), [state_or_province, 'date']].drop_duplicates()
+    if len(missing_city) > 0 or len(missing_region) > 0:
+        raise MissingPopulationError(missing_city, missing_region, state_or_province)
+
+    ratio = joined['city_pop'].to_numpy(dtype=np.float64) / joined['state_pop'].to_numpy(dtype=np.float64)
+    return pd.Series(data['megatonnes CO2'].to_numpy(dtype=np.float64) * ratio, index=data.index)
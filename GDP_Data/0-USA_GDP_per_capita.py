@@ -1,34 +1,20 @@
 import pandas as pd
 import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.interpolation import interpolate_monthly
+from common.excel_cache import read_excel_cached, cache_report
 
 
 file_directory = "USA/"
 MAX_YEAR = 2015
 MIN_YEAR = 2000
 
-
-def interpolate_monthly_data(data):
-    interpolated_data = []
-
-    for city, group in data.groupby('City'):
-        group['date'] = pd.to_datetime(group['Year'].astype(str) + '-01-01')
-        group.set_index('date', inplace=True)
-        monthly_index = pd.date_range(start=group.index.min(), end=group.index.max(), freq='MS')
-        group = group.reindex(monthly_index)
-        group['City'] = city
-        group['GDP per Capita'] = group['GDP per Capita'].interpolate(method='linear')
-        group.reset_index(inplace=True)
-        group.rename(columns={'index': 'date'}, inplace=True)
-        group['Year'] = group['date'].dt.year
-        group['Month'] = group['date'].dt.month
-        interpolated_data.append(group)
-    return pd.concat(interpolated_data, ignore_index=True)
-
 def process_file(file_path, city_name): 
     if file_path.endswith('.csv'):
         data = pd.read_csv(file_path)
     elif file_path.endswith('.xlsx'):
-        data = pd.read_excel(file_path)
+        data = read_excel_cached(file_path)
     else:
         print(f"Skipping unsupported file format: {file_path}")
         return None
@@ -53,7 +39,7 @@ def process_file(file_path, city_name):
             data = pd.concat([new_row, data]).sort_values(by='Year').reset_index(drop=True)
         
         
-    interpolated_data = interpolate_monthly_data(data)
+    interpolated_data = interpolate_monthly(data, 'City', 'GDP per Capita', year_col='Year', month_col='Month')
     return interpolated_data
 
 
@@ -70,6 +56,7 @@ allData =  handle_Directory(file_directory)
 allData = allData[(allData['Year'] >= MIN_YEAR) & (allData['Year'] <= MAX_YEAR)]
 allData.drop(['Date'], axis=1, inplace=True)
 allData.to_csv('GDP_per_Capita_USA.csv', index=False)
+print(cache_report())
 
         
        
@@ -1,5 +1,9 @@
 import pandas as pd
 import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.interpolation import interpolate_monthly
+from common.excel_cache import read_excel_cached, cache_report
 
 file_directory = "Canada/"
 MAX_YEAR = 2015
@@ -7,35 +11,13 @@ MIN_YEAR = 2000
 
 pop_file = "../Population/state_province_population.csv"
 
-
-
-
-
-def interpolate_monthly_data(data):
-    interpolated_data = []
-
-    for city, group in data.groupby('city'):
-        group['date'] = pd.to_datetime(group['year'].astype(str) + '-01-01')
-        group.set_index('date', inplace=True)
-        monthly_index = pd.date_range(start=group.index.min(), end=group.index.max(), freq='MS')
-        group = group.reindex(monthly_index)
-        group['city'] = city
-        group['GDP'] = group['GDP'].interpolate(method='linear')
-        group.reset_index(inplace=True)
-        group.rename(columns={'index': 'date'}, inplace=True)
-        group['year'] = group['date'].dt.year
-        group['month'] = group['date'].dt.month
-        interpolated_data.append(group)
-    return pd.concat(interpolated_data, ignore_index=True)
-
-
 pop_data = pd.read_csv(pop_file)
 pop_data.drop(['date', 'abr', 'state_province'], axis=1, inplace=True)
 
 
 
 def process_file(file_path, city_name): 
-    data = pd.read_excel(
+    data = read_excel_cached(
         file_path,
         sheet_name=1,       # Read from the second sheet
         skiprows=5,         # Skip the first 5 rows
@@ -62,7 +44,7 @@ def process_file(file_path, city_name):
         })
         data = pd.concat([new_row, data]).sort_values(by='year').reset_index(drop=True)
         
-    interpolated_data = interpolate_monthly_data(data)
+    interpolated_data = interpolate_monthly(data, 'city', 'GDP')
     data = pd.merge(interpolated_data, pop_data, on=['city', 'year','month'], how='inner')
     data['GDP per Capita']= (data['GDP']/data['population']) * 0.72
     return data
@@ -81,4 +63,5 @@ def handle_Directory(dir_path):
 allData =  handle_Directory(file_directory)
 allData.drop(['Date','GDP','population'], axis=1, inplace=True)
 allData = allData[(allData['year'] >= MIN_YEAR) & (allData['year'] <= MAX_YEAR)]
-allData.to_csv('GDP_per_Capita_Canada.csv', index=False)
\ No newline at end of file
+allData.to_csv('GDP_per_Capita_Canada.csv', index=False)
+print(cache_report())
\ No newline at end of file
@@ -1,4 +1,8 @@
 import pandas as pd
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.storage import write_dataset
 
 canada_data = "GDP_per_Capita_Canada.csv"
 usa_data = "GDP_per_Capita_USA.csv"
@@ -9,4 +13,4 @@ data2.rename(columns={'Year': 'year'}, inplace=True)
 data2.rename(columns={'Month': 'month'}, inplace=True)
 data = pd.concat([data2, data],ignore_index=True)
 
-data.to_csv('GDP_per_Capita_Data.csv', index=False)
\ No newline at end of file
+write_dataset(data, 'GDP_per_Capita_Data', schema='gdp_per_capita')
\ No newline at end of file
@@ -1,9 +1,13 @@
-import pandas as pd
 import matplotlib.pyplot as plt
 import numpy as np
+import os
+import sys
+import argparse
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.storage import read_dataset
 from sklearn.linear_model import LinearRegression, MultiTaskElasticNet, ElasticNet, SGDRegressor, RidgeCV, Ridge, Lasso, BayesianRidge, HuberRegressor
 from sklearn.neighbors import KNeighborsRegressor
-from sklearn.ensemble import RandomForestRegressor, AdaBoostRegressor, GradientBoostingRegressor, VotingRegressor, StackingRegressor
+from sklearn.ensemble import RandomForestRegressor, AdaBoostRegressor
 from sklearn.neural_network import MLPRegressor
 from sklearn.preprocessing import MinMaxScaler, StandardScaler
 from sklearn.svm import SVR, NuSVR, LinearSVR
@@ -12,11 +16,26 @@ from sklearn.gaussian_process import GaussianProcessRegressor
 from sklearn.multioutput import MultiOutputRegressor
 from sklearn.model_selection import train_test_split
 from sklearn.pipeline import make_pipeline
+from boosting import BOOSTING_BACKENDS, gradient_boosting
+from model_zoo import evaluate_models, stacking_result, voting_result, results_table
+
+MODEL_COLUMNS = ['year', 'month', 'megatonnes CO2', 'GDP per Capita', 'temperature_2m_max', 'temperature_2m_min']
+# models combined by the VotingRegressor and stacking models
+ENSEMBLE_MEMBERS = ['KNeighbors Regressor', 'RandomForestRegressor', 'GradientBoostingRegressor']
 
 def main():
-    # Read in the data from the combined data csv
-    combined_data_path = '../Combined_Data.csv'
-    data = pd.read_csv(combined_data_path)
+    parser = argparse.ArgumentParser(description='Train and score every candidate regression model')
+    parser.add_argument('--boosting', choices=BOOSTING_BACKENDS, default='exact',
+                        help='GradientBoosting backend used alone and in the stacking and voting models (see boosting.py)')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='models fitted at the same time (default: one per core), each gets cores / workers threads')
+    parser.add_argument('--output', default='Model_Comparison.csv',
+                        help='results table: fit/predict seconds, peak RSS, pickled size and train/valid/test R² per model')
+    args = parser.parse_args()
+
+    # Read in the features and targets from the combined data
+    combined_data_path = '../Combined_Data'
+    data = read_dataset(combined_data_path, columns=MODEL_COLUMNS, schema='combined')
 
     # Extract the X and y data, X = input features, y = output values
     X = data[['year', 'month', 'megatonnes CO2', 'GDP per Capita']]
@@ -27,6 +46,12 @@ def main():
     # Split the dataset into training and validation sets
     X_train, X_valid, y_train, y_valid = train_test_split(X, y, train_size=0.8) # 80% training data, 20% validation data
 
+    # The models are also scored on the data from 2011-2013
+    test_data_path = '../Combined_Data_2011_2013'
+    test_data = read_dataset(test_data_path, columns=MODEL_COLUMNS, schema='combined')
+    X_test = test_data[['year', 'month', 'megatonnes CO2', 'GDP per Capita']]
+    y_test = test_data[['temperature_2m_max', 'temperature_2m_min']]
+
     # Instantiate our models to figure out which one best responds to our data
     models = [
         {
@@ -83,17 +108,7 @@ def main():
             'name': 'GradientBoostingRegressor',
             'model': make_pipeline(
                 MinMaxScaler(),
-                MultiOutputRegressor(GradientBoostingRegressor(
-                    n_estimators=700, 
-                    subsample=0.9, 
-                    min_samples_split=2, 
-                    min_samples_leaf=1, 
-                    max_features=None, 
-                    max_depth=20, 
-                    loss='absolute_error', 
-                    learning_rate=0.1, 
-                    criterion='friedman_mse'
-                ))
+                MultiOutputRegressor(gradient_boosting(args.boosting))
             )
         },
         {
@@ -142,86 +157,19 @@ def main():
         }
     ]
 
-    # Train and score each model
-    for m in models:
-        model = m['model']
-        model.fit(X_train, y_train)
-        name = m['name']
-        print(f'{name} training score: {model.score(X_train, y_train)}')
-        print(f'{name} validation score: {model.score(X_valid, y_valid)}')
-        print(' ')
-
-    # Part 2: Test combining the models in a VotingRegressor and StackingRegressor
-    # StackingRegressor testing
-    estimators = [
-        ('kneighbors', KNeighborsRegressor(n_neighbors=3, algorithm='auto', leaf_size=5, p=1, weights='distance')),
-        ('randomforest', RandomForestRegressor(
-            n_estimators=900, 
-            max_depth=30, 
-            max_features=None, 
-            min_samples_leaf=1, 
-            min_samples_split=2
-        )),
-        ('gradientboosting', GradientBoostingRegressor(
-            n_estimators=700, 
-            subsample=0.9, 
-            min_samples_split=2, 
-            min_samples_leaf=1, 
-            max_features=None, 
-            max_depth=20, 
-            loss='absolute_error', 
-            learning_rate=0.1, 
-            criterion='friedman_mse'
-        ))
-    ]
-    stacking_model = make_pipeline(
-        MinMaxScaler(),
-        MultiOutputRegressor(StackingRegressor(
-            estimators=estimators,
-            final_estimator=LinearRegression(),
-            cv=5, # default cross validation
-            n_jobs=-1, # train models in parallel
-            passthrough=False # passthrough the training data for the final estimator
-        ))
-    )
-    stacking_model.fit(X_train, y_train)
-    print(f'StackingRegressor training score: {stacking_model.score(X_train, y_train)}')
-    print(f'StackingRegressor validation score: {stacking_model.score(X_valid, y_valid)}')
-    print(' ')
+    # Train and score each model, several at a time (see model_zoo.py)
+    # Part 2: the VotingRegressor and stacking models are built from the fitted KNN, RandomForest and
+    # GradientBoosting models above instead of fitting them again
+    data = {'train': (X_train, y_train), 'valid': (X_valid, y_valid), 'test': (X_test, y_test)}
+    results, out_of_fold = evaluate_models({m['name']: m['model'] for m in models}, data,
+                                           members=ENSEMBLE_MEMBERS, workers=args.workers)
+    results['StackingRegressor'] = stacking_result('StackingRegressor', ENSEMBLE_MEMBERS, results, out_of_fold, y_train)
+    results['VotingRegressor'] = voting_result('VotingRegressor', ENSEMBLE_MEMBERS, results)
 
-    # VotingRegressor testing
-    estimators = [
-        ('kneighbors', KNeighborsRegressor(n_neighbors=3, algorithm='auto', leaf_size=5, p=1, weights='distance')),
-        ('randomforest', RandomForestRegressor(
-            n_estimators=900, 
-            max_depth=30, 
-            max_features=None, 
-            min_samples_leaf=1, 
-            min_samples_split=2
-        )),
-        ('gradientboosting', GradientBoostingRegressor(
-            n_estimators=700, 
-            subsample=0.9, 
-            min_samples_split=2, 
-            min_samples_leaf=1, 
-            max_features=None, 
-            max_depth=20, 
-            loss='absolute_error', 
-            learning_rate=0.1, 
-            criterion='friedman_mse'
-        ))
-    ]
-    voting_model = make_pipeline(
-        MinMaxScaler(),
-        MultiOutputRegressor(VotingRegressor(
-            estimators=estimators,
-            n_jobs=-1
-        ))
-    )
-    voting_model.fit(X_train, y_train)
-    print(f'VotingRegressor training score: {voting_model.score(X_train, y_train)}')
-    print(f'VotingRegressor validation score: {voting_model.score(X_valid, y_valid)}')
-    print(' ')
+    names = [m['name'] for m in models] + ['StackingRegressor', 'VotingRegressor']
+    table = results_table([results[name] for name in names], data)
+    print(table.to_string(index=False, float_format=lambda value: f'{value:.4f}'))
+    table.to_csv(args.output, index=False)
 
 if __name__ == '__main__':
     main()
@@ -1,44 +1,98 @@
-import pandas as pd
 import matplotlib.pyplot as plt
 import numpy as np
+import os
+import sys
+import time
+import argparse
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.storage import read_dataset
 from sklearn.linear_model import LinearRegression, RidgeCV
 from sklearn.neighbors import KNeighborsRegressor
-from sklearn.ensemble import RandomForestRegressor, GradientBoostingRegressor, StackingRegressor
+from sklearn.ensemble import RandomForestRegressor, GradientBoostingRegressor
 from sklearn.preprocessing import MinMaxScaler
 from sklearn.multioutput import MultiOutputRegressor
 from sklearn.model_selection import train_test_split, GridSearchCV, RandomizedSearchCV
 from sklearn.pipeline import make_pipeline
 from scipy.stats import randint
+from tuning import SAMPLES, TrialLog, budgeted_search
+from stacking import MultiOutputStackingRegressor
 
-# WARNING: THIS WILL TAKE A WHILE TO RUN!!!
-def main():
-    # Read in the data from the combined data csv
-    combined_data_path = '../Combined_Data.csv'
-    data = pd.read_csv(combined_data_path)
+# WARNING: THIS WILL TAKE A WHILE TO RUN!!! (use --search hyperband or halving with --time-budget for a quicker search)
+MODEL_COLUMNS = ['year', 'month', 'megatonnes CO2', 'GDP per Capita', 'temperature_2m_max', 'temperature_2m_min']
 
-    # Extract the X and y data, X = input features, y = output values
-    X = data[['year', 'month', 'megatonnes CO2', 'GDP per Capita']]
-    y = data[['temperature_2m_max', 'temperature_2m_min']] # regress on two values
-
-    # Split the dataset into training and validation sets
-    X_train, X_valid, y_train, y_valid = train_test_split(X, y, train_size=0.8) # 80% training data, 20% validation data
+RANDOM_FOREST_GRID = {
+    'randomforestregressor__n_estimators': [400, 500, 600, 700, 800, 900],
+    'randomforestregressor__max_depth': [5, 10, 15, 20, 25, 30, None],
+    'randomforestregressor__min_samples_leaf': [1, 3, 5, 10, 15, 20],
+    'randomforestregressor__min_samples_split': [2, 5, 10, 15, 20, 30],
+    'randomforestregressor__max_features': ['sqrt', 'log2', None]
+}
+KNEIGHBORS_GRID = {
+    'kneighborsregressor__n_neighbors': [1, 3, 5, 8, 10, 11, 12, 13, 14, 15, 18, 20, 25, 30, 35, 40, 50],
+    'kneighborsregressor__weights': ['uniform', 'distance'],
+    # algorithm and leaf_size are not searched: every exact algorithm finds the same neighbours, they only change
+    # how fast (python benchmark_neighbors.py), and searching them made the grid 32 times larger
+    'kneighborsregressor__p': [1, 2]
+}
+GRADIENT_BOOSTING_GRID = {
+    'multioutputregressor__estimator__n_estimators': [600, 700, 800, 900, 1000],
+    'multioutputregressor__estimator__max_depth': [1, 3, 5, 10, 15, 20],
+    'multioutputregressor__estimator__loss': ['squared_error', 'absolute_error', 'huber', 'quantile'],
+    'multioutputregressor__estimator__learning_rate': [0.1, 0.2, 0.05],
+    'multioutputregressor__estimator__subsample': [0.8, 0.9, 1.0],
+    'multioutputregressor__estimator__criterion': ['friedman_mse', 'squared_error'],
+    'multioutputregressor__estimator__min_samples_split': [2, 5, 10, 15, 20, 30],
+    'multioutputregressor__estimator__min_samples_leaf': [1, 3, 5, 10, 15, 20],
+    'multioutputregressor__estimator__max_features': ['sqrt', 'log2', None]
+}
+STACKING_GRID = {
+    'multioutputstackingregressor__final_estimator': [
+        RidgeCV(),
+        LinearRegression(),
+        RandomForestRegressor()
+    ],
+}
 
-    # From our testing, RandomForestRegressor, KNeighborsRegressor, GradientBoostingRegressor all performed well
-    # So, we will try to find the optimal hyperparameters for them
+def stacking_model():
+    estimators = [
+        ('kneighbors', KNeighborsRegressor(n_neighbors=3, algorithm='auto', leaf_size=5, p=1, weights='distance')),
+        ('randomforest', RandomForestRegressor(
+            n_estimators=900,
+            max_depth=30,
+            max_features=None,
+            min_samples_leaf=1,
+            min_samples_split=2
+        )),
+        ('gradientboosting', GradientBoostingRegressor(
+            n_estimators=700,
+            subsample=0.9,
+            min_samples_split=2,
+            min_samples_leaf=1,
+            max_features=None,
+            max_depth=20,
+            loss='absolute_error',
+            learning_rate=0.1,
+            criterion='friedman_mse'
+        ))
+    ]
+    return make_pipeline(
+        MinMaxScaler(),
+        MultiOutputStackingRegressor(
+            estimators=estimators,
+            cv=5, # default cross validation
+            n_jobs=-1, # train models in parallel
+            passthrough=False # dont passthrough data, train only on predicted values
+        )
+    )
 
+# The original exhaustive search, every combination of the grids (GradientBoosting: 1000 random ones)
+def exhaustive_search(X_train, y_train):
     # RandomForestRegressor hyperparameter tuning
     model = make_pipeline(
         MinMaxScaler(),
         RandomForestRegressor()
     )
-    param_grid = {
-        'randomforestregressor__n_estimators': [400, 500, 600, 700, 800, 900],
-        'randomforestregressor__max_depth': [5, 10, 15, 20, 25, 30, None],
-        'randomforestregressor__min_samples_leaf': [1, 3, 5, 10, 15, 20],
-        'randomforestregressor__min_samples_split': [2, 5, 10, 15, 20, 30],
-        'randomforestregressor__max_features': ['sqrt', 'log2', None]
-    }
-    grid_search = GridSearchCV(estimator=model, param_grid=param_grid, cv=5, n_jobs=8, scoring='explained_variance')
+    grid_search = GridSearchCV(estimator=model, param_grid=RANDOM_FOREST_GRID, cv=5, n_jobs=8, scoring='explained_variance')
     with np.errstate(invalid='ignore'): # some weird runtime errors can happen sometimes, just ignore it
         grid_search.fit(X_train, y_train)
         print(grid_search.best_params_)
@@ -49,14 +103,7 @@ def main():
         MinMaxScaler(),
         KNeighborsRegressor()
     )
-    param_grid = {
-        'kneighborsregressor__n_neighbors': [1, 3, 5, 8, 10, 11, 12, 13, 14, 15, 18, 20, 25, 30, 35, 40, 50],
-        'kneighborsregressor__weights': ['uniform', 'distance'],
-        'kneighborsregressor__algorithm': ['auto', 'ball_tree', 'kd_tree', 'brute'],
-        'kneighborsregressor__leaf_size': [5, 10, 15, 20, 30, 40, 50, 60],
-        'kneighborsregressor__p': [1, 2]
-    }
-    grid_search = GridSearchCV(estimator=model, param_grid=param_grid, cv=5, n_jobs=8, scoring='explained_variance')
+    grid_search = GridSearchCV(estimator=model, param_grid=KNEIGHBORS_GRID, cv=5, n_jobs=8, scoring='explained_variance')
     with np.errstate(invalid='ignore'): # some weird runtime errors can happen sometimes, just ignore it
         grid_search.fit(X_train, y_train)
         print(grid_search.best_params_)
@@ -67,66 +114,82 @@ def main():
         MinMaxScaler(),
         MultiOutputRegressor(GradientBoostingRegressor())
     )
-    param_grid = {
-        'multioutputregressor__estimator__n_estimators': [600, 700, 800, 900, 1000],
-        'multioutputregressor__estimator__max_depth': [1, 3, 5, 10, 15, 20],
-        'multioutputregressor__estimator__loss': ['squared_error', 'absolute_error', 'huber', 'quantile'],
-        'multioutputregressor__estimator__learning_rate': [0.1, 0.2, 0.05],
-        'multioutputregressor__estimator__subsample': [0.8, 0.9, 1.0],
-        'multioutputregressor__estimator__criterion': ['friedman_mse', 'squared_error'],
-        'multioutputregressor__estimator__min_samples_split': [2, 5, 10, 15, 20, 30],
-        'multioutputregressor__estimator__min_samples_leaf': [1, 3, 5, 10, 15, 20],
-        'multioutputregressor__estimator__max_features': ['sqrt', 'log2', None]
-    }
-    grid_search = RandomizedSearchCV(estimator=model, param_distributions=param_grid, cv=5, n_jobs=8, n_iter=1000, scoring='explained_variance')
+    grid_search = RandomizedSearchCV(estimator=model, param_distributions=GRADIENT_BOOSTING_GRID, cv=5, n_jobs=8, n_iter=1000, scoring='explained_variance')
     with np.errstate(invalid='ignore'): # some weird runtime errors can happen sometimes, just ignore it
         grid_search.fit(X_train, y_train)
         print(grid_search.best_params_)
     # output: n_estimators=700, subsample=0.9, min_samples_split=2, min_samples_leaf=1, max_features=None, max_depth=20, loss='absolute_error', learning_rate=0.1, criterion='friedman_mse'
 
     # Final model testing
-    estimators = [
-        ('kneighbors', KNeighborsRegressor(n_neighbors=3, algorithm='auto', leaf_size=5, p=1, weights='distance')),
-        ('randomforest', RandomForestRegressor(
-            n_estimators=900, 
-            max_depth=30, 
-            max_features=None, 
-            min_samples_leaf=1, 
-            min_samples_split=2
-        )),
-        ('gradientboosting', GradientBoostingRegressor(
-            n_estimators=700, 
-            subsample=0.9, 
-            min_samples_split=2, 
-            min_samples_leaf=1, 
-            max_features=None, 
-            max_depth=20, 
-            loss='absolute_error', 
-            learning_rate=0.1, 
-            criterion='friedman_mse'
-        ))
-    ]
-    model = make_pipeline(
-        MinMaxScaler(),
-        MultiOutputRegressor(StackingRegressor(
-            estimators=estimators,
-            cv=5, # default cross validation
-            n_jobs=-1, # train models in parallel
-            passthrough=False # dont passthrough data, train only on predicted values
-        ))
-    )
-    param_grid = {
-        'multioutputregressor__estimator__final_estimator': [
-            RidgeCV(),
-            LinearRegression(),
-            RandomForestRegressor()
-        ],
-    }
-    grid_search = GridSearchCV(estimator=model, param_grid=param_grid, cv=5, n_jobs=8, scoring='explained_variance')
+    grid_search = GridSearchCV(estimator=stacking_model(), param_grid=STACKING_GRID, cv=5, n_jobs=8, scoring='explained_variance')
     with np.errstate(invalid='ignore'): # some weird runtime errors can happen sometimes, just ignore it
         grid_search.fit(X_train, y_train)
         print(grid_search.best_params_)
     # output: LinearRegression()
 
+# Successive halving / Hyperband over the same grids (see tuning.py). The forests and boosting use
+# n_estimators as the resource, KNN and the stacking model the number of training rows.
+def budgeted_tuning(X_train, y_train, args):
+    searches = [
+        ('randomforest', make_pipeline(MinMaxScaler(), RandomForestRegressor()), RANDOM_FOREST_GRID,
+         'randomforestregressor__n_estimators', 900 // args.eta ** 3),
+        ('kneighbors', make_pipeline(MinMaxScaler(), KNeighborsRegressor()), KNEIGHBORS_GRID,
+         SAMPLES, len(X_train) // args.eta ** 2),
+        ('gradientboosting', make_pipeline(MinMaxScaler(), MultiOutputRegressor(GradientBoostingRegressor())), GRADIENT_BOOSTING_GRID,
+         'multioutputregressor__estimator__n_estimators', 1000 // args.eta ** 3),
+        ('stacking', stacking_model(), STACKING_GRID,
+         SAMPLES, len(X_train) // args.eta),
+    ]
+    searches = [search for search in searches if search[0] in args.models]
+    trial_log = TrialLog(args.trial_log)
+    start = time.monotonic()
+    for i, (name, model, grid, resource, min_resource) in enumerate(searches):
+        deadline = None
+        if args.time_budget is not None:
+            # whatever is left of the budget is shared by the searches that still have to run
+            remaining = start + args.time_budget * 60 - time.monotonic()
+            deadline = time.monotonic() + max(0, remaining) / (len(searches) - i)
+        result = budgeted_search(name, model, grid, X_train, y_train, resource, min_resource,
+                                 mode=args.search, sampler=args.sampler, eta=args.eta, iterations=args.iterations,
+                                 cv=5, n_jobs=args.n_jobs, trial_log=trial_log, deadline=deadline, seed=args.seed)
+        print(result['best_params'])
+        print(f"{name}: score {result['best_score']} with {result['resource']} {'rows' if resource == SAMPLES else 'estimators'}, "
+              f"{result['scored']} configurations scored ({result['fitted']} fitted, {result['from_log']} from {args.trial_log})")
+
+def main():
+    parser = argparse.ArgumentParser(description='Find the hyperparameters of the RandomForest, KNN, GradientBoosting and stacking models')
+    parser.add_argument('--search', choices=['grid', 'halving', 'hyperband'], default='grid',
+                        help='grid: the original exhaustive search (hours), halving/hyperband: budgeted early stopping search')
+    parser.add_argument('--sampler', choices=['random', 'tpe'], default='random',
+                        help='how halving/hyperband pick configurations (tpe needs pip install optuna)')
+    parser.add_argument('--eta', type=int, default=3, help='1/eta of the configurations are promoted to eta times the resource')
+    parser.add_argument('--iterations', type=int, default=1, help='hyperband runs over all brackets')
+    parser.add_argument('--models', nargs='+', choices=['randomforest', 'kneighbors', 'gradientboosting', 'stacking'],
+                        default=['randomforest', 'kneighbors', 'gradientboosting', 'stacking'], help='searches run by halving/hyperband')
+    parser.add_argument('--time-budget', type=float, default=None, help='wall clock minutes for all the searches')
+    parser.add_argument('--trial-log', default='tuning_trials.jsonl', help='scored configurations, reused when the search is run again')
+    parser.add_argument('--n-jobs', type=int, default=8, help='cross validation folds fitted in parallel')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    # Read in the features and targets from the combined data
+    combined_data_path = '../Combined_Data'
+    data = read_dataset(combined_data_path, columns=MODEL_COLUMNS, schema='combined')
+
+    # Extract the X and y data, X = input features, y = output values
+    X = data[['year', 'month', 'megatonnes CO2', 'GDP per Capita']]
+    y = data[['temperature_2m_max', 'temperature_2m_min']] # regress on two values
+
+    # Split the dataset into training and validation sets
+    # (seeded, so a resumed search sees the same training rows and can reuse its trial log)
+    X_train, X_valid, y_train, y_valid = train_test_split(X, y, train_size=0.8, random_state=args.seed) # 80% training data, 20% validation data
+
+    # From our testing, RandomForestRegressor, KNeighborsRegressor, GradientBoostingRegressor all performed well
+    # So, we will try to find the optimal hyperparameters for them
+    if args.search == 'grid':
+        exhaustive_search(X_train, y_train)
+    else:
+        budgeted_tuning(X_train, y_train, args)
+
 if __name__ == '__main__':
     main()
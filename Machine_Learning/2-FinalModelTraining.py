@@ -3,22 +3,55 @@ import matplotlib.pyplot as plt
 import numpy as np
 import pickle
 import lzma
+import os
+import sys
+import argparse
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.storage import read_dataset
 from sklearn.linear_model import LinearRegression
-from sklearn.neighbors import KNeighborsRegressor
-from sklearn.ensemble import RandomForestRegressor, GradientBoostingRegressor, StackingRegressor
+from sklearn.ensemble import RandomForestRegressor
 from sklearn.preprocessing import MinMaxScaler
-from sklearn.multioutput import MultiOutputRegressor
 from sklearn.model_selection import train_test_split
 from sklearn.pipeline import make_pipeline
+from stacking import MultiOutputStackingRegressor
+from boosting import BOOSTING_BACKENDS, gradient_boosting
+from neighbors import NEIGHBOR_INDEXES, IndexedKNeighborsRegressor
+from artifact import ARTIFACT_SUFFIX, COMPRESSIONS, load_model, model_path, save_model
+from incremental import drift_report, last_trained_month, training_rows, update_model
+
+MODEL_COLUMNS = ['year', 'month', 'megatonnes CO2', 'GDP per Capita', 'temperature_2m_max', 'temperature_2m_min']
+FEATURES = ['year', 'month', 'megatonnes CO2', 'GDP per Capita']
+TARGETS = ['temperature_2m_max', 'temperature_2m_min']
+MODEL_NAME = 'model_YearMonthCO2GDP'
 
 def main():
-    # Read in the data from the combined data csv
-    combined_data_path = '../Combined_Data.csv'
-    data = pd.read_csv(combined_data_path)
+    parser = argparse.ArgumentParser(description='Train the final stacked model and save it to model_YearMonthCO2GDP.model')
+    parser.add_argument('--boosting', choices=BOOSTING_BACKENDS, default='exact',
+                        help='exact: the tuned GradientBoostingRegressor, histogram: binned boosting with early stopping (much faster on large data)')
+    parser.add_argument('--knn-index', choices=NEIGHBOR_INDEXES, default='exact',
+                        help='exact: the ball/kd tree search, ivf: approximate search of the --knn-probe closest clusters (see neighbors.py)')
+    parser.add_argument('--knn-probe', type=int, default=8, help='clusters searched per prediction by the ivf index')
+    parser.add_argument('--compression', choices=[c for c in COMPRESSIONS if c], default=None,
+                        help='compress the model arrays (smaller, but they can no longer be memory mapped when loading)')
+    parser.add_argument('--xz', action='store_true', help='also save the lzma pickle model_YearMonthCO2GDP.xz (slow)')
+    parser.add_argument('--incremental', action='store_true',
+                        help='update the saved model with the months added since it was trained instead of retraining it '
+                             '(retrains anyway when the new months have drifted, see incremental.py)')
+    parser.add_argument('--new-trees', type=int, default=100, help='RandomForest trees added by an incremental update')
+    parser.add_argument('--new-stages', type=int, default=50, help='GradientBoosting stages per target added by an incremental update')
+    parser.add_argument('--max-trees', type=int, default=1200, help='the oldest RandomForest trees beyond this are dropped by an incremental update')
+    args = parser.parse_args()
+
+    # Read in the features and targets from the combined data
+    combined_data_path = '../Combined_Data'
+    data = read_dataset(combined_data_path, columns=MODEL_COLUMNS, schema='combined')
 
     # Extract the X and y data, X = input features, y = output values
-    X = data[['year', 'month', 'megatonnes CO2', 'GDP per Capita']]
-    y = data[['temperature_2m_max', 'temperature_2m_min']] # regress on two values
+    X = data[FEATURES]
+    y = data[TARGETS] # regress on two values
+
+    if args.incremental and incremental_training(args, data, X, y):
+        return
 
     # Split the dataset into training and validation sets
     X_train, X_valid, y_train, y_valid = train_test_split(X, y, train_size=0.8) # 80% training data, 20% validation data
@@ -27,8 +60,12 @@ def main():
     # From our testing, we were able to get good results from a few different models, and a StackingRegressor allows us
     # to train a final model/layer based on their predicted values, which allows us to use the strength of each individual
     # model to get an even better overall model.
+    # KNN and RandomForest predict both temperatures at once, so they are only fitted once per fold for both
+    # targets, GradientBoosting is fitted per target, and each target gets its own final layer.
+    # See boosting.py for the GradientBoosting backends and neighbors.py for the KNN indexes.
     estimators = [
-        ('kneighbors', KNeighborsRegressor(n_neighbors=3, algorithm='auto', leaf_size=5, p=1, weights='distance')),
+        ('kneighbors', IndexedKNeighborsRegressor(n_neighbors=3, algorithm='auto', leaf_size=5, p=1, weights='distance',
+                                                  index=args.knn_index, n_probe=args.knn_probe)),
         ('randomforest', RandomForestRegressor(
             n_estimators=900, 
             max_depth=30, 
@@ -36,44 +73,74 @@ def main():
             min_samples_leaf=1, 
             min_samples_split=2
         )),
-        ('gradientboosting', GradientBoostingRegressor(
-            n_estimators=700, 
-            subsample=0.9, 
-            min_samples_split=2, 
-            min_samples_leaf=1, 
-            max_features=None, 
-            max_depth=20, 
-            loss='absolute_error', 
-            learning_rate=0.1, 
-            criterion='friedman_mse'
-        ))
+        ('gradientboosting', gradient_boosting(args.boosting))
     ]
     model = make_pipeline(
         MinMaxScaler(),
-        MultiOutputRegressor(StackingRegressor(
+        MultiOutputStackingRegressor(
             estimators=estimators,
             final_estimator=LinearRegression(), # using LinearRegression as our final layer
             cv=5, # default 5-fold cross validation
             n_jobs=-1, # train models in parallel
             passthrough=False # dont passthrough data, train only on predicted values
-        ))
+        )
     )
     model.fit(X_train, y_train)
     print(f'Model training score: {model.score(X_train, y_train)}')
     print(f'Model validation score: {model.score(X_valid, y_valid)}')
     
     # Model has been trained, let's try using it on data from 2011-2013
-    test_data_path = '../Combined_Data_2011_2013.csv'
-    test_data = pd.read_csv(test_data_path)
-    X_test = test_data[['year', 'month', 'megatonnes CO2', 'GDP per Capita']]
-    y_test = test_data[['temperature_2m_max', 'temperature_2m_min']]
-    print(f'Model score on future (2011-2013) data: {model.score(X_test, y_test)}')
+    print_test_score(model)
 
-    # saving the model to disk using pickle
+    # saving the model to disk (see artifact.py), --xz also writes the old lzma compressed pickle
     # note: this code only creates the model trained on year, month, CO2 and GDP per capita since it was the best one
     # but a couple of other models were created using slight modifications to this script for analysis
-    with lzma.open('model_YearMonthCO2GDP.xz', 'wb') as f:
-        pickle.dump(model, f, protocol=5)
+    save(model, args, training_data=(X_train, y_train))
+
+def print_test_score(model):
+    test_data_path = '../Combined_Data_2011_2013'
+    test_data = read_dataset(test_data_path, columns=MODEL_COLUMNS, schema='combined')
+    print(f'Model score on future (2011-2013) data: {model.score(test_data[FEATURES], test_data[TARGETS])}')
+
+def save(model, args, training_data=None, extra=None):
+    save_model(model, MODEL_NAME + ARTIFACT_SUFFIX, features=FEATURES, targets=TARGETS,
+               training_data=training_data, compression=args.compression, extra=extra)
+    if args.xz:
+        with lzma.open(MODEL_NAME + '.xz', 'wb') as f:
+            pickle.dump(model, f, protocol=5)
+
+# Updates the saved model with the rows of the months after the last one it was trained on (see incremental.py).
+# Returns False when the model has to be trained from scratch instead: there is no saved model or the new
+# months have drifted from the training data.
+def incremental_training(args, data, X, y):
+    path = model_path(MODEL_NAME)
+    if not os.path.exists(path):
+        print(f'No saved {MODEL_NAME} to update, training it from scratch')
+        return False
+    model = load_model(path, mmap_arrays=False) # the artifact is replaced below
+    year, month = last_trained_month(model, FEATURES)
+    new = (data['year'] * 12 + data['month'] > year * 12 + month).to_numpy()
+    if not new.any():
+        print(f'The model is already trained through {year}-{month:02d}, there are no new months')
+        return True
+
+    report = drift_report(model, X[new], y[new], FEATURES)
+    print(f'{new.sum()} new rows after {year}-{month:02d}: error {report["new_mae"]:.3f} '
+          f'(out-of-fold error {report["out_of_fold_mae"]:.3f}), KS statistics '
+          + ', '.join(f'{feature} {statistic:.3f}' for feature, statistic in report['ks'].items()))
+    if report['drift']:
+        print('The new months have drifted (' + '; '.join(report['reasons']) + '), training the model from scratch')
+        return False
+
+    update_model(model, X[new], y[new], args.new_trees, args.new_stages, args.max_trees)
+    print(f'Model score on the new rows after the update: {model.score(X[new], y[new])}')
+    print_test_score(model)
+    year, month = last_trained_month(model, FEATURES)
+    # the rows the updated model holds (features scaled back), so the artifact keeps its training data hash
+    X_held, y_held = training_rows(model)
+    held = (pd.DataFrame(model[0].inverse_transform(X_held), columns=FEATURES), pd.DataFrame(y_held, columns=TARGETS))
+    save(model, args, training_data=held, extra={'updated_through': f'{year}-{month:02d}'})
+    return True
 
 if __name__ == '__main__':
     main()
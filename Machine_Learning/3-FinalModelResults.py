@@ -1,25 +1,24 @@
-import pandas as pd
-import matplotlib.pyplot as plt
-import pickle
-import lzma
-import seaborn
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.figures import FigureSpec, render_figures
+from common.storage import read_dataset
+from artifact import load_model, model_path
+import result_plots
+
+MODEL_COLUMNS = ['year', 'month', 'megatonnes CO2', 'GDP per Capita', 'temperature_2m_max', 'temperature_2m_min']
 
 def main():
-    # Read in the data from the combined data csv
-    combined_data_path = '../Combined_Data.csv'
-    data = pd.read_csv(combined_data_path)
-    test_data_path = '../Combined_Data_2011_2013.csv'
-    test_data = pd.read_csv(test_data_path)
+    # Read in the features and targets from the combined data
+    combined_data_path = '../Combined_Data'
+    data = read_dataset(combined_data_path, columns=MODEL_COLUMNS, schema='combined')
+    test_data_path = '../Combined_Data_2011_2013'
+    test_data = read_dataset(test_data_path, columns=MODEL_COLUMNS, schema='combined')
 
-    # Load the pre-trained models for analysis
-    with lzma.open('model_YearMonthCO2GDP.xz', 'rb') as f:
-        model_YearMonthCO2GDP = pickle.load(f)
-    
-    with lzma.open('model_OnlyYearMonth.xz', 'rb') as f:
-        model_OnlyYearMonth = pickle.load(f)
-    
-    with lzma.open('model_OnlyCO2GDP.xz', 'rb') as f:
-        model_OnlyCO2GDP = pickle.load(f)
+    # Load the pre-trained models for analysis (the fast loading .model artifact when there is one, see artifact.py)
+    model_YearMonthCO2GDP = load_model(model_path('model_YearMonthCO2GDP'))
+    model_OnlyYearMonth = load_model(model_path('model_OnlyYearMonth'))
+    model_OnlyCO2GDP = load_model(model_path('model_OnlyCO2GDP'))
 
     # score the models on the respective datasets
     print(
@@ -51,17 +50,10 @@ def main():
     # additional analysis below
 
     # Final model residuals graph
-    seaborn.set_theme()
     test_averages = (test_data['temperature_2m_max'].values + test_data['temperature_2m_min'].values) / 2
     predicted_values = model_YearMonthCO2GDP.predict(test_data[['year', 'month', 'megatonnes CO2', 'GDP per Capita']])
     predicted_averages = (predicted_values[:, 0] + predicted_values[:, 1]) / 2
     residuals = test_averages - predicted_averages
-    plt.figure()
-    plt.title('Histogram of Best Model Averaged Residuals')
-    plt.xlabel('Temperature (°C) Residuals')
-    plt.ylabel('Frequency')
-    plt.hist(residuals, bins=20)
-    plt.savefig("BestModelAveragedResidualsHistogram.png")
 
     # Aggregate test data to take the average for all cities by year and month
     test_data_aggregated = (
@@ -74,34 +66,16 @@ def main():
     predicted_values = model_YearMonthCO2GDP.predict(
         test_data_aggregated[['year', 'month', 'megatonnes CO2', 'GDP per Capita']]
     )
-    predicted_max = predicted_values[:, 0]
-    predicted_min = predicted_values[:, 1]
-
-    # Actuals from aggregated data
-    actual_max = test_data_aggregated['temperature_2m_max']
-    actual_min = test_data_aggregated['temperature_2m_min']
-
-    # Create plots
-    plt.figure(figsize=(12, 8))
-
-    # Plot actual vs predicted temperature max
-    plt.subplot(2, 1, 1)
-    plt.plot(test_data_aggregated['year'] + test_data_aggregated['month'] / 12, actual_max, label='Actual Max Temperature', marker='o')
-    plt.plot(test_data_aggregated['year'] + test_data_aggregated['month'] / 12, predicted_max, label='Predicted Max Temperature', marker='x')
-    plt.plot(test_data_aggregated['year'] + test_data_aggregated['month'] / 12, actual_min, label='Actual Min Temperature', marker='o', alpha=0.7, linestyle='--')
-    plt.plot(test_data_aggregated['year'] + test_data_aggregated['month'] / 12, predicted_min, label='Predicted Min Temperature', marker='x', linestyle='dotted', alpha=0.8)
-    plt.title('Actual vs Predicted Temperatures (Averaged Across Cities)')
-    plt.xlabel('Year')
-    plt.ylabel('Temperature (°C)')
-    plt.legend()
-    plt.grid(True)
-
-
+    test_data_aggregated['predicted_max'] = predicted_values[:, 0]
+    test_data_aggregated['predicted_min'] = predicted_values[:, 1]
 
-    # Save the combined plot
-    plt.tight_layout()
-    plt.savefig("Predictions_vs_Actual_and_Residuals_Aggregated.png")
-    #plt.show()
+    # Draw the figures (those whose data changed since the last run, see common/figures.py)
+    render_figures([
+        FigureSpec("BestModelAveragedResidualsHistogram.png", result_plots.residuals_histogram, residuals, bins=20),
+        FigureSpec("Predictions_vs_Actual_and_Residuals_Aggregated.png", result_plots.predictions_vs_actual,
+                   test_data_aggregated[['year', 'month', 'temperature_2m_max', 'temperature_2m_min',
+                                         'predicted_max', 'predicted_min']]),
+    ])
 
 if __name__ == '__main__':
     main()
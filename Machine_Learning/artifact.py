@@ -0,0 +1,156 @@
+import hashlib
+import json
+import lzma
+import mmap
+import os
+import pickle
+import platform
+import shutil
+import time
+import warnings
+import joblib
+import numpy as np
+import pandas as pd
+import scipy
+import sklearn
+
+# Model artifact that loads in a fraction of a second, replacing the lzma compressed pickles.
+#
+# A fitted model is a small object graph holding a lot of large numpy arrays (the nodes and values of every
+# tree, the KNN training rows and ball/kd tree). The artifact is a folder with:
+#   metadata.json  the header: format version, feature and target names, the training data hash, the library
+#                  versions the model was saved with, and where each array is in arrays.bin
+#   model.pkl      the pickled object graph (pickle protocol 5) with the arrays taken out of band
+#   arrays.bin     the raw array buffers one after another, 64 byte aligned
+# Uncompressed, arrays.bin is memory mapped and the arrays are read straight from the mapping (the trees copy
+# their nodes into their own memory, the KNN data is used in place), so loading is limited by the disk instead
+# of by lzma. With compression='zstd' or 'lz4' every buffer is compressed on its own (needs pip install pyarrow),
+# which makes the files several times smaller and still loads much faster than lzma.
+
+FORMAT_VERSION = 1
+ARTIFACT_SUFFIX = '.model'
+COMPRESSIONS = [None, 'zstd', 'lz4']
+METADATA_FILE = 'metadata.json'
+PICKLE_FILE = 'model.pkl'
+ARRAYS_FILE = 'arrays.bin'
+ALIGNMENT = 64
+# buffers smaller than this stay in the pickle, there is no point in mapping them
+IN_BAND_BYTES = 4096
+
+# Changes whenever the rows or the feature/target columns change: the training data hash of the artifacts, and
+# what tuning.py keys its trials on so old trials are not reused for new data
+def data_fingerprint(X, y):
+    digest = hashlib.sha256()
+    for frame in (X, y):
+        digest.update(json.dumps(list(frame.columns)).encode())
+        digest.update(pd.util.hash_pandas_object(frame, index=True).to_numpy().tobytes())
+    return digest.hexdigest()
+
+def library_versions():
+    return {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'scipy': scipy.__version__,
+        'scikit-learn': sklearn.__version__,
+        'pandas': pd.__version__,
+        'joblib': joblib.__version__,
+    }
+
+def _codec(compression):
+    try:
+        import pyarrow
+    except ImportError as e:
+        raise ImportError(f'{compression} compressed model artifacts need pyarrow: pip install pyarrow') from e
+    return pyarrow.Codec(compression)
+
+# Saves model to the artifact folder path (replaced if it exists). training_data is (X, y), hashed into
+# the metadata so a model can be matched with the data it was trained on.
+def save_model(model, path, features=None, targets=None, training_data=None, compression=None, extra=None):
+    if compression not in COMPRESSIONS:
+        raise ValueError(f'Unknown compression {compression!r}, expected one of {COMPRESSIONS}')
+    codec = _codec(compression) if compression is not None else None
+    buffers = []
+    def out_of_band(buffer):
+        if memoryview(buffer).nbytes < IN_BAND_BYTES:
+            return True # pickled in band
+        buffers.append(buffer)
+        return False
+    body = pickle.dumps(model, protocol=5, buffer_callback=out_of_band)
+
+    # written next to the old artifact and swapped in at the end, so a failed save never leaves half a model
+    temporary_path = path.rstrip(os.sep) + '.tmp'
+    shutil.rmtree(temporary_path, ignore_errors=True)
+    os.makedirs(temporary_path)
+    arrays = []
+    with open(os.path.join(temporary_path, ARRAYS_FILE), 'wb') as f:
+        for buffer in buffers:
+            data = memoryview(buffer).cast('B')
+            size = data.nbytes
+            if codec is not None:
+                data = codec.compress(data, asbytes=True)
+            f.write(b'\0' * (-f.tell() % ALIGNMENT))
+            arrays.append([f.tell(), len(data), size])
+            f.write(data)
+    with open(os.path.join(temporary_path, PICKLE_FILE), 'wb') as f:
+        f.write(body)
+
+    features = features if features is not None else getattr(model, 'feature_names_in_', None)
+    metadata = {
+        'format_version': FORMAT_VERSION,
+        'model': type(model).__name__,
+        'features': None if features is None else [str(feature) for feature in features],
+        'targets': None if targets is None else [str(target) for target in targets],
+        'training_data_hash': None if training_data is None else data_fingerprint(*training_data),
+        'training_rows': None if training_data is None else len(training_data[0]),
+        'saved_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'versions': library_versions(),
+        'compression': compression,
+        'arrays': arrays, # [offset, stored bytes, buffer bytes] of every out of band buffer, in pickle order
+    }
+    if extra:
+        metadata.update(extra)
+    with open(os.path.join(temporary_path, METADATA_FILE), 'w') as f:
+        json.dump(metadata, f, indent=2)
+
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(temporary_path, path)
+    return metadata
+
+def read_metadata(path):
+    with open(os.path.join(path, METADATA_FILE), 'r') as f:
+        return json.load(f)
+
+# The artifact for a model name like 'model_YearMonthCO2GDP', or the old .xz pickle when there is none
+def model_path(name):
+    if os.path.isdir(name + ARTIFACT_SUFFIX):
+        return name + ARTIFACT_SUFFIX
+    return name + '.xz'
+
+# Loads an artifact folder, or an lzma pickle (.xz) written by earlier versions of 2-FinalModelTraining.py.
+# With mmap_arrays=False the arrays are read into memory, so the files can be replaced while the model is in use.
+def load_model(path, mmap_arrays=True):
+    if not os.path.isdir(path):
+        with lzma.open(path, 'rb') as f:
+            return pickle.load(f)
+
+    metadata = read_metadata(path)
+    if metadata['format_version'] > FORMAT_VERSION:
+        raise ValueError(f"{path} has format version {metadata['format_version']}, "
+                         f'this code reads up to version {FORMAT_VERSION}')
+    saved_with = metadata['versions']['scikit-learn']
+    if saved_with != sklearn.__version__:
+        warnings.warn(f'{path} was saved with scikit-learn {saved_with}, loading it with {sklearn.__version__}')
+
+    compression = metadata['compression']
+    with open(os.path.join(path, ARRAYS_FILE), 'rb') as f:
+        if compression is None and mmap_arrays and metadata['arrays']:
+            data = memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+        else:
+            data = memoryview(f.read())
+    if compression is None:
+        buffers = [data[offset:offset + stored] for offset, stored, size in metadata['arrays']]
+    else:
+        codec = _codec(compression)
+        buffers = [codec.decompress(data[offset:offset + stored], size) for offset, stored, size in metadata['arrays']]
+    with open(os.path.join(path, PICKLE_FILE), 'rb') as f:
+        return pickle.load(f, buffers=buffers)
@@ -0,0 +1,119 @@
+import numpy as np
+import pandas as pd
+import os
+import sys
+import time
+import argparse
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.storage import read_dataset
+from sklearn.linear_model import LinearRegression
+from sklearn.neighbors import KNeighborsRegressor
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.preprocessing import MinMaxScaler
+from sklearn.multioutput import MultiOutputRegressor
+from sklearn.model_selection import train_test_split
+from sklearn.pipeline import make_pipeline
+from stacking import MultiOutputStackingRegressor
+from boosting import BOOSTING_BACKENDS, gradient_boosting
+
+# Compares the GradientBoosting backends side by side: fit time, predict latency and R² on the 2011-2013 data.
+# --scales repeats the training rows with a little noise to see how the fit time grows towards daily or county
+# resolution data, where the exact backend is skipped above --exact-max-rows.
+MODEL_COLUMNS = ['year', 'month', 'megatonnes CO2', 'GDP per Capita', 'temperature_2m_max', 'temperature_2m_min']
+FEATURES = ['year', 'month', 'megatonnes CO2', 'GDP per Capita']
+TARGETS = ['temperature_2m_max', 'temperature_2m_min']
+
+def make_model(backend, stack, seed):
+    if not stack:
+        return make_pipeline(MinMaxScaler(), MultiOutputRegressor(gradient_boosting(backend, random_state=seed)))
+    # the model of 2-FinalModelTraining.py, with the forest kept small so the boosting dominates the fit time
+    estimators = [
+        ('kneighbors', KNeighborsRegressor(n_neighbors=3, algorithm='auto', leaf_size=5, p=1, weights='distance')),
+        ('randomforest', RandomForestRegressor(n_estimators=100, max_depth=30, random_state=seed)),
+        ('gradientboosting', gradient_boosting(backend, random_state=seed))
+    ]
+    return make_pipeline(
+        MinMaxScaler(),
+        MultiOutputStackingRegressor(estimators=estimators, final_estimator=LinearRegression(), cv=5, n_jobs=-1)
+    )
+
+# The training rows repeated scale times, the copies jittered by 1% of each column's standard deviation
+def scale_rows(X, y, scale, seed):
+    if scale == 1:
+        return X, y
+    rng = np.random.default_rng(seed)
+    X_scaled = pd.concat([X] * scale, ignore_index=True)
+    y_scaled = pd.concat([y] * scale, ignore_index=True)
+    copies = np.arange(len(X_scaled)) >= len(X)
+    for frame, columns in ((X_scaled, ['megatonnes CO2', 'GDP per Capita']), (y_scaled, TARGETS)):
+        for column in columns:
+            noise = rng.normal(0, 0.01 * frame[column].std(), copies.sum())
+            frame.loc[copies, column] = frame.loc[copies, column] + noise
+    return X_scaled, y_scaled
+
+def benchmark(model, X_train, y_train, X_valid, y_valid, X_test, y_test, single_rows):
+    start = time.perf_counter()
+    model.fit(X_train, y_train)
+    fit_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    model.predict(X_test)
+    batch_time = time.perf_counter() - start
+
+    latencies = []
+    for i in range(min(single_rows, len(X_test))):
+        row = X_test.iloc[[i]]
+        start = time.perf_counter()
+        model.predict(row)
+        latencies.append(time.perf_counter() - start)
+
+    return {
+        'fit_seconds': fit_time,
+        'predict_ms (2011-2013 batch)': batch_time * 1000,
+        'predict_ms (1 row, median)': np.median(latencies) * 1000,
+        'validation R²': model.score(X_valid, y_valid),
+        '2011-2013 R²': model.score(X_test, y_test),
+    }
+
+# Boosting iterations each target's booster actually ran (early stopping ends the histogram backend sooner)
+def boosting_iterations(model):
+    final = model[-1]
+    if isinstance(final, MultiOutputRegressor):
+        boosters = final.estimators_
+    else:
+        boosters = final.estimators_[[name for name, _ in final.estimators].index('gradientboosting')]
+    return '/'.join(str(getattr(booster, 'n_iter_', getattr(booster, 'n_estimators_', '?'))) for booster in boosters)
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare the GradientBoosting backends of the stacked model')
+    parser.add_argument('--backends', nargs='+', choices=BOOSTING_BACKENDS, default=BOOSTING_BACKENDS)
+    parser.add_argument('--stack', action='store_true', help='benchmark the whole stacked model instead of the booster alone')
+    parser.add_argument('--scales', type=int, nargs='+', default=[1], help='multiples of the training rows to benchmark')
+    parser.add_argument('--exact-max-rows', type=int, default=50000,
+                        help='skip the exact backend above this many training rows (it takes hours)')
+    parser.add_argument('--single-rows', type=int, default=100, help='single row predictions timed for the latency')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    data = read_dataset('../Combined_Data', columns=MODEL_COLUMNS, schema='combined')
+    test_data = read_dataset('../Combined_Data_2011_2013', columns=MODEL_COLUMNS, schema='combined')
+    X_train, X_valid, y_train, y_valid = train_test_split(data[FEATURES], data[TARGETS], train_size=0.8, random_state=args.seed)
+    X_test, y_test = test_data[FEATURES], test_data[TARGETS]
+
+    results = []
+    for scale in args.scales:
+        X_fit, y_fit = scale_rows(X_train, y_train, scale, args.seed)
+        for backend in args.backends:
+            if backend == 'exact' and len(X_fit) > args.exact_max_rows:
+                print(f'{backend} at {len(X_fit)} rows skipped (--exact-max-rows)')
+                continue
+            model = make_model(backend, args.stack, args.seed)
+            result = benchmark(model, X_fit, y_fit, X_valid, y_valid, X_test, y_test, args.single_rows)
+            results.append(dict({'backend': backend, 'training rows': len(X_fit)}, **result,
+                                iterations=boosting_iterations(model)))
+            print(f'{backend} at {len(X_fit)} rows done')
+
+    print(pd.DataFrame(results).to_string(index=False, float_format=lambda value: f'{value:.4f}'))
+
+if __name__ == '__main__':
+    main()
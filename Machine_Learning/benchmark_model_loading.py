@@ -0,0 +1,101 @@
+import numpy as np
+import pandas as pd
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from artifact import ARTIFACT_SUFFIX, load_model, save_model
+from model_zoo import peak_rss_mb
+
+# Compares how long a prediction worker takes to load the model from the lzma pickle and from the
+# artifact format (artifact.py) with every compression. Every load runs in a fresh process, like the cold
+# start of a worker, and the predictions of every loaded model are checked against the .xz one.
+# The files were just written, so they are read from the page cache: this measures the decompression and
+# unpickling, not the disk.
+FEATURES = ['year', 'month', 'megatonnes CO2', 'GDP per Capita']
+
+def scenario_rows(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'year': rng.integers(2000, 2014, rows),
+        'month': rng.integers(1, 13, rows),
+        'megatonnes CO2': rng.uniform(0, 250, rows),
+        'GDP per Capita': rng.uniform(1e4, 9e4, rows),
+    })[FEATURES]
+
+def _timed_load(path, X):
+    before = peak_rss_mb()
+    start = time.perf_counter()
+    model = load_model(path)
+    load_time = time.perf_counter() - start
+    start = time.perf_counter()
+    predictions = model.predict(X)
+    first_predict = time.perf_counter() - start
+    return load_time, first_predict, peak_rss_mb() - before, predictions
+
+def path_size_mb(path):
+    if os.path.isfile(path):
+        return os.path.getsize(path) / 1024 ** 2
+    return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path)) / 1024 ** 2
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare model load times of the .xz pickle and the artifact format')
+    parser.add_argument('--model', default='model_YearMonthCO2GDP.xz', help='lzma pickled model to convert and compare')
+    parser.add_argument('--compressions', nargs='+', choices=['none', 'zstd', 'lz4'], default=['none', 'zstd', 'lz4'])
+    parser.add_argument('--repeats', type=int, default=3, help='loads per format, the median is reported')
+    parser.add_argument('--rows', type=int, default=1000, help='rows predicted after every load to check the model')
+    parser.add_argument('--output-dir', default=None,
+                        help='keep the artifacts in this folder (one subfolder per compression) instead of a temporary one')
+    args = parser.parse_args()
+
+    X = scenario_rows(args.rows)
+    model = load_model(args.model)
+    output_dir = args.output_dir or tempfile.mkdtemp(prefix='model_artifacts_')
+    name = os.path.splitext(os.path.basename(args.model))[0]
+    paths = {'xz': args.model}
+    save_times = {}
+    for compression in args.compressions:
+        path = os.path.join(output_dir, compression, name + ARTIFACT_SUFFIX)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        start = time.perf_counter()
+        save_model(model, path, compression=None if compression == 'none' else compression)
+        save_times[compression] = time.perf_counter() - start
+        paths[compression] = path
+    del model
+
+    results = []
+    reference = None
+    context = multiprocessing.get_context('spawn')
+    try:
+        for fmt, path in paths.items():
+            runs = []
+            for _ in range(args.repeats):
+                with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                    runs.append(pool.submit(_timed_load, path, X).result())
+            load_time, first_predict, rss = (np.median([run[i] for run in runs]) for i in range(3))
+            predictions = runs[0][3]
+            if reference is None:
+                reference = predictions
+            results.append({
+                'format': fmt,
+                'size_MB': path_size_mb(path),
+                'save_seconds': save_times.get(fmt, np.nan),
+                'load_seconds': load_time,
+                'first_predict_seconds': first_predict,
+                'load_rss_MB': rss,
+                'max_abs_difference': np.abs(predictions - reference).max(),
+            })
+            print(f'{fmt} done')
+    finally:
+        if args.output_dir is None:
+            shutil.rmtree(output_dir, ignore_errors=True)
+
+    results = pd.DataFrame(results)
+    results['speedup'] = results['load_seconds'].iloc[0] / results['load_seconds']
+    print(results.to_string(index=False, float_format=lambda value: f'{value:.4f}'))
+
+if __name__ == '__main__':
+    main()
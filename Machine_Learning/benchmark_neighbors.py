@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+import os
+import sys
+import time
+import argparse
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.storage import read_dataset
+from sklearn.metrics import r2_score
+from sklearn.model_selection import train_test_split
+from sklearn.preprocessing import MinMaxScaler
+from benchmark_boosting import FEATURES, MODEL_COLUMNS, TARGETS, scale_rows
+from neighbors import IndexedKNeighborsRegressor
+
+# Compares the neighbour indexes of the KNN member (neighbors.py) on the 2011-2013 data: build time, queries per
+# second, R² and the recall of the approximate ivf search (the share of the exact 3 nearest neighbours it finds)
+# for every --probes value. --scales repeats the training rows with a little noise like benchmark_boosting.py,
+# to see how the search cost grows towards daily resolution; brute force is skipped above --brute-max-rows.
+KNN_PARAMS = dict(n_neighbors=3, leaf_size=5, p=1, weights='distance')
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare exact and approximate neighbour search for the KNN model')
+    parser.add_argument('--scales', type=int, nargs='+', default=[1, 10, 100], help='multiples of the training rows to benchmark')
+    parser.add_argument('--probes', type=int, nargs='+', default=[1, 2, 4, 8, 16], help='n_probe values of the ivf index')
+    parser.add_argument('--brute-max-rows', type=int, default=100000, help='skip the brute force search above this many training rows')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    data = read_dataset('../Combined_Data', columns=MODEL_COLUMNS, schema='combined')
+    X_train, _, y_train, _ = train_test_split(data[FEATURES], data[TARGETS], train_size=0.8, random_state=args.seed)
+    test_data = read_dataset('../Combined_Data_2011_2013', columns=MODEL_COLUMNS, schema='combined')
+
+    results = []
+    for scale in args.scales:
+        X_fit, y_fit = scale_rows(X_train, y_train, scale, args.seed)
+        scaler = MinMaxScaler().fit(X_fit)
+        X_fit, X_test = scaler.transform(X_fit), scaler.transform(test_data[FEATURES])
+        y_fit, y_test = y_fit.to_numpy(), test_data[TARGETS].to_numpy()
+
+        def measure(name, model, build_seconds, n_probe=np.nan):
+            (distances, neighbors), seconds = timed(model.kneighbors, X_test)
+            recall = np.mean([len(set(found) & set(true)) / len(true) for found, true in zip(neighbors, exact_neighbors)])
+            results.append({'rows': len(X_fit), 'index': name, 'n_probe': n_probe, 'build_seconds': build_seconds,
+                            'queries/s': len(X_test) / seconds, 'recall': recall,
+                            'test_score': r2_score(y_test, model.predict(X_test))})
+
+        exact, build_seconds = timed(IndexedKNeighborsRegressor(**KNN_PARAMS).fit, X_fit, y_fit)
+        exact_neighbors = exact.kneighbors(X_test, return_distance=False)
+        measure('exact (tree)', exact, build_seconds)
+        if len(X_fit) <= args.brute_max_rows:
+            brute, build_seconds = timed(IndexedKNeighborsRegressor(**KNN_PARAMS, algorithm='brute').fit, X_fit, y_fit)
+            measure('exact (brute force)', brute, build_seconds)
+        ivf, build_seconds = timed(IndexedKNeighborsRegressor(**KNN_PARAMS, index='ivf', random_state=args.seed).fit, X_fit, y_fit)
+        for n_probe in args.probes:
+            ivf.n_probe = n_probe # only used when searching, the lists are not rebuilt
+            measure(f'ivf ({len(ivf.list_centers_)} lists)', ivf, build_seconds, n_probe)
+        print(f'{len(X_fit)} rows done')
+
+    print(pd.DataFrame(results).to_string(index=False, float_format=lambda value: f'{value:.4g}'))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+import numpy as np
+import pandas as pd
+import http.client
+import json
+import threading
+import time
+import argparse
+from prediction_service import load_service_model, start_prediction_server
+from benchmark_model_loading import scenario_rows
+
+# Load test of prediction_service.py: starts the service on a local port and has --clients threads send
+# small requests over keep-alive connections as fast as they can, once without micro-batching (a batch is one
+# request) and once with it, and prints the request latencies, throughput and batch sizes of both.
+# The predictions from the service are checked against calling the model directly.
+
+def run_client(port, requests, results, errors):
+    connection = http.client.HTTPConnection('127.0.0.1', port)
+    try:
+        for rows in requests:
+            body = json.dumps({'rows': rows.tolist()})
+            start = time.perf_counter()
+            connection.request('POST', '/predict', body, {'Content-Type': 'application/json'})
+            response = connection.getresponse()
+            payload = json.loads(response.read())
+            if response.status != 200:
+                raise RuntimeError(payload['error'])
+            results.append((time.perf_counter() - start, rows, np.array(payload['predictions'])))
+    except Exception as e:
+        errors.append(e)
+    finally:
+        connection.close()
+
+def load_test(model, features, targets, clients, requests_per_client, rows_per_request, max_batch_size, max_wait):
+    server = start_prediction_server(model, features=features, targets=targets,
+                                     max_batch_size=max_batch_size, max_wait=max_wait)
+    port = server.server_address[1]
+    X = scenario_rows(clients * requests_per_client * rows_per_request).to_numpy(dtype=np.float64)
+    requests = X.reshape(clients, requests_per_client, rows_per_request, len(features))
+    results, errors = [], []
+    threads = [threading.Thread(target=run_client, args=(port, requests[i], results, errors)) for i in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    stats = server.batcher.stats.snapshot()
+    server.shutdown()
+    server.server_close()
+    if errors:
+        raise errors[0]
+
+    latencies = np.array([latency for latency, _, _ in results])
+    sent = np.concatenate([rows for _, rows, _ in results])
+    received = np.concatenate([predictions for _, _, predictions in results])
+    expected = np.asarray(model.predict(pd.DataFrame(sent, columns=features)))
+    return {
+        'client p50 ms': np.percentile(latencies, 50) * 1000,
+        'client p99 ms': np.percentile(latencies, 99) * 1000,
+        'requests/s': len(results) / elapsed,
+        'rows/s': len(sent) / elapsed,
+        'server p50 ms': stats['latency_p50_ms'],
+        'server p99 ms': stats['latency_p99_ms'],
+        'batches': stats['batches'],
+        'mean batch rows': stats['mean_batch_rows'],
+        'max abs difference': np.abs(received - expected).max(),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test the prediction service with and without micro-batching')
+    parser.add_argument('--model', default='model_YearMonthCO2GDP', help='model name, the .model artifact or the .xz pickle is loaded')
+    parser.add_argument('--clients', type=int, default=32, help='concurrent clients')
+    parser.add_argument('--requests', type=int, default=20, help='requests per client')
+    parser.add_argument('--rows-per-request', type=int, default=1)
+    parser.add_argument('--max-batch-size', type=int, default=4096)
+    parser.add_argument('--max-wait-ms', type=float, default=5)
+    parser.add_argument('--compiled', action='store_true', help='serve the flattened tree ensembles of fast_trees.py')
+    args = parser.parse_args()
+
+    model, features, targets = load_service_model(args.model, args.compiled)
+    results = []
+    for name, max_batch_size, max_wait in [
+        ('one request per batch', args.rows_per_request, 0),
+        ('micro-batching', args.max_batch_size, args.max_wait_ms / 1000),
+    ]:
+        result = load_test(model, features, targets, args.clients, args.requests, args.rows_per_request,
+                           max_batch_size, max_wait)
+        results.append(dict({'mode': name}, **result))
+        print(f'{name} done')
+    print(pd.DataFrame(results).to_string(index=False, float_format=lambda value: f'{value:.4f}'))
+
+if __name__ == '__main__':
+    main()
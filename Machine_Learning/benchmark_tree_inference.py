@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+import time
+import argparse
+from artifact import load_model, model_path
+from fast_trees import TREE_BACKENDS, compile_model, default_backend
+
+# Rows per second of the trained model on scenario grids (years x months x CO2 levels x GDP levels), predicted
+# by scikit-learn and with the flattened trees of fast_trees.py, whose predictions are checked against
+# scikit-learn's. Every size is predicted once before it is timed (numba compiles its kernel on the first call).
+FEATURES = ['year', 'month', 'megatonnes CO2', 'GDP per Capita']
+YEARS = range(2011, 2031)
+
+def scenario_grid(rows):
+    levels = int(np.ceil(np.sqrt(rows / (len(YEARS) * 12))))
+    year, month, co2, gdp = np.meshgrid(np.array(YEARS), np.arange(1, 13), np.linspace(0, 250, levels),
+                                        np.linspace(1e4, 9e4, levels), indexing='ij')
+    grid = pd.DataFrame({'year': year.ravel(), 'month': month.ravel(), 'megatonnes CO2': co2.ravel(),
+                         'GDP per Capita': gdp.ravel()})[FEATURES]
+    return grid.iloc[:rows]
+
+def timed_predict(model, X):
+    model.predict(X.iloc[:10])
+    start = time.perf_counter()
+    predictions = model.predict(X)
+    return predictions, time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare scikit-learn and flattened tree inference on scenario grids')
+    parser.add_argument('--model', default='model_YearMonthCO2GDP', help='model name, the .model artifact or the .xz pickle is loaded')
+    parser.add_argument('--rows', type=int, nargs='+', default=[1, 100, 1000, 10000, 100000, 1000000])
+    parser.add_argument('--backends', nargs='+', choices=TREE_BACKENDS, default=[default_backend()])
+    parser.add_argument('--sklearn-max-rows', type=int, default=1000000, help='skip the scikit-learn path above this many rows')
+    args = parser.parse_args()
+
+    model = load_model(model_path(args.model))
+    compiled = {backend: compile_model(model, backend) for backend in args.backends}
+    results = []
+    for rows in args.rows:
+        X = scenario_grid(rows)
+        reference = None
+        if rows <= args.sklearn_max_rows:
+            reference, seconds = timed_predict(model, X)
+            results.append({'rows': rows, 'path': 'scikit-learn', 'seconds': seconds, 'rows/s': rows / seconds,
+                            'max abs difference': 0.0})
+        for backend, compiled_model in compiled.items():
+            predictions, seconds = timed_predict(compiled_model, X)
+            difference = np.abs(predictions - reference).max() if reference is not None else np.nan
+            results.append({'rows': rows, 'path': f'flattened ({backend})', 'seconds': seconds, 'rows/s': rows / seconds,
+                            'max abs difference': difference})
+        print(f'{rows} rows done')
+
+    results = pd.DataFrame(results)
+    sklearn_seconds = results[results['path'] == 'scikit-learn'].set_index('rows')['seconds']
+    results['speedup'] = results['rows'].map(sklearn_seconds) / results['seconds']
+    print(results.to_string(index=False, float_format=lambda value: f'{value:.4g}'))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,42 @@
+from sklearn.ensemble import GradientBoostingRegressor, HistGradientBoostingRegressor
+
+# Gradient boosting backends for the stacked model.
+#
+# exact: the GradientBoostingRegressor found by 1-HyperparameterTuning.py. Every split is searched over all the
+# sorted feature values, so each tree costs O(n log n) per target and the fit becomes unusable at hundreds of
+# thousands of rows (daily or county resolution).
+# histogram: HistGradientBoostingRegressor with the same loss, learning rate and depth. Features are binned into
+# at most 255 bins once, splits are searched over the bin histograms with OpenMP threads, and boosting stops
+# early once the loss on a held out part of the training rows has not improved for a while, so 700 iterations
+# is only the upper limit.
+
+BOOSTING_BACKENDS = ['exact', 'histogram']
+
+def gradient_boosting(backend='exact', random_state=None):
+    if backend == 'exact':
+        return GradientBoostingRegressor(
+            n_estimators=700,
+            subsample=0.9,
+            min_samples_split=2,
+            min_samples_leaf=1,
+            max_features=None,
+            max_depth=20,
+            loss='absolute_error',
+            learning_rate=0.1,
+            criterion='friedman_mse',
+            random_state=random_state
+        )
+    if backend == 'histogram':
+        return HistGradientBoostingRegressor(
+            max_iter=700, # upper limit, early stopping can end it well before
+            max_depth=20,
+            max_leaf_nodes=31, # leaf-wise trees, depth 20 with single row leaves overfits and is ~20x slower
+            min_samples_leaf=20,
+            loss='absolute_error',
+            learning_rate=0.1,
+            early_stopping=True,
+            validation_fraction=0.1, # held out from the training rows to decide when to stop
+            n_iter_no_change=10,
+            random_state=random_state
+        )
+    raise ValueError(f'Unknown boosting backend {backend!r}, expected one of {BOOSTING_BACKENDS}')
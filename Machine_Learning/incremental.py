@@ -0,0 +1,118 @@
+import numpy as np
+from scipy.stats import ks_2samp
+from sklearn.ensemble import RandomForestRegressor, GradientBoostingRegressor, HistGradientBoostingRegressor
+from neighbors import IndexedKNeighborsRegressor
+
+# Incremental updates of the trained stacked model (MinMaxScaler + MultiOutputStackingRegressor) when new months
+# are appended to the combined data, instead of a full retrain.
+#
+# The base models are updated in place of being refitted:
+#   KNN               the new rows are appended to its index (IndexedKNeighborsRegressor.append, see neighbors.py)
+#   RandomForest      warm start: new_trees more trees fitted on all the rows, the oldest trees beyond max_trees
+#                     are dropped so the prediction cost stays bounded
+#   GradientBoosting  warm start: new_stages more stages per target, fitted to the residuals of all the rows
+# and each target's final LinearRegression is refitted on the out-of-fold predictions kept from the full fit
+# (oof_predictions_) plus the predictions of the base models from before the update for the new rows, which
+# they have not seen either. The scaler is kept, so the new years are scaled past 1 like they are for predictions.
+#
+# The rows the model was trained on are the ones the KNN member keeps (_fit_X and _y, scaled features and
+# targets, in the order of oof_predictions_), so the update needs nothing but the model and the new rows.
+#
+# drift_report compares the new rows with the training rows before updating: the error of the model on the new
+# months against its out-of-fold error, and the Kolmogorov-Smirnov statistic of every feature that is not a
+# date (CO2 and GDP). When either is over its limit the model should be retrained from scratch instead.
+
+# the error on the new months may be this many times the out-of-fold error before it counts as drift
+DRIFT_ERROR_RATIO = 1.5
+DRIFT_KS_STATISTIC = 0.3
+TIME_FEATURES = ['year', 'month']
+
+def _knn(stack):
+    return stack.estimators_[[name for name, _ in stack.estimators].index('kneighbors')]
+
+# The scaled features and the targets of the rows the model was trained on, see above
+def training_rows(model):
+    knn = _knn(model[-1])
+    if isinstance(knn, IndexedKNeighborsRegressor):
+        return knn.training_rows()
+    return knn._fit_X, knn._y
+
+# The last (year, month) the model was trained on
+def last_trained_month(model, features):
+    X = model[0].inverse_transform(training_rows(model)[0])
+    months = np.rint(X[:, features.index('year')]) * 12 + np.rint(X[:, features.index('month')]) - 1
+    last = int(months.max())
+    return last // 12, last % 12 + 1
+
+# The stacked model's predictions of its training rows from the out-of-fold predictions of the base models
+def _out_of_fold_predictions(stack, X):
+    return np.column_stack([final.predict(stack._meta_features(X, stack.oof_predictions_[:, :, target]))
+                            for target, final in enumerate(stack.final_estimators_)])
+
+# How different the new rows are from the ones the model was trained on, and whether that is too much for an update
+def drift_report(model, X_new, y_new, features, error_ratio=DRIFT_ERROR_RATIO, ks_statistic=DRIFT_KS_STATISTIC):
+    stack = model[-1]
+    X_train, y_train = training_rows(model)
+    out_of_fold_mae = np.abs(_out_of_fold_predictions(stack, X_train) - y_train).mean()
+    new_mae = np.abs(np.asarray(model.predict(X_new)).reshape(np.shape(y_new)) - np.asarray(y_new)).mean()
+    X_new_scaled = model[0].transform(X_new)
+    ks = {feature: ks_2samp(X_train[:, i], X_new_scaled[:, i]).statistic
+          for i, feature in enumerate(features) if feature not in TIME_FEATURES}
+    reasons = []
+    if new_mae > error_ratio * out_of_fold_mae:
+        reasons.append(f'error on the new rows {new_mae:.3f} > {error_ratio} x out-of-fold error {out_of_fold_mae:.3f}')
+    reasons += [f'{feature} KS statistic {statistic:.3f} > {ks_statistic}' for feature, statistic in ks.items()
+                if statistic > ks_statistic]
+    return {'out_of_fold_mae': out_of_fold_mae, 'new_mae': new_mae, 'ks': ks, 'drift': bool(reasons), 'reasons': reasons}
+
+def _grow_forest(forest, X, y, new_trees, max_trees):
+    n_jobs = forest.n_jobs
+    forest.set_params(warm_start=True, n_estimators=len(forest.estimators_) + new_trees, n_jobs=-1)
+    forest.fit(X, y)
+    if len(forest.estimators_) > max_trees:
+        forest.estimators_ = forest.estimators_[-max_trees:]
+    forest.set_params(warm_start=False, n_estimators=len(forest.estimators_), n_jobs=n_jobs)
+
+def _add_stages(boosting, X, y, new_stages):
+    if isinstance(boosting, HistGradientBoostingRegressor):
+        # with early stopping the new iterations would stop at once, the validation loss has already converged
+        early_stopping = boosting.early_stopping
+        boosting.set_params(warm_start=True, early_stopping=False, max_iter=boosting.n_iter_ + new_stages)
+        boosting.fit(X, y)
+        boosting.set_params(warm_start=False, early_stopping=early_stopping)
+    else:
+        boosting.set_params(warm_start=True, n_estimators=len(boosting.estimators_) + new_stages)
+        boosting.fit(X, y)
+        boosting.set_params(warm_start=False)
+
+# Updates the fitted model in place with the new rows (unscaled features and targets), see above
+def update_model(model, X_new, y_new, new_trees=100, new_stages=50, max_trees=1200):
+    scaler, stack = model[0], model[-1]
+    X_new = scaler.transform(X_new)
+    y_new = np.asarray(y_new)
+    if y_new.ndim == 1:
+        y_new = y_new.reshape(-1, 1)
+    # out-of-sample predictions of the new rows, from the base models that have not seen them
+    new_predictions = stack.transform(X_new)
+
+    knn_index = [name for name, _ in stack.estimators].index('kneighbors')
+    X_old, y_old = training_rows(model)
+    X_all = np.vstack([X_old, X_new])
+    y_all = np.concatenate([np.asarray(y_old).reshape(len(y_old), -1), y_new])
+    for i, fitted in enumerate(stack.estimators_):
+        if i == knn_index:
+            if not isinstance(fitted, IndexedKNeighborsRegressor):
+                fitted = stack.estimators_[i] = IndexedKNeighborsRegressor.from_fitted(fitted)
+            fitted.append(X_new, y_new)
+        elif isinstance(fitted, RandomForestRegressor):
+            _grow_forest(fitted, X_all, y_all if stack.n_targets_ > 1 else y_all.ravel(), new_trees, max_trees)
+        elif isinstance(fitted, list) and isinstance(fitted[0], (GradientBoostingRegressor, HistGradientBoostingRegressor)):
+            for target, boosting in enumerate(fitted):
+                _add_stages(boosting, X_all, y_all[:, target], new_stages)
+        else:
+            raise ValueError(f'No incremental update for {stack.estimators[i][0]}, retrain the model instead')
+
+    stack.oof_predictions_ = np.concatenate([stack.oof_predictions_, new_predictions])
+    for target, final in enumerate(stack.final_estimators_):
+        final.fit(stack._meta_features(X_all, stack.oof_predictions_[:, :, target]), y_all[:, target])
+    return model
@@ -0,0 +1,165 @@
+import os
+import pickle
+import sys
+import time
+import multiprocessing
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from sklearn.base import clone
+from sklearn.linear_model import LinearRegression
+from sklearn.metrics import r2_score
+from sklearn.model_selection import KFold
+from threadpoolctl import threadpool_limits
+try:
+    import resource
+except ImportError: # not available on Windows, peak RSS is left empty there
+    resource = None
+
+# Parallel evaluation of the candidate models of 0-RegressionModelTesting.py.
+#
+# Every model is fitted in its own worker process (a fresh one per fit, so the worker's peak RSS is the peak of
+# that model alone), up to `workers` at a time. Each worker gets cpu_count // workers threads: the n_jobs of the
+# model and the BLAS/OpenMP thread pools are limited to it, so models with n_jobs=-1 or threaded boosting do not
+# start a thread per core in every worker. The workers send back the predictions on the train/valid/test rows
+# instead of the fitted models, which can be hundreds of MB.
+#
+# The voting and stacking ensembles are built from the fitted members instead of being refitted: voting
+# averages the members' predictions and stacking (like MultiOutputStackingRegressor) trains one LinearRegression
+# per target on the members' out-of-fold predictions. The out-of-fold fits are extra tasks run alongside the
+# other models, and they are the only fits the ensembles add.
+
+SPLITS = ['train', 'valid', 'test']
+
+# Counts the bytes written by pickle.dump, so the size of a model is known without keeping a copy in memory
+class _ByteCounter:
+    def __init__(self):
+        self.size = 0
+
+    def write(self, data):
+        size = memoryview(data).nbytes # protocol 5 can pass PickleBuffers, which have no len()
+        self.size += size
+        return size
+
+# Peak RSS of this process. VmHWM starts again at exec, ru_maxrss keeps the peak of the parent the worker was
+# forked from, so it is only used where there is no /proc (macOS)
+def peak_rss_mb():
+    if os.path.exists('/proc/self/status'):
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024 # kB
+    if resource is None:
+        return np.nan
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 ** 2 if sys.platform == 'darwin' else peak / 1024 # bytes on macOS, KB on Linux
+
+# Sets every n_jobs of the model (including nested estimators) to threads
+def limit_n_jobs(model, threads):
+    n_jobs = {param: threads for param in model.get_params(deep=True) if param.endswith('n_jobs')}
+    return model.set_params(**n_jobs)
+
+def _predict(model, X):
+    return np.asarray(model.predict(X)).reshape(len(X), -1)
+
+def _evaluate(name, model, data, threads):
+    with threadpool_limits(threads):
+        model = limit_n_jobs(clone(model), threads)
+        start = time.perf_counter()
+        model.fit(data['train'][0], data['train'][1])
+        fit_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        test_predictions = _predict(model, data['test'][0])
+        predict_time = time.perf_counter() - start
+        predictions = {split: _predict(model, data[split][0]) for split in ['train', 'valid']}
+        predictions['test'] = test_predictions
+    peak_rss = peak_rss_mb()
+
+    counter = _ByteCounter()
+    pickle.dump(model, counter, protocol=5)
+    return {'name': name, 'fit_seconds': fit_time, 'predict_seconds': predict_time, 'peak_rss_MB': peak_rss,
+            'model_MB': counter.size / 1024 ** 2, 'predictions': predictions}
+
+def _fold_predictions(name, model, X, y, train, test, threads):
+    with threadpool_limits(threads):
+        model = limit_n_jobs(clone(model), threads)
+        start = time.perf_counter()
+        model.fit(X.iloc[train], y.iloc[train])
+        fit_time = time.perf_counter() - start
+        return name, test, _predict(model, X.iloc[test]), fit_time
+
+# Fits every model of models ({name: estimator}) and the out-of-fold fits of the stacking members, workers at a
+# time. data is {'train': (X, y), 'valid': (X, y), 'test': (X, y)}. Returns {name: result} and
+# {member name: out-of-fold predictions of the training rows, with the seconds the fold fits took}.
+def evaluate_models(models, data, members=(), workers=None, cv=5, log=print):
+    workers = workers or os.cpu_count()
+    threads = max(1, os.cpu_count() // workers)
+    X_train, y_train = data['train']
+    folds = list(KFold(n_splits=cv).split(X_train))
+
+    results = {}
+    out_of_fold = {name: {'predictions': np.empty((len(X_train), y_train.shape[1])), 'fit_seconds': 0.0}
+                   for name in members}
+    # spawn and one task per process: no fork of the parent's memory, and ru_maxrss only covers one fit
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, max_tasks_per_child=1) as pool:
+        futures = [pool.submit(_evaluate, name, model, data, threads) for name, model in models.items()]
+        futures += [pool.submit(_fold_predictions, name, models[name], X_train, y_train, train, test, threads)
+                    for name in members for train, test in folds]
+        for future in as_completed(futures):
+            result = future.result()
+            if isinstance(result, dict):
+                results[result['name']] = result
+                log(f"{result['name']} done in {result['fit_seconds']:.1f}s")
+            else:
+                name, test, predictions, fit_time = result
+                out_of_fold[name]['predictions'][test] = predictions
+                out_of_fold[name]['fit_seconds'] += fit_time
+    return results, out_of_fold
+
+def voting_result(name, members, results):
+    member_results = [results[member] for member in members]
+    predictions = {split: np.mean([result['predictions'][split] for result in member_results], axis=0)
+                   for split in SPLITS}
+    return _ensemble_result(name, member_results, predictions, extra_fit=0.0, extra_predict=0.0)
+
+def stacking_result(name, members, results, out_of_fold, y_train):
+    member_results = [results[member] for member in members]
+    # rows x members x targets, one final LinearRegression per target
+    oof = np.stack([out_of_fold[member]['predictions'] for member in members], axis=1)
+    y_train = np.asarray(y_train)
+    start = time.perf_counter()
+    finals = [LinearRegression().fit(oof[:, :, target], y_train[:, target]) for target in range(y_train.shape[1])]
+    final_fit = time.perf_counter() - start
+
+    predictions = {}
+    predict_time = 0.0
+    for split in SPLITS:
+        stacked = np.stack([result['predictions'][split] for result in member_results], axis=1)
+        start = time.perf_counter()
+        predictions[split] = np.column_stack([final.predict(stacked[:, :, target]) for target, final in enumerate(finals)])
+        if split == 'test':
+            predict_time = time.perf_counter() - start
+    fold_fits = sum(out_of_fold[member]['fit_seconds'] for member in members)
+    return _ensemble_result(name, member_results, predictions, extra_fit=fold_fits + final_fit, extra_predict=predict_time)
+
+# An ensemble costs its members' fits and predictions plus its own, and its size is its members'
+def _ensemble_result(name, member_results, predictions, extra_fit, extra_predict):
+    return {'name': name,
+            'fit_seconds': sum(result['fit_seconds'] for result in member_results) + extra_fit,
+            'predict_seconds': sum(result['predict_seconds'] for result in member_results) + extra_predict,
+            'peak_rss_MB': np.nan,
+            'model_MB': sum(result['model_MB'] for result in member_results),
+            'predictions': predictions}
+
+# One row per model: timings, memory, size and the R² (like model.score) on every split
+def results_table(results, data):
+    rows = []
+    for result in results:
+        row = {column: result[column] for column in ['name', 'fit_seconds', 'predict_seconds', 'peak_rss_MB', 'model_MB']}
+        for split in SPLITS:
+            y = np.asarray(data[split][1])
+            row[f'{split}_score'] = r2_score(y, result['predictions'][split].reshape(y.shape))
+        rows.append(row)
+    return pd.DataFrame(rows)
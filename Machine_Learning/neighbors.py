@@ -0,0 +1,152 @@
+import numpy as np
+from scipy.spatial.distance import cdist
+from sklearn.cluster import KMeans
+from sklearn.metrics import pairwise_distances
+from sklearn.neighbors import KNeighborsRegressor
+
+# Neighbour index backends for the KNN member of the stacked model.
+#
+# IndexedKNeighborsRegressor is a KNeighborsRegressor whose neighbour search is picked with index:
+#   exact  scikit-learn's search (ball/kd tree or brute force, from algorithm and leaf_size), as before
+#   ivf    an inverted file: the training points are clustered by k-means into n_lists lists (sqrt(rows) by
+#          default), and a query only measures its distance to the points of the n_probe lists with the closest
+#          centres. The cost of a query grows with n_probe * rows / n_lists instead of with the rows, at the price
+#          of missing the neighbours that fall in lists that are not probed. n_probe is the knob between recall
+#          and speed: n_probe = n_lists is an exact search. It is only used when searching, so it can be changed
+#          on a fitted model.
+# The index is made of numpy arrays that are saved with the model, so the saved artifact holds it prebuilt and
+# memory maps it on load (see artifact.py) instead of rebuilding it.
+#
+# Both take new points without being rebuilt (append, used by the incremental updates of incremental.py): they
+# are kept in a buffer that is searched by brute force next to the index, and the nearest of both are merged.
+# The index is only rebuilt when the buffer grows past REBUILD_FRACTION of it.
+
+NEIGHBOR_INDEXES = ['exact', 'ivf']
+# more appended points than this fraction of the indexed ones and the index is rebuilt with all of them
+REBUILD_FRACTION = 0.25
+# the k-means of the ivf lists is fitted on at most this many points per list
+KMEANS_POINTS_PER_LIST = 256
+# scikit-learn metric names computed with scipy's cdist
+CDIST_METRICS = {'manhattan': 'cityblock', 'cityblock': 'cityblock', 'l1': 'cityblock', 'euclidean': 'euclidean',
+                 'l2': 'euclidean', 'minkowski': 'minkowski', 'chebyshev': 'chebyshev'}
+
+class IndexedKNeighborsRegressor(KNeighborsRegressor):
+    def __init__(self, n_neighbors=5, *, weights='uniform', algorithm='auto', leaf_size=30, p=2, metric='minkowski',
+                 metric_params=None, n_jobs=None, index='exact', n_lists=None, n_probe=8, random_state=None):
+        super().__init__(n_neighbors=n_neighbors, weights=weights, algorithm=algorithm, leaf_size=leaf_size, p=p,
+                         metric=metric, metric_params=metric_params, n_jobs=n_jobs)
+        self.index = index
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.random_state = random_state
+
+    # An indexed copy of a fitted KNeighborsRegressor, with the same neighbours and training points
+    @classmethod
+    def from_fitted(cls, knn, **params):
+        indexed = cls(**dict(knn.get_params(), **params))
+        fitted = knn.get_params()
+        indexed.__dict__.update({name: value for name, value in knn.__dict__.items() if name not in fitted})
+        if indexed.index == 'ivf':
+            indexed._build_lists()
+        return indexed
+
+    def fit(self, X, y):
+        if self.index not in NEIGHBOR_INDEXES:
+            raise ValueError(f'Unknown neighbour index {self.index!r}, expected one of {NEIGHBOR_INDEXES}')
+        self.__dict__.pop('appended_X_', None)
+        super().fit(X, y)
+        if self.index == 'ivf':
+            self._build_lists()
+        return self
+
+    def _build_lists(self):
+        n_lists = self.n_lists or max(1, int(round(np.sqrt(len(self._fit_X)))))
+        n_lists = min(n_lists, len(self._fit_X))
+        rng = np.random.default_rng(self.random_state)
+        sample = self._fit_X
+        if len(sample) > KMEANS_POINTS_PER_LIST * n_lists:
+            sample = sample[rng.choice(len(sample), KMEANS_POINTS_PER_LIST * n_lists, replace=False)]
+        seed = None if self.random_state is None else int(rng.integers(2 ** 31))
+        centers = KMeans(n_lists, n_init=1, random_state=seed).fit(sample).cluster_centers_
+        assignment = self._distances(self._fit_X, centers).argmin(axis=1)
+        # the points of every list one after another, list i is list_points_[list_offsets_[i]:list_offsets_[i + 1]]
+        self.list_centers_ = centers
+        self.list_points_ = np.argsort(assignment, kind='stable')
+        self.list_offsets_ = np.concatenate([[0], np.cumsum(np.bincount(assignment, minlength=n_lists))])
+        self.list_X_ = self._fit_X[self.list_points_]
+
+    def _distances(self, X, Y):
+        # scipy's cdist has much less overhead per call than pairwise_distances, which matters for small lists
+        if self.effective_metric_ in CDIST_METRICS:
+            return cdist(X, Y, CDIST_METRICS[self.effective_metric_], **self.effective_metric_params_)
+        return pairwise_distances(X, Y, metric=self.effective_metric_, **self.effective_metric_params_)
+
+    @property
+    def n_appended_(self):
+        return len(getattr(self, 'appended_X_', ()))
+
+    # All the points, indexed then appended, and their targets. _y has the targets of the appended points too,
+    # so the neighbour indexes of both can be used with it like for the indexed ones.
+    def training_rows(self):
+        if not self.n_appended_:
+            return self._fit_X, self._y
+        return np.vstack([self._fit_X, self.appended_X_]), self._y
+
+    def append(self, X, y):
+        X, y = np.asarray(X, dtype=np.float64), np.asarray(y)
+        self.appended_X_ = np.vstack([self.appended_X_, X]) if self.n_appended_ else X
+        self._y = np.concatenate([self._y, y.reshape(len(y), *self._y.shape[1:])])
+        if self.n_appended_ > REBUILD_FRACTION * len(self._fit_X):
+            self.fit(*self.training_rows())
+        return self
+
+    # The n_neighbors nearest indexed points of every query among the points of its n_probe closest lists
+    def _ivf_kneighbors(self, X, n_neighbors):
+        n_lists = len(self.list_centers_)
+        n_probe = min(max(1, self.n_probe), n_lists)
+        center_distances = self._distances(X, self.list_centers_)
+        if n_probe < n_lists:
+            probed = np.argpartition(center_distances, n_probe - 1, axis=1)[:, :n_probe]
+        else:
+            probed = np.broadcast_to(np.arange(n_lists), (len(X), n_lists))
+        distances = np.full((len(X), n_neighbors), np.inf)
+        indexes = np.full((len(X), n_neighbors), -1)
+        # the (query, list) pairs grouped by list, so every list is compared with all its queries at once
+        pairs = np.argsort(probed.ravel(), kind='stable')
+        pair_lists = probed.ravel()[pairs]
+        bounds = np.searchsorted(pair_lists, np.arange(n_lists + 1))
+        for i in range(n_lists):
+            queries = pairs[bounds[i]:bounds[i + 1]] // n_probe
+            start, stop = self.list_offsets_[i], self.list_offsets_[i + 1]
+            if len(queries) == 0 or start == stop:
+                continue
+            candidates = np.hstack([distances[queries], self._distances(X[queries], self.list_X_[start:stop])])
+            candidate_indexes = np.hstack([indexes[queries],
+                                           np.broadcast_to(self.list_points_[start:stop], (len(queries), stop - start))])
+            nearest = np.argpartition(candidates, n_neighbors - 1, axis=1)[:, :n_neighbors]
+            distances[queries] = np.take_along_axis(candidates, nearest, axis=1)
+            indexes[queries] = np.take_along_axis(candidate_indexes, nearest, axis=1)
+        # queries whose probed lists hold fewer than n_neighbors points are searched exactly
+        short = np.flatnonzero((indexes < 0).any(axis=1))
+        if len(short):
+            distances[short], indexes[short] = super().kneighbors(X[short], n_neighbors)
+        return distances, indexes
+
+    def kneighbors(self, X=None, n_neighbors=None, return_distance=True):
+        if X is None or (self.index == 'exact' and not self.n_appended_):
+            return super().kneighbors(X, n_neighbors, return_distance)
+        n_neighbors = n_neighbors or self.n_neighbors
+        X = np.asarray(X, dtype=np.float64)
+        indexed_neighbors = min(n_neighbors, len(self._fit_X))
+        if self.index == 'ivf':
+            distances, indexes = self._ivf_kneighbors(X, indexed_neighbors)
+        else:
+            distances, indexes = super().kneighbors(X, indexed_neighbors)
+        if self.n_appended_:
+            appended = self._distances(X, self.appended_X_)
+            distances = np.hstack([distances, appended])
+            indexes = np.hstack([indexes, np.broadcast_to(len(self._fit_X) + np.arange(self.n_appended_), appended.shape)])
+        nearest = np.argsort(distances, axis=1, kind='stable')[:, :n_neighbors]
+        distances = np.take_along_axis(distances, nearest, axis=1)
+        indexes = np.take_along_axis(indexes, nearest, axis=1)
+        return (distances, indexes) if return_distance else indexes
@@ -0,0 +1,268 @@
+import argparse
+import collections
+import json
+import queue
+import threading
+import time
+import numpy as np
+import pandas as pd
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from artifact import load_model, model_path, read_metadata
+from fast_trees import compile_model
+
+# A long-lived prediction server for the trained temperature model.
+#
+# The model is loaded once (the .model artifact when there is one, see artifact.py). Clients POST rows of
+# (year, month, megatonnes CO2, GDP per Capita) to /predict and get the predicted max and min temperatures
+# back. Requests are not predicted one by one: a single batching thread takes the requests waiting in the
+# queue, up to --max-batch-size rows or until --max-wait-ms after the first one arrived, predicts them with
+# one call into the model and hands every request its rows back. A call into the stacked model costs about
+# the same for 1 row as for a few thousand (every tree is walked once per call), so under load the cost per
+# request drops with the batch size. GET /stats returns the latency percentiles, throughput and batch sizes.
+# Run it with `python prediction_service.py --port 8001`.
+#
+# POST /predict {"rows": [[2012, 7, 45.1, 52000.0], ...]}  or  {"rows": [{"year": 2012, "month": 7, ...}, ...]}
+#   -> {"targets": ["temperature_2m_max", "temperature_2m_min"], "predictions": [[31.2, 18.4], ...]}
+
+FEATURES = ['year', 'month', 'megatonnes CO2', 'GDP per Capita']
+TARGETS = ['temperature_2m_max', 'temperature_2m_min']
+# latencies kept for the percentiles
+LATENCY_WINDOW = 10000
+
+class PredictionRequest:
+    def __init__(self, rows):
+        self.rows = rows
+        self.done = threading.Event()
+        self.predictions = None
+        self.error = None
+
+# Request latencies (the last LATENCY_WINDOW of them) and throughput counters since the server started
+class ServiceStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.monotonic()
+        self.latencies = collections.deque(maxlen=LATENCY_WINDOW)
+        self.requests = 0
+        self.rows = 0
+        self.batches = 0
+        self.batch_rows = 0
+        self.predict_seconds = 0.0
+        self.errors = 0
+
+    def record_request(self, rows, seconds, failed=False):
+        with self.lock:
+            self.latencies.append(seconds)
+            self.requests += 1
+            self.rows += rows
+            self.errors += failed
+
+    def record_batch(self, rows, seconds):
+        with self.lock:
+            self.batches += 1
+            self.batch_rows += rows
+            self.predict_seconds += seconds
+
+    def snapshot(self):
+        with self.lock:
+            latencies = np.array(self.latencies)
+            elapsed = time.monotonic() - self.started
+            percentile = lambda q: float(np.percentile(latencies, q) * 1000) if len(latencies) else None
+            return {
+                'requests': self.requests,
+                'rows': self.rows,
+                'errors': self.errors,
+                'batches': self.batches,
+                'mean_batch_rows': self.batch_rows / self.batches if self.batches else None,
+                'latency_p50_ms': percentile(50),
+                'latency_p99_ms': percentile(99),
+                'requests_per_second': self.requests / elapsed,
+                'rows_per_second': self.rows / elapsed,
+                'predict_seconds': self.predict_seconds,
+                'uptime_seconds': elapsed,
+            }
+
+# Coalesces concurrent requests into batches of at most max_batch_size rows, waiting at most max_wait
+# seconds after the first request of a batch for more to arrive. A request with more rows than
+# max_batch_size is split into several batches.
+class MicroBatcher:
+    def __init__(self, predict, max_batch_size=4096, max_wait=0.005, stats=None):
+        self.predict = predict
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.stats = stats or ServiceStats()
+        self.queue = queue.Queue()
+        self.carried = None
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    # Predicts rows (an array with one row per sample), blocking until its batches have been predicted
+    def submit(self, rows):
+        start = time.monotonic()
+        requests = [PredictionRequest(rows[i:i + self.max_batch_size])
+                    for i in range(0, max(len(rows), 1), self.max_batch_size)]
+        for request in requests:
+            self.queue.put(request)
+        for request in requests:
+            request.done.wait()
+        errors = [request.error for request in requests if request.error is not None]
+        self.stats.record_request(len(rows), time.monotonic() - start, failed=bool(errors))
+        if errors:
+            raise errors[0]
+        return np.concatenate([request.predictions for request in requests])
+
+    def _next_batch(self):
+        # a request that did not fit into the previous batch starts this one
+        batch = [self.carried if self.carried is not None else self.queue.get()]
+        self.carried = None
+        size = len(batch[0].rows)
+        deadline = time.monotonic() + self.max_wait
+        while size < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                request = self.queue.get(timeout=remaining) if remaining > 0 else self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if size + len(request.rows) > self.max_batch_size:
+                self.carried = request
+                break
+            batch.append(request)
+            size += len(request.rows)
+        return batch, size
+
+    def _run(self):
+        while True:
+            batch, size = self._next_batch()
+            start = time.monotonic()
+            try:
+                predictions = self.predict(np.concatenate([request.rows for request in batch]))
+            except Exception as e:
+                for request in batch:
+                    request.error = e
+                    request.done.set()
+                continue
+            self.stats.record_batch(size, time.monotonic() - start)
+            offset = 0
+            for request in batch:
+                request.predictions = predictions[offset:offset + len(request.rows)]
+                offset += len(request.rows)
+                request.done.set()
+
+# The model's predict for a float array of rows with the model's feature columns
+def model_predictor(model, features):
+    def predict(rows):
+        return np.asarray(model.predict(pd.DataFrame(rows, columns=features))).reshape(len(rows), -1)
+    return predict
+
+# Turns the "rows" of a request (lists in FEATURES order or objects with the feature names) into a float array
+def parse_rows(body, features):
+    if not isinstance(body, dict) or 'rows' not in body:
+        raise ValueError('the body must be a JSON object with "rows"')
+    rows = body['rows']
+    if not isinstance(rows, list):
+        raise ValueError('"rows" must be a list')
+    if rows and isinstance(rows[0], dict):
+        rows = [[row[feature] for feature in features] for row in rows]
+    rows = np.asarray(rows, dtype=np.float64).reshape(len(rows), -1) if rows else np.empty((0, len(features)))
+    if rows.shape[1] != len(features):
+        raise ValueError(f'every row needs {len(features)} values: {features}')
+    return rows
+
+class PredictionHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1' # keep-alive, so clients do not reconnect for every request
+
+    def do_POST(self):
+        if self.path != '/predict':
+            self.send_json(404, {'error': f'unknown path {self.path}'})
+            return
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+            rows = parse_rows(body, self.server.features)
+        except (KeyError, ValueError, TypeError) as e:
+            self.send_json(400, {'error': f'bad request: {e}'})
+            return
+        if len(rows) == 0:
+            self.send_json(200, {'targets': self.server.targets, 'predictions': []})
+            return
+        try:
+            predictions = self.server.batcher.submit(rows)
+        except Exception as e:
+            self.send_json(500, {'error': f'prediction failed: {e}'})
+            return
+        self.send_json(200, {'targets': self.server.targets, 'predictions': predictions.tolist()})
+
+    def do_GET(self):
+        if self.path == '/stats':
+            self.send_json(200, dict(self.server.batcher.stats.snapshot(),
+                                     max_batch_size=self.server.batcher.max_batch_size,
+                                     max_wait_ms=self.server.batcher.max_wait * 1000))
+        elif self.path == '/health':
+            self.send_json(200, {'status': 'ok', 'features': self.server.features, 'targets': self.server.targets})
+        else:
+            self.send_json(404, {'error': f'unknown path {self.path}'})
+
+    def send_json(self, status, body):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+def make_prediction_server(model, features=FEATURES, targets=TARGETS, host='127.0.0.1', port=0,
+                           max_batch_size=4096, max_wait=0.005, verbose=False):
+    server = ThreadingHTTPServer((host, port), PredictionHandler)
+    server.daemon_threads = True
+    server.features = list(features)
+    server.targets = list(targets)
+    server.batcher = MicroBatcher(model_predictor(model, server.features), max_batch_size, max_wait)
+    server.verbose = verbose
+    return server
+
+# Starts the server on a background thread and returns it; call .shutdown() when done
+def start_prediction_server(model, **kwargs):
+    server = make_prediction_server(model, **kwargs)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+# The feature and target names of a model (from the artifact's metadata when it has them)
+def model_columns(name):
+    path = model_path(name)
+    if not path.endswith('.model'):
+        return FEATURES, TARGETS
+    metadata = read_metadata(path)
+    return metadata['features'] or FEATURES, metadata['targets'] or TARGETS
+
+# The model and its feature/target names. compiled flattens the tree ensembles (fast_trees.py), which
+# predicts the small batches of a service several times faster.
+def load_service_model(name, compiled=False):
+    model = load_model(model_path(name))
+    if compiled:
+        model = compile_model(model)
+    features, targets = model_columns(name)
+    return model, features, targets
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve temperature predictions of the trained model over HTTP')
+    parser.add_argument('--model', default='model_YearMonthCO2GDP', help='model name, the .model artifact or the .xz pickle is loaded')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8001)
+    parser.add_argument('--max-batch-size', type=int, default=4096, help='most rows predicted in one call into the model')
+    parser.add_argument('--max-wait-ms', type=float, default=5, help='how long a batch waits for more requests after the first one')
+    parser.add_argument('--compiled', action='store_true', help='predict with the flattened tree ensembles of fast_trees.py')
+    parser.add_argument('--verbose', action='store_true', help='log every request')
+    args = parser.parse_args()
+
+    start = time.monotonic()
+    model, features, targets = load_service_model(args.model, args.compiled)
+    print(f'Loaded {args.model} in {time.monotonic() - start:.2f}s')
+    server = make_prediction_server(model, features, targets, args.host, args.port,
+                                    args.max_batch_size, args.max_wait_ms / 1000, args.verbose)
+    print(f'Prediction service listening on http://{args.host}:{args.port}/predict (stats on /stats)')
+    server.serve_forever()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,37 @@
+import matplotlib.pyplot as plt
+import seaborn
+
+# The figures of 3-FinalModelResults.py. The script computes the residuals and predictions and describes each
+# figure with a common.figures.FigureSpec; these functions only draw them (with seaborn's theme, which
+# common.figures.render_figures resets after every figure).
+
+# Histogram of the residuals of the averaged max and min temperature predictions of the best model
+def residuals_histogram(residuals, bins=20):
+    seaborn.set_theme()
+    fig = plt.figure()
+    plt.title('Histogram of Best Model Averaged Residuals')
+    plt.xlabel('Temperature (°C) Residuals')
+    plt.ylabel('Frequency')
+    plt.hist(residuals, bins=bins)
+    return fig
+
+# Actual and predicted max and min temperature of every month, averaged across the cities
+def predictions_vs_actual(aggregated):
+    seaborn.set_theme()
+    fig = plt.figure(figsize=(12, 8))
+    months = aggregated['year'] + aggregated['month'] / 12
+
+    # Plot actual vs predicted temperature max
+    plt.subplot(2, 1, 1)
+    plt.plot(months, aggregated['temperature_2m_max'], label='Actual Max Temperature', marker='o')
+    plt.plot(months, aggregated['predicted_max'], label='Predicted Max Temperature', marker='x')
+    plt.plot(months, aggregated['temperature_2m_min'], label='Actual Min Temperature', marker='o', alpha=0.7, linestyle='--')
+    plt.plot(months, aggregated['predicted_min'], label='Predicted Min Temperature', marker='x', linestyle='dotted', alpha=0.8)
+    plt.title('Actual vs Predicted Temperatures (Averaged Across Cities)')
+    plt.xlabel('Year')
+    plt.ylabel('Temperature (°C)')
+    plt.legend()
+    plt.grid(True)
+
+    plt.tight_layout()
+    return fig
@@ -0,0 +1,242 @@
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from threadpoolctl import threadpool_limits
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.storage import read_dataset, write_dataset
+from common.regions import CONTINENTS, country_of
+from prediction_service import load_service_model, model_columns
+import fast_trees
+
+# What-if sweeps of the trained model over CO2 and GDP scenarios.
+#
+# A sweep is declared in a JSON file (see scenarios_example.json):
+#   {"base": "../Combined_Data_2011_2013",           the rows every scenario starts from
+#    "years": [2014, 2030],                          optional: repeat the last base year for each of these years
+#    "perturbations": [                              every combination of their multipliers is one scenario
+#        {"name": "co2", "column": "megatonnes CO2", "multipliers": [0.6, 0.8, 1.0],
+#         "cities": ["Albany"], "years": [2020, 2030]},         only these cities (or "regions") and years
+#        {"name": "gdp", "column": "GDP per Capita", "multipliers": [0.9, 1.0, 1.1]}],
+#    "group_by": ["region"]}                         means per scenario and group (city, region, country,
+#                                                    continent, year, month, or none for one mean per scenario)
+#
+# The grid (scenarios x base rows) is never built as a whole: workers build it a chunk of scenarios at a time,
+# predict the chunk with one call into the model and send back only the sums of the predictions per scenario
+# and group, which the parent adds into the result. Memory is bounded by the chunk size and the result table,
+# however many rows the sweep has. The workers load the model from its artifact, whose memory-mapped arrays
+# they share through the page cache (see artifact.py), and can predict with the flattened trees of fast_trees.py.
+
+PERTURBABLE = ['megatonnes CO2', 'GDP per Capita']
+GROUPS = ['city', 'region', 'country', 'continent', 'year', 'month']
+# chunks waiting for a worker, per worker, so the chunks are built as they are needed
+CHUNKS_IN_FLIGHT = 2
+
+# A multiplier on one column for the rows of some cities or regions (all of them when neither is given) within
+# a year range. Perturbations of the same column multiply.
+class Perturbation:
+    def __init__(self, column, multipliers, name=None, cities=None, regions=None, years=None):
+        if column not in PERTURBABLE:
+            raise ValueError(f'Perturbations can change {PERTURBABLE}, not {column!r}')
+        if not multipliers:
+            raise ValueError(f'The perturbation of {column!r} has no multipliers')
+        if years is not None and len(years) != 2:
+            raise ValueError(f'years must be [first, last], not {years!r}')
+        self.column = column
+        self.multipliers = np.asarray(multipliers, dtype=np.float64)
+        self.name = name or column
+        self.cities = cities
+        self.regions = regions
+        self.years = years
+
+    # The base rows the perturbation applies to
+    def mask(self, base):
+        mask = np.ones(len(base), dtype=bool)
+        if self.cities is not None:
+            unknown = set(self.cities) - set(base['city'])
+            if unknown:
+                raise ValueError(f'Unknown cities in the perturbation {self.name!r}: {sorted(unknown)}')
+            mask &= base['city'].isin(self.cities).to_numpy()
+        if self.regions is not None:
+            unknown = set(self.regions) - set(base['region'])
+            if unknown:
+                raise ValueError(f'Unknown regions in the perturbation {self.name!r}: {sorted(unknown)}')
+            mask &= base['region'].isin(self.regions).to_numpy()
+        if self.years is not None:
+            mask &= base['year'].between(*self.years).to_numpy()
+        return mask
+
+# Every combination of the perturbations' multipliers applied to the base rows. Scenario s has the multipliers
+# np.unravel_index(s, shape), and its rows are the base rows in order.
+class ScenarioGrid:
+    def __init__(self, base, perturbations, group_by, features):
+        names = [perturbation.name for perturbation in perturbations]
+        if len(set(names)) != len(names):
+            raise ValueError(f'Perturbation names must be unique, got {names}')
+        unknown = set(group_by) - set(GROUPS)
+        if unknown:
+            raise ValueError(f'Unknown group_by {sorted(unknown)}, expected some of {GROUPS}')
+        self.perturbations = perturbations
+        self.features = list(features)
+        self.group_by = list(group_by)
+        self.X = base[self.features].to_numpy(dtype=np.float64)
+        self.masks = [perturbation.mask(base) for perturbation in perturbations]
+        self.columns = [self.features.index(perturbation.column) for perturbation in perturbations]
+        self.shape = tuple(len(perturbation.multipliers) for perturbation in perturbations)
+        self.n_scenarios = int(np.prod(self.shape, dtype=np.int64))
+        if self.group_by:
+            grouped = base.groupby(self.group_by, sort=True)
+            self.group_codes = grouped.ngroup().to_numpy()
+            self.groups = grouped.size().reset_index()[self.group_by]
+        else:
+            self.group_codes = np.zeros(len(base), dtype=np.int64)
+            self.groups = pd.DataFrame(index=[0])
+        self.group_rows = np.bincount(self.group_codes, minlength=len(self.groups))
+
+    @property
+    def rows(self):
+        return self.n_scenarios * len(self.X)
+
+    # The multipliers of scenarios start to stop, one column per perturbation
+    def multipliers(self, start, stop):
+        if not self.perturbations:
+            return pd.DataFrame(index=range(stop - start))
+        levels = np.unravel_index(np.arange(start, stop), self.shape)
+        return pd.DataFrame({perturbation.name: perturbation.multipliers[level]
+                             for perturbation, level in zip(self.perturbations, levels)})
+
+    # The features of the rows of scenarios start to stop
+    def chunk(self, start, stop):
+        scenarios = stop - start
+        X = np.tile(self.X, (scenarios, 1))
+        multipliers = self.multipliers(start, stop)
+        for perturbation, mask, column in zip(self.perturbations, self.masks, self.columns):
+            factor = np.repeat(multipliers[perturbation.name].to_numpy(), len(self.X))
+            X[:, column] *= np.where(np.tile(mask, scenarios), factor, 1.0)
+        return X
+
+    # Sums of the predictions and of the perturbed columns per scenario and group of scenarios start to stop,
+    # (scenarios x groups) x values
+    def aggregate(self, predict, start, stop):
+        X = self.chunk(start, stop)
+        values = np.column_stack([predict(X), X[:, [self.features.index(column) for column in PERTURBABLE]]])
+        n_groups = len(self.groups)
+        keys = (np.repeat(np.arange(stop - start), len(self.X)) * n_groups + np.tile(self.group_codes, stop - start))
+        return np.column_stack([np.bincount(keys, weights=values[:, i], minlength=(stop - start) * n_groups)
+                                for i in range(values.shape[1])])
+
+# The rows every scenario starts from, with the region (state_or_province), country and continent of every city.
+# With years, the last year of the base data is repeated for each of them.
+def scenario_base(path, features, years=None):
+    base = read_dataset(path, columns=list(dict.fromkeys(features + ['year', 'month', 'city', 'state_or_province'])),
+                        schema='combined')
+    if years is not None:
+        last_year = base[base['year'] == base['year'].max()]
+        base = pd.concat([last_year.assign(year=year) for year in range(years[0], years[1] + 1)], ignore_index=True)
+    base = base.rename(columns={'state_or_province': 'region'})
+    base['country'] = country_of(base['region'])
+    base['continent'] = base['country'].map(CONTINENTS)
+    return base.reset_index(drop=True)
+
+def load_sweep(spec_path, features):
+    with open(spec_path) as f:
+        spec = json.load(f)
+    base_path = os.path.join(os.path.dirname(os.path.abspath(spec_path)), spec['base'])
+    base = scenario_base(base_path, features, spec.get('years'))
+    perturbations = [Perturbation(**perturbation) for perturbation in spec.get('perturbations', [])]
+    return ScenarioGrid(base, perturbations, spec.get('group_by', ['city']), features)
+
+def _predictor(model, features):
+    def predict(X):
+        return np.asarray(model.predict(pd.DataFrame(X, columns=features))).reshape(len(X), -1)
+    return predict
+
+# the grid and model of a worker process, loaded once by _init_worker
+_worker = {}
+
+def _init_worker(grid, model_name, compiled, threads):
+    threadpool_limits(threads)
+    if compiled and fast_trees.numba is not None:
+        fast_trees.numba.set_num_threads(threads)
+    model, features, _ = load_service_model(model_name, compiled)
+    _worker['grid'] = grid
+    _worker['predict'] = _predictor(model, features)
+
+def _aggregate_chunk(start, stop):
+    return start, stop, _worker['grid'].aggregate(_worker['predict'], start, stop)
+
+# Predicts every scenario of grid with the model, chunk_rows rows at a time in workers processes (in this one for
+# a single worker), and returns the mean predictions and perturbed columns per scenario and group
+def run_sweep(grid, model_name, targets, workers=1, chunk_rows=100000, compiled=False, log=print):
+    scenarios_per_chunk = max(1, chunk_rows // len(grid.X))
+    chunks = ((start, min(start + scenarios_per_chunk, grid.n_scenarios))
+              for start in range(0, grid.n_scenarios, scenarios_per_chunk))
+    n_chunks = -(-grid.n_scenarios // scenarios_per_chunk)
+    n_groups = len(grid.groups)
+    sums = np.zeros((grid.n_scenarios * n_groups, len(targets) + len(PERTURBABLE)))
+
+    def add(start, stop, chunk_sums):
+        sums[start * n_groups:stop * n_groups] += chunk_sums
+
+    done = 0
+    if workers == 1:
+        _init_worker(grid, model_name, compiled, os.cpu_count())
+        for start, stop in chunks:
+            add(*_aggregate_chunk(start, stop))
+            done += 1
+            log(f'{done}/{n_chunks} chunks done')
+    else:
+        threads = max(1, os.cpu_count() // workers)
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker,
+                                 initargs=(grid, model_name, compiled, threads)) as pool:
+            pending = set()
+            for start, stop in chunks:
+                if len(pending) >= workers * CHUNKS_IN_FLIGHT:
+                    finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        add(*future.result())
+                        done += 1
+                        log(f'{done}/{n_chunks} chunks done')
+                pending.add(pool.submit(_aggregate_chunk, start, stop))
+            for future in pending:
+                add(*future.result())
+                done += 1
+                log(f'{done}/{n_chunks} chunks done')
+
+    rows = np.tile(grid.group_rows, grid.n_scenarios)
+    means = pd.DataFrame(sums / rows[:, None], columns=list(targets) + PERTURBABLE)
+    scenarios = grid.multipliers(0, grid.n_scenarios)
+    scenarios.insert(0, 'scenario', np.arange(grid.n_scenarios))
+    result = pd.concat([scenarios.loc[scenarios.index.repeat(n_groups)].reset_index(drop=True),
+                        pd.concat([grid.groups] * grid.n_scenarios, ignore_index=True), means], axis=1)
+    result['rows'] = rows
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description='Predict CO2/GDP what-if scenarios with the trained model')
+    parser.add_argument('spec', help='JSON file declaring the sweep, see scenarios_example.json')
+    parser.add_argument('--model', default='model_YearMonthCO2GDP', help='model name, the .model artifact or the .xz pickle is loaded')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='prediction processes')
+    parser.add_argument('--chunk-rows', type=int, default=100000, help='grid rows predicted at once by a worker')
+    parser.add_argument('--compiled', action='store_true', help='predict with the flattened tree ensembles of fast_trees.py')
+    parser.add_argument('--output', default='Scenario_Results', help='dataset the means are written to (without extension)')
+    args = parser.parse_args()
+
+    features, targets = model_columns(args.model)
+    grid = load_sweep(args.spec, features)
+    print(f'{grid.n_scenarios} scenarios x {len(grid.X)} base rows = {grid.rows} rows, '
+          f'{len(grid.groups)} groups per scenario')
+    start = time.perf_counter()
+    result = run_sweep(grid, args.model, targets, args.workers, args.chunk_rows, args.compiled)
+    elapsed = time.perf_counter() - start
+    print(f'Predicted {grid.rows} rows in {elapsed:.1f}s ({grid.rows / elapsed:.0f} rows/s)')
+    print(f'Wrote {write_dataset(result, args.output)}')
+
+if __name__ == '__main__':
+    main()
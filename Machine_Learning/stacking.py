@@ -0,0 +1,96 @@
+import numpy as np
+from joblib import Parallel, delayed
+from sklearn.base import BaseEstimator, RegressorMixin, clone
+from sklearn.linear_model import LinearRegression
+from sklearn.model_selection import check_cv
+from sklearn.utils.validation import check_is_fitted
+
+# Stacking for several targets at once, the multi-output version of MultiOutputRegressor(StackingRegressor(...)).
+#
+# MultiOutputRegressor refits the whole stack for every target, including the base models that can predict
+# all the targets together (RandomForest, KNN, LinearRegression). Here those are fitted once per fold and once
+# on all the rows, and only the single-output models (GradientBoosting) are fitted per target. Every fit of
+# every fold is run in one joblib batch. The out-of-fold predictions are kept in oof_predictions_
+# (rows x base models x targets), and each target gets its own final estimator trained on the base models'
+# predictions of that target, like StackingRegressor does for a single target.
+
+def _supports_multioutput(estimator):
+    try:
+        return estimator.__sklearn_tags__().target_tags.multi_output # scikit-learn >= 1.6
+    except AttributeError:
+        return estimator._get_tags().get('multioutput', False)
+
+def _fit_predict(estimator, X, y, train, test):
+    estimator = clone(estimator).fit(X[train], y[train])
+    return estimator.predict(X[test]) if test is not None else estimator
+
+class MultiOutputStackingRegressor(RegressorMixin, BaseEstimator):
+    def __init__(self, estimators, final_estimator=None, cv=5, n_jobs=None, passthrough=False):
+        self.estimators = estimators
+        self.final_estimator = final_estimator
+        self.cv = cv
+        self.n_jobs = n_jobs
+        self.passthrough = passthrough
+
+    def fit(self, X, y):
+        X, y = np.asarray(X), np.asarray(y)
+        if y.ndim == 1:
+            y = y.reshape(-1, 1)
+        n_targets = y.shape[1]
+        folds = list(check_cv(self.cv, y[:, 0]).split(X, y[:, 0]))
+        everything = np.arange(len(X))
+        self.multioutput_ = [_supports_multioutput(estimator) for _, estimator in self.estimators]
+
+        # one task per (base model, target or all targets, fold), plus the fit on all the rows (test=None)
+        tasks = []
+        for i, (_, estimator) in enumerate(self.estimators):
+            targets = [None] if self.multioutput_[i] else range(n_targets)
+            for target in targets:
+                target_y = y if target is None else y[:, target]
+                for train, test in folds + [(everything, None)]:
+                    tasks.append((i, target, test, delayed(_fit_predict)(estimator, X, target_y, train, test)))
+        results = Parallel(n_jobs=self.n_jobs)(task for *_, task in tasks)
+
+        self.oof_predictions_ = np.empty((len(X), len(self.estimators), n_targets))
+        self.estimators_ = [[None] * n_targets if not multioutput else None for multioutput in self.multioutput_]
+        for (i, target, test, _), result in zip(tasks, results):
+            if test is None:
+                if target is None:
+                    self.estimators_[i] = result
+                else:
+                    self.estimators_[i][target] = result
+            elif target is None:
+                self.oof_predictions_[test, i, :] = result.reshape(len(test), n_targets)
+            else:
+                self.oof_predictions_[test, i, target] = result
+
+        final_estimator = self.final_estimator if self.final_estimator is not None else LinearRegression()
+        self.final_estimators_ = [
+            clone(final_estimator).fit(self._meta_features(X, self.oof_predictions_[:, :, target]), y[:, target])
+            for target in range(n_targets)
+        ]
+        self.n_targets_ = n_targets
+        return self
+
+    def _meta_features(self, X, predictions):
+        return np.hstack([predictions, X]) if self.passthrough else predictions
+
+    # Predictions of every base model fitted on all the rows, rows x base models x targets
+    def transform(self, X):
+        check_is_fitted(self, 'final_estimators_')
+        X = np.asarray(X)
+        predictions = np.empty((len(X), len(self.estimators), self.n_targets_))
+        for i, fitted in enumerate(self.estimators_):
+            if self.multioutput_[i]:
+                predictions[:, i, :] = fitted.predict(X).reshape(len(X), self.n_targets_)
+            else:
+                for target, estimator in enumerate(fitted):
+                    predictions[:, i, target] = estimator.predict(X)
+        return predictions
+
+    def predict(self, X):
+        X = np.asarray(X)
+        predictions = self.transform(X)
+        y_pred = np.column_stack([final.predict(self._meta_features(X, predictions[:, :, target]))
+                                  for target, final in enumerate(self.final_estimators_)])
+        return y_pred if self.n_targets_ > 1 else y_pred.ravel()
@@ -0,0 +1,209 @@
+import json
+import math
+import os
+import time
+import numpy as np
+from sklearn.base import clone
+from sklearn.model_selection import KFold, ParameterGrid, cross_val_score
+from artifact import data_fingerprint
+
+# Budgeted hyperparameter search used by 1-HyperparameterTuning.py instead of exhaustive grids.
+#
+# Configurations are drawn from the same grids as the exhaustive search and compared with successive
+# halving: every configuration is scored with a small resource, the best 1/eta are promoted to eta times
+# the resource, and so on until the full resource. The resource is n_estimators for the forests and
+# boosting models (the parameter is taken out of the grid) or the number of training rows (SAMPLES).
+# Hyperband runs several halving brackets that trade the number of configurations against their starting
+# resource. Configurations come from a seeded random sampler or from optuna's TPE sampler, which picks
+# new ones from the scores seen so far (pip install optuna).
+#
+# Every score is appended to a JSON lines trial log as soon as it is computed, keyed on the model, the data,
+# the configuration and the resource. The samplers are seeded, so running the same search again replays the
+# logged scores without refitting and an interrupted search continues where it stopped. When the wall clock
+# deadline passes, or the next fit would not finish before it (judging by the seconds per unit of resource of
+# the fits so far), no new fits are started and the best configuration found so far is returned. The first
+# fit of a search has nothing to go by, so it always runs.
+
+SAMPLES = 'n_samples'
+
+
+class BudgetExceeded(Exception):
+    pass
+
+class TrialLog:
+    def __init__(self, path):
+        self.path = path
+        self.trials = {}
+        if path is not None and os.path.exists(path):
+            with open(path, 'r') as f:
+                for line in f:
+                    if line.strip():
+                        trial = json.loads(line)
+                        self.trials[trial['key']] = trial
+
+    def get(self, key):
+        return self.trials.get(key)
+
+    def record(self, key, trial):
+        self.trials[key] = trial
+        if self.path is None:
+            return
+        # one line per trial, flushed right away so an interrupted search loses at most the running fit
+        with open(self.path, 'a') as f:
+            f.write(json.dumps(dict(trial, key=key), default=repr) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+# Draws distinct configurations from the grid uniformly at random
+class RandomSampler:
+    def __init__(self, grid, seed=0):
+        self.grid = ParameterGrid(grid)
+        self.rng = np.random.default_rng(seed)
+        self.seen = set()
+
+    def propose(self, n):
+        remaining = len(self.grid) - len(self.seen)
+        configs = []
+        while len(configs) < min(n, remaining):
+            index = int(self.rng.integers(len(self.grid)))
+            if index not in self.seen:
+                self.seen.add(index)
+                configs.append(self.grid[index])
+        return configs
+
+    def observe(self, config, score):
+        pass
+
+# Asks optuna's TPE sampler for configurations, telling it the score each one reached at the end of its bracket
+class TPESampler:
+    def __init__(self, grid, seed=0):
+        optuna = _optuna()
+        optuna.logging.set_verbosity(optuna.logging.WARNING)
+        self.grid = {param: list(values) for param, values in grid.items()}
+        self.study = optuna.create_study(direction='maximize', sampler=optuna.samplers.TPESampler(seed=seed))
+        self.trials = {}
+
+    def propose(self, n):
+        configs = []
+        for _ in range(n):
+            trial = self.study.ask()
+            # the sampler picks positions in the grid lists, so values like estimators can be searched too
+            config = {param: values[trial.suggest_categorical(param, list(range(len(values))))]
+                      for param, values in self.grid.items()}
+            self.trials[config_key(config)] = trial
+            configs.append(config)
+        return configs
+
+    def observe(self, config, score):
+        trial = self.trials.pop(config_key(config), None)
+        if trial is not None:
+            self.study.tell(trial, score if np.isfinite(score) else None,
+                            state=None if np.isfinite(score) else _optuna().trial.TrialState.FAIL)
+
+def _optuna():
+    try:
+        import optuna
+    except ImportError as e:
+        raise ImportError('The tpe sampler needs optuna: pip install optuna') from e
+    return optuna
+
+SAMPLERS = {'random': RandomSampler, 'tpe': TPESampler}
+
+def config_key(config):
+    return json.dumps(config, sort_keys=True, default=repr)
+
+# Number of halving rounds between min_resource and max_resource
+def max_bracket(min_resource, max_resource, eta):
+    return int(math.floor(math.log(max_resource / min_resource, eta) + 1e-9))
+
+# Searches grid for the configuration of model with the best cross validated score.
+#
+# mode 'halving' runs one successive halving bracket starting at min_resource, 'hyperband' runs all the
+# brackets, iterations times. Returns a dict with the best params (including the resource parameter at
+# its full value), its score and the number of configurations scored, fitted and taken from the log.
+def budgeted_search(name, model, grid, X, y, resource, min_resource, max_resource=None, mode='hyperband',
+                    sampler='random', eta=3, iterations=1, cv=5, scoring='explained_variance', n_jobs=None,
+                    trial_log=None, deadline=None, seed=0, log=print):
+    grid = dict(grid)
+    if resource != SAMPLES:
+        max_resource = max_resource or max(grid[resource])
+        grid.pop(resource, None)
+    else:
+        max_resource = max_resource or len(X)
+    trial_log = trial_log if isinstance(trial_log, TrialLog) else TrialLog(trial_log)
+    fingerprint = data_fingerprint(X, y)
+    folds = KFold(n_splits=cv, shuffle=True, random_state=seed)
+    stats = {'scored': 0, 'fitted': 0, 'from_log': 0, 'budget_exceeded': False}
+    results = []
+    seconds_per_resource = []
+
+    def evaluate(config, resource_value):
+        key = json.dumps([name, fingerprint, config_key(config), resource, resource_value, cv, scoring, seed], default=repr)
+        trial = trial_log.get(key)
+        if trial is not None:
+            score = trial['score']
+            stats['from_log'] += 1
+        else:
+            expected = max(seconds_per_resource, default=0) * resource_value
+            if deadline is not None and time.monotonic() + expected >= deadline:
+                raise BudgetExceeded()
+            estimator = clone(model).set_params(**config)
+            X_fit, y_fit = X, y
+            if resource == SAMPLES:
+                X_fit, y_fit = X.iloc[:resource_value], y.iloc[:resource_value]
+            else:
+                estimator.set_params(**{resource: resource_value})
+            start = time.monotonic()
+            with np.errstate(invalid='ignore'): # some weird runtime errors can happen sometimes, just ignore it
+                scores = cross_val_score(estimator, X_fit, y_fit, cv=folds, scoring=scoring, n_jobs=n_jobs)
+            score = float(np.mean(scores)) if np.all(np.isfinite(scores)) else float('-inf')
+            trial = {'model': name, 'params': config, 'resource': resource_value, 'score': score,
+                     'seconds': round(time.monotonic() - start, 3)}
+            trial_log.record(key, trial)
+            stats['fitted'] += 1
+        seconds_per_resource.append(trial['seconds'] / resource_value)
+        stats['scored'] += 1
+        results.append((resource_value, score, config))
+        return score
+
+    def successive_halving(configs, bracket_resource):
+        while True:
+            resource_value = max(1, int(round(min(bracket_resource, max_resource))))
+            scores = [evaluate(config, resource_value) for config in configs]
+            if bracket_resource >= max_resource:
+                return list(zip(configs, scores))
+            # keep the best 1/eta (stable for ties, so a replay from the log promotes the same ones)
+            order = sorted(range(len(configs)), key=lambda i: -scores[i])
+            survivors = max(1, len(configs) // eta)
+            finished = [(configs[i], scores[i]) for i in order[survivors:]]
+            for config, score in finished:
+                search_sampler.observe(config, score)
+            configs = [configs[i] for i in order[:survivors]]
+            bracket_resource *= eta
+
+    s_max = max_bracket(min_resource, max_resource, eta)
+    brackets = [s_max] if mode == 'halving' else list(range(s_max, -1, -1))
+    search_sampler = SAMPLERS[sampler](grid, seed=seed)
+    try:
+        for _ in range(iterations):
+            for s in brackets:
+                n = int(math.ceil((s_max + 1) / (s + 1) * eta ** s)) if mode == 'hyperband' else eta ** s
+                configs = search_sampler.propose(n)
+                if not configs:
+                    break
+                for config, score in successive_halving(configs, max_resource / eta ** s):
+                    search_sampler.observe(config, score)
+    except BudgetExceeded:
+        stats['budget_exceeded'] = True
+        log(f'{name}: time budget used up, returning the best configuration found so far')
+
+    if not results:
+        return dict(stats, best_params=None, best_score=None, resource=None)
+    # configurations are only compared at the largest resource any of them reached
+    top_resource = max(resource_value for resource_value, score, config in results)
+    best_resource, best_score, best_config = max(
+        (result for result in results if result[0] == top_resource), key=lambda result: result[1])
+    best_params = dict(best_config)
+    if resource != SAMPLES:
+        best_params[resource] = best_resource
+    return dict(stats, best_params=best_params, best_score=best_score, resource=best_resource)
@@ -12,6 +12,10 @@ Citations: The code referenced the notes from class and the following websites:
 import numpy as np
 import pandas as pd
 import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.interpolation import interpolate_monthly
+from common.excel_cache import read_excel_cached, cache_report
 
 MAX_YEAR = 2015
 MIN_YEAR = 2000
@@ -19,37 +23,20 @@ MIN_YEAR = 2000
 file_path = "Manual_Population_data_collection.xlsx"
 dir_path = "population_datasets/"
 
-def interpolate_monthly_data(data):
-    interpolated_data = []
-
-    for city, group in data.groupby('City'):
-        group['date'] = pd.to_datetime(group['Year'].astype(str) + '-01-01')
-        group.set_index('date', inplace=True)
-        monthly_index = pd.date_range(start=group.index.min(), end=group.index.max(), freq='MS')
-        group = group.reindex(monthly_index)
-        group['City'] = city
-        group['Population'] = group['Population'].interpolate(method='linear')
-        group.reset_index(inplace=True)
-        group.rename(columns={'index': 'date'}, inplace=True)
-        group['Year'] = group['date'].dt.year
-        group['Month'] = group['date'].dt.month
-        interpolated_data.append(group)
-    return pd.concat(interpolated_data, ignore_index=True)
-
 def process_file(file_path, city_name):
     dtypes = {'Year': int, 'Population': str}
     
     if file_path.endswith('.csv'):
         data = pd.read_csv(file_path, usecols=['Year', 'Population'], dtype=dtypes)
     elif file_path.endswith('.xlsx'):
-        data = pd.read_excel(file_path, usecols=['Year', 'Population'])
+        data = read_excel_cached(file_path, usecols=['Year', 'Population'])
     else:
         print(f"Skipping unsupported file format: {file_path}")
         return None
     
     data['City'] = city_name
     data['Population'] = data['Population'].str.replace(',', '').astype(float)
-    interpolated_data = interpolate_monthly_data(data)
+    interpolated_data = interpolate_monthly(data, 'City', 'Population', year_col='Year', month_col='Month')
     return interpolated_data
 
 def handle_Directory(dir_path):
@@ -66,9 +53,9 @@ def main():
     if file_path.endswith('.csv'):
         data = pd.read_csv(file_path)
     elif file_path.endswith('.xlsx'):
-        data = pd.read_excel(file_path)
+        data = read_excel_cached(file_path)
     
-    interpolated_data = interpolate_monthly_data(data)
+    interpolated_data = interpolate_monthly(data, 'City', 'Population', year_col='Year', month_col='Month')
     
     
     dir_data = handle_Directory(dir_path)
@@ -76,6 +63,7 @@ def main():
     Final = Final[(Final['Year'] >= MIN_YEAR) & (Final['Year'] <=MAX_YEAR)]
     
     Final.to_csv('Population_data.csv', index=False)
+    print(cache_report())
     
 
 if __name__ == '__main__':
@@ -9,13 +9,16 @@ import numpy as np
 import pandas as pd
 import sys
 import os
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.storage import write_dataset
+from common.excel_cache import read_excel_cached, cache_report
 
 area_path = "Manual_area_collection.xlsx"
 population_path = "Population_data.csv"
     
 def main():
 
-    area_data = pd.read_excel(area_path)
+    area_data = read_excel_cached(area_path)
     population_data = pd.read_csv(population_path)
     area_data['City'] = area_data['City'].astype(str)
     population_data['City'] = population_data['City'].astype(str)
@@ -26,7 +29,8 @@ def main():
     
     print(merged_data.columns)
     
-    merged_data.to_csv('Population_density.csv', index=False)
+    write_dataset(merged_data, 'Population_density', schema='population_density')
+    print(cache_report())
     
     
 
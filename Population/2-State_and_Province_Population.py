@@ -1,5 +1,9 @@
 import pandas as pd
 import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.interpolation import interpolate_monthly
+from common.excel_cache import read_excel_cached, cache_report
 
 
 MIN_YEAR = 2000
@@ -12,42 +16,6 @@ usa_abr = "State_Population/usa_abr.xlsx"
 states_dir = "State_Population/States/"
 manual_file = "State_Population/Manual/Manual_State_Pop.xlsx"
 
-def interpolate_monthly_data(data):
-    interpolated_data = []
-
-    for state, group in data.groupby('state'):
-        group['date'] = pd.to_datetime(group['year'].astype(str) + '-01-01')
-        group.set_index('date', inplace=True)
-        monthly_index = pd.date_range(start=group.index.min(), end=group.index.max(), freq='MS')
-        group = group.reindex(monthly_index)
-        group['state'] = state
-        group['population'] = group['population'].interpolate(method='linear')
-        group.reset_index(inplace=True)
-        group.rename(columns={'index': 'date'}, inplace=True)
-        group['year'] = group['date'].dt.year
-        group['month'] = group['date'].dt.month
-        interpolated_data.append(group)
-    return pd.concat(interpolated_data, ignore_index=True)
-
-def interpolate_monthly_data2(data):
-    interpolated_data = []
-
-    for province, group in data.groupby('province'):
-        group['date'] = pd.to_datetime(group['year'].astype(str) + '-01-01')
-        group.set_index('date', inplace=True)
-        monthly_index = pd.date_range(start=group.index.min(), end=group.index.max(), freq='MS')
-        group = group.reindex(monthly_index)
-        group['province'] = province
-        group['population'] = group['population'].interpolate(method='linear')
-        group.reset_index(inplace=True)
-        group.rename(columns={'index': 'date'}, inplace=True)
-        group['year'] = group['date'].dt.year
-        group['month'] = group['date'].dt.month
-        interpolated_data.append(group)
-    return pd.concat(interpolated_data, ignore_index=True)
-
-
-
 def read_province_population_data(province_pop_file):
     pop_data = pd.read_csv(province_pop_file, parse_dates=[0])
     pop_data = pop_data[pop_data['REF_DATE'].dt.month == 10]
@@ -58,7 +26,7 @@ def read_province_population_data(province_pop_file):
     return pop_data
 
 pop_data = read_province_population_data(pop_file)
-province = pd.read_excel(canada_abr)
+province = read_excel_cached(canada_abr)
 
 merged_data = pd.merge(province, pop_data, on=['province'], how='inner')
 
@@ -71,7 +39,7 @@ def process_file(file_path, state_name):
     data['state'] = state_name
     data['year'] = data['date'].dt.year
     data['population'] = data['population'].astype(int) * 1000
-    interpolated_data = interpolate_monthly_data(data)
+    interpolated_data = interpolate_monthly(data, 'state', 'population')
     return interpolated_data
 
 
@@ -87,20 +55,20 @@ def handle_Directory(dir_path):
 
 allData =  handle_Directory(states_dir)
 
-manual_data = pd.read_excel(manual_file)
-manual_data = interpolate_monthly_data(manual_data)
+manual_data = read_excel_cached(manual_file)
+manual_data = interpolate_monthly(manual_data, 'state', 'population')
 
 data = pd.concat([allData, manual_data],ignore_index=True)
 
 
-states = pd.read_excel(usa_abr)
+states = read_excel_cached(usa_abr)
 states['abr'] = states['state'].copy()
 states['state'] = states['Full']
 data = pd.merge(data, states, on=['state'], how='inner')
 data['state_province'] = data['Full']
 data.drop(['Full','state'], axis=1, inplace=True)
 
-merged_data = interpolate_monthly_data2(merged_data)
+merged_data = interpolate_monthly(merged_data, 'province', 'population')
 merged_data.drop(['city','abr'], axis=1, inplace=True)
 merged_data = pd.merge(province, merged_data, on=['province'], how='inner')
 merged_data['state_province'] = merged_data['province']
@@ -112,6 +80,7 @@ data = data[(data['year'] >= MIN_YEAR)]
 
 
 data.to_csv('state_province_population.csv', index=False)
+print(cache_report())
 
 
 
@@ -1,76 +1,56 @@
-import pandas as pd
-import matplotlib.pyplot as plt
-import numpy as np
 import statsmodels.api as sm
-from statsmodels.nonparametric.smoothers_lowess import lowess
-
-# Load the dataset
-file_path = "../Combined_Data.csv"  
-data = pd.read_csv(file_path)
-
-# Filter data for years 2000 to 2010
-data['year'] = pd.to_numeric(data['year'], errors='coerce')
-filtered_data = data[(data['year'] >= 2000) & (data['year'] <= 2010)]
-
-# Calculate monthly averages across all cities for emissions, GDP, and temperatures
-monthly_avg = filtered_data.groupby(['year', 'month']).agg({
-    'megatonnes CO2': 'mean',
-    'GDP per Capita': 'mean',
-    'temperature_2m_max': 'mean',
-    'temperature_2m_min': 'mean'
-}).reset_index()
-
-monthly_avg['month_count'] = (monthly_avg['year'] - 2000) * 12 + monthly_avg['month']
-
-# Function to perform linear regression and plot
-def plot_with_loess_and_regression(data, x, y, ax, title, y_label):
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.figures import FigureSpec, render_figures
+from analysis_context import AnalysisContext
+import plots
+from smoothing import fast_lowess
+
+# span and robustifying iterations of the LOESS line, this span fits every point with its closest neighbour only
+LOESS_FRAC = 0.0001
+LOESS_ITERATIONS = 3
+
+# Linear regression and LOESS line of y over x, the data of one panel of plots.monthly_regressions
+def regression_with_loess(data, x, y, title, y_label):
     X = sm.add_constant(data[x])  
     model = sm.OLS(data[y], X).fit()
     predictions = model.predict(X)
     p_value = model.pvalues.iloc[1] 
 
     # LOESS for best fit line (no smoothing)
-    loess_result = lowess(data[y], data[x], frac=0.0001)
-    
-    ax.scatter(data[x], data[y], alpha=0.5, label='Data Points')
-    ax.plot(data[x], predictions, color='blue', linestyle='--', label=f'Linear Regression (p={p_value:.3f})')
-    ax.plot(loess_result[:, 0], loess_result[:, 1], color='red', label='LOESS Best Fit')
-    ax.set_title(title)
-    ax.set_xlabel('Year')
-    ax.set_ylabel(y_label)
-
-    ax.set_xticks(np.arange(0, 121, 12))  
-    ax.set_xticklabels(range(2000, 2011))  
-    ax.legend()
-
-    return p_value
-
-# Create subplots for emissions, GDP, temp_max, and temp_min
-fig, axes = plt.subplots(2, 2, figsize=(15, 10))
-p_values = {}
-
-p_values['Emissions'] = plot_with_loess_and_regression(
-    monthly_avg, 'month_count', 'megatonnes CO2', axes[0, 0], 
-    "Emissions vs Months (2000-2010)", "Megatonnes CO2")
-
-p_values['GDP'] = plot_with_loess_and_regression(
-    monthly_avg, 'month_count', 'GDP per Capita', axes[0, 1], 
-    "GDP per Capita vs Months (2000-2010)", "GDP per Capita")
-
-p_values['Temp Max'] = plot_with_loess_and_regression(
-    monthly_avg, 'month_count', 'temperature_2m_max', axes[1, 0], 
-    "Temperature Max vs Months (2000-2010)", "Temperature Max (°C)")
-
-p_values['Temp Min'] = plot_with_loess_and_regression(
-    monthly_avg, 'month_count', 'temperature_2m_min', axes[1, 1], 
-    "Temperature Min vs Months (2000-2010)", "Temperature Min (°C)")
-
-plt.tight_layout()
-output_file = "Monthly_Data_Plots_Yearly_Labels_Fixed.png"
-plt.savefig(output_file)
-#plt.show()
-
-print("P-values for the linear regression:")
-for key, value in p_values.items():
-    print(f"{key}: {value:.6e}")
-
+    loess_result = fast_lowess(data[y], data[x], frac=LOESS_FRAC, it=LOESS_ITERATIONS)
+
+    return {'x': data[x].to_numpy(), 'y': data[y].to_numpy(), 'predictions': predictions.to_numpy(),
+            'p_value': p_value, 'loess_x': loess_result[:, 0], 'loess_y': loess_result[:, 1],
+            'title': title, 'y_label': y_label}
+
+# Linear regressions of the monthly averages of the cities of filters (all of them by default) over time, and
+# the spec of their figure
+def run(context, output_dir='.', **filters):
+    monthly_avg = context.monthly_means(**filters)
+
+    # Panels for emissions, GDP, temp_max, and temp_min
+    panels = [
+        regression_with_loess(monthly_avg, 'month_count', 'megatonnes CO2',
+                              "Emissions vs Months (2000-2010)", "Megatonnes CO2"),
+        regression_with_loess(monthly_avg, 'month_count', 'GDP per Capita',
+                              "GDP per Capita vs Months (2000-2010)", "GDP per Capita"),
+        regression_with_loess(monthly_avg, 'month_count', 'temperature_2m_max',
+                              "Temperature Max vs Months (2000-2010)", "Temperature Max (°C)"),
+        regression_with_loess(monthly_avg, 'month_count', 'temperature_2m_min',
+                              "Temperature Min vs Months (2000-2010)", "Temperature Min (°C)"),
+    ]
+    p_values = {key: panel['p_value'] for key, panel in zip(['Emissions', 'GDP', 'Temp Max', 'Temp Min'], panels)}
+
+    print("P-values for the linear regression:")
+    for key, value in p_values.items():
+        print(f"{key}: {value:.6e}")
+    output_file = os.path.join(output_dir, "Monthly_Data_Plots_Yearly_Labels_Fixed.png")
+    return [FigureSpec(output_file, plots.monthly_regressions, panels)]
+
+def main():
+    render_figures(run(AnalysisContext()))
+
+if __name__ == '__main__':
+    main()
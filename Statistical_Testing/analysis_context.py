@@ -0,0 +1,117 @@
+import os
+import re
+import sys
+import pandas as pd
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.storage import read_dataset
+from common.regions import country_of
+
+# Shared state of the statistical analyses (1-Linear_Test.py, 1.1-Temp_Test.py, 2-Relationship_Testing.py and
+# 2.1-Relation_Plots.py), so they can run one after another in one process instead of each loading the data.
+#
+# AnalysisContext reads the combined data once with the columns all of them use, keeps the years they study and
+# adds the columns they derive (avg_temperature, and the country of every region). The aggregates are memoized
+# per subset of the cities and grouping: the mean of every value column per (year, month) or per year (and per
+# city, region or country for group_statistics.py and decomposition.py) is computed the first time an analysis
+# asks for it and handed out as a copy afterwards, so analyses can change what they get. A subset is given as
+# filters on city, region (state_or_province) or country, e.g. context.monthly_means(region=['ON', 'QC']); no
+# filter is all the cities.
+#
+# Subsets are named on the command line like 'region=ON,QC' or 'country=Canada' (parse_subset), 'region=*'
+# stands for one subset per region of the data (expand_subsets), and 'all' for all the cities.
+
+DATA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Combined_Data')
+YEARS = (2000, 2010)
+LOADED_COLUMNS = ['year', 'month', 'city', 'state_or_province', 'megatonnes CO2', 'GDP per Capita',
+                  'temperature_2m_max', 'temperature_2m_min', 'precipitation_sum', 'wind_speed_10m_max']
+VALUE_COLUMNS = ['megatonnes CO2', 'GDP per Capita', 'temperature_2m_max', 'temperature_2m_min', 'avg_temperature',
+                 'precipitation_sum', 'wind_speed_10m_max']
+# filter name: column of the data it applies to
+FILTERS = {'city': 'city', 'region': 'state_or_province', 'country': 'country'}
+ALL = 'all'
+
+class AnalysisContext:
+    def __init__(self, path=DATA_PATH, years=YEARS, fmt=None):
+        data = read_dataset(path, columns=LOADED_COLUMNS, schema='combined', fmt=fmt)
+        data = data[(data['year'] >= years[0]) & (data['year'] <= years[1])].reset_index(drop=True)
+        data['avg_temperature'] = (data['temperature_2m_max'] + data['temperature_2m_min']) / 2
+        data['country'] = country_of(data['state_or_province'])
+        self.data = data
+        self.years = years
+        self._subsets = {}
+        self._aggregates = {}
+        self.stats = {'hits': 0, 'misses': 0}
+
+    # Hashable key of some filters, the same whatever the order of the filters and of their values
+    @staticmethod
+    def subset_key(filters):
+        unknown = set(filters) - set(FILTERS)
+        if unknown:
+            raise ValueError(f'Unknown filters {sorted(unknown)}, expected some of {list(FILTERS)}')
+        return tuple(sorted((name, tuple(sorted(values))) for name, values in filters.items() if values is not None))
+
+    # The rows of the cities matching all the filters
+    def subset(self, **filters):
+        key = self.subset_key(filters)
+        if key not in self._subsets:
+            mask = pd.Series(True, index=self.data.index)
+            for name, values in key:
+                mask &= self.data[FILTERS[name]].isin(values)
+            if not mask.any():
+                raise ValueError(f'No rows match {dict(key)}')
+            self._subsets[key] = self.data[mask]
+        return self._subsets[key]
+
+    # The mean of every value column per by (columns of data, e.g. ['state_or_province', 'year']), for the rows
+    # of the filters. Monthly means get the month_count (months since January of the first year) and date too.
+    def means(self, by, **filters):
+        key = (tuple(by), self.subset_key(filters))
+        if key in self._aggregates:
+            self.stats['hits'] += 1
+        else:
+            self.stats['misses'] += 1
+            aggregate = self.subset(**filters).groupby(list(by))[VALUE_COLUMNS].mean().reset_index()
+            if 'month' in by:
+                aggregate['month_count'] = (aggregate['year'] - self.years[0]) * 12 + aggregate['month']
+                aggregate['date'] = pd.to_datetime(aggregate[['year', 'month']].assign(day=1))
+            self._aggregates[key] = aggregate
+        return self._aggregates[key].copy()
+
+    # means per by of every city, region or country (level) or of all the cities, with the name of each in 'group'
+    def group_means(self, level, by):
+        if level == ALL:
+            return self.means(by).assign(group=ALL)
+        return self.means([FILTERS[level]] + list(by)).rename(columns={FILTERS[level]: 'group'})
+
+    def monthly_means(self, **filters):
+        return self.means(['year', 'month'], **filters)
+
+    def yearly_means(self, **filters):
+        return self.means(['year'], **filters)
+
+# 'region=ON,QC' -> {'region': ['ON', 'QC']}, 'all' -> {}
+def parse_subset(text):
+    if text == ALL:
+        return {}
+    filters = {}
+    for part in text.split(';'):
+        name, _, values = part.partition('=')
+        if name not in FILTERS or not values:
+            raise ValueError(f'Subsets look like region=ON,QC or country=Canada (filters {list(FILTERS)}), not {text!r}')
+        filters[name] = values.split(',')
+    return filters
+
+# The (name, filters) of every subset of texts, with 'name=*' replaced by one subset per value of that column
+def expand_subsets(texts, context):
+    subsets = []
+    for text in texts:
+        name, _, values = text.partition('=')
+        if values == '*' and name in FILTERS:
+            subsets += [(f'{name}={value}', {name: [value]}) for value in sorted(context.data[FILTERS[name]].unique())]
+        else:
+            subsets.append((text, parse_subset(text)))
+    return subsets
+
+# A name for the files of a subset, e.g. region=ON,QC -> region_ON_QC
+def subset_label(name):
+    return re.sub(r'[^A-Za-z0-9.-]+', '_', name).strip('_')
@@ -0,0 +1,96 @@
+import argparse
+import os
+import time
+import numpy as np
+import pandas as pd
+from statsmodels.nonparametric.smoothers_lowess import lowess
+from analysis_context import AnalysisContext
+from smoothing import fast_lowess, smooth_many, delta_for_bins, numba
+
+# Compares smoothing.py's fast_lowess with statsmodels' lowess.
+#   accuracy  on the monthly averages of 1-Linear_Test.py, for several spans: the largest difference of the exact
+#             fits from statsmodels, as a share of the series' range
+#   speed     on synthetic daily series (a seasonal cycle, a trend and heavy tailed noise) of --sizes points:
+#             the time of statsmodels and of every backend, exact and with --bins, and the difference of the
+#             binned fit from the exact one. The exact fits cost n * frac * n and are skipped above --exact-max-rows.
+#   parallel  --series daily series of the largest size smoothed one after another and by smooth_many in --workers
+#             processes
+TREND_COLUMNS = ['megatonnes CO2', 'GDP per Capita', 'temperature_2m_max', 'temperature_2m_min']
+SPANS = [0.0001, 0.1, 1 / 3, 2 / 3]
+
+def timed(function, *args, **kwargs):
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+def daily_series(n, rng):
+    x = np.arange(n, dtype=np.float64)
+    y = 10 * np.sin(2 * np.pi * x / 365.25) + x / 3650 + rng.standard_t(3, n) * 3
+    return x, y
+
+def relative_difference(result, expected):
+    return np.abs(result[:, 1] - expected[:, 1]).max() / np.ptp(expected[:, 1])
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare the fast LOESS of smoothing.py with statsmodels')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[3650, 36500, 250000], help='points of the daily series')
+    parser.add_argument('--frac', type=float, default=0.1, help='span of the daily series fits')
+    parser.add_argument('--it', type=int, default=3, help='robustifying iterations')
+    parser.add_argument('--bins', type=int, default=500, help='binned fits over the range of x (statsmodels delta)')
+    parser.add_argument('--exact-max-rows', type=int, default=40000, help='skip the exact fits above this many points')
+    parser.add_argument('--series', type=int, default=8, help='series of the parallel comparison (0 to skip it)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    backends = ['numba', 'numpy'] if numba is not None else ['numpy']
+    # compiles the numba kernel before anything is timed
+    fast_lowess(np.arange(10.0), np.arange(10.0))
+
+    monthly = AnalysisContext().monthly_means()
+    accuracy = []
+    for column in TREND_COLUMNS:
+        x, y = monthly['month_count'], monthly[column]
+        for frac in SPANS:
+            expected = lowess(y, x, frac=frac, it=args.it)
+            row = {'series': column, 'frac': frac}
+            for backend in backends:
+                row[f'{backend} exact'] = relative_difference(fast_lowess(y, x, frac, args.it, backend=backend), expected)
+            accuracy.append(row)
+    print('Largest difference from statsmodels on the monthly data, as a share of the range of the series')
+    print(pd.DataFrame(accuracy).to_string(index=False, float_format=lambda value: f'{value:.3g}'))
+
+    rng = np.random.default_rng(args.seed)
+    speed = []
+    for n in args.sizes:
+        x, y = daily_series(n, rng)
+        delta = delta_for_bins(x, args.bins)
+        exact = n <= args.exact_max_rows
+        reference = None
+        if exact:
+            reference, seconds = timed(lowess, y, x, frac=args.frac, it=args.it)
+            speed.append({'points': n, 'method': 'statsmodels', 'fits': 'exact', 'seconds': seconds, 'difference': 0.0})
+        binned, seconds = timed(lowess, y, x, frac=args.frac, it=args.it, delta=delta)
+        speed.append({'points': n, 'method': 'statsmodels', 'fits': f'{args.bins} bins', 'seconds': seconds,
+                      'difference': relative_difference(binned, reference) if exact else np.nan})
+        for backend in backends:
+            if exact:
+                result, seconds = timed(fast_lowess, y, x, args.frac, args.it, backend=backend)
+                speed.append({'points': n, 'method': backend, 'fits': 'exact', 'seconds': seconds,
+                              'difference': relative_difference(result, reference)})
+            result, seconds = timed(fast_lowess, y, x, args.frac, args.it, delta, backend=backend)
+            speed.append({'points': n, 'method': backend, 'fits': f'{args.bins} bins', 'seconds': seconds,
+                          'difference': relative_difference(result, reference) if exact else relative_difference(result, binned)})
+        print(f'{n} points done')
+    print('Time per series and largest difference from the exact statsmodels fit (from the binned one when it is skipped)')
+    print(pd.DataFrame(speed).to_string(index=False, float_format=lambda value: f'{value:.3g}'))
+
+    if args.series:
+        series = [daily_series(max(args.sizes), rng) for _ in range(args.series)]
+        delta = delta_for_bins(series[0][0], args.bins)
+        _, sequential = timed(smooth_many, series, args.frac, args.it, delta, workers=1)
+        _, parallel = timed(smooth_many, series, args.frac, args.it, delta, workers=args.workers)
+        print(f'{args.series} series of {max(args.sizes)} points with {args.bins} bins: {sequential:.2f}s one after '
+              f'another, {parallel:.2f}s in {args.workers} processes')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+import argparse
+import os
+import sys
+import time
+import warnings
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.storage import FORMATS, write_dataset
+from analysis_context import AnalysisContext, FILTERS, ALL
+
+# Seasonal decomposition (the seasonal_decompose of 1.1-Temp_Test.py) of every variable of every city at once.
+#
+# batched_seasonal_decompose takes a (series, time) array of series sharing the same months and period and does
+# what statsmodels' seasonal_decompose does for one series, for all the rows in one pass:
+#   trend     the centred moving average over a period (a 2 x period average for even periods), NaN for the
+#             first and last period // 2 points
+#   seasonal  the mean of the detrended series at every position of the period (ignoring NaN), centred on 0
+#             (additive) or 1 (multiplicative), repeated over the series
+#   resid     what is left of the detrended series
+# The result is the same as seasonal_decompose up to rounding. Missing months are NaN and only leave out their
+# own windows and seasonal means.
+#
+# The components of all the series are written as one long table (the seasonal_components schema: level, group,
+# variable, year, month, observed, trend, seasonal, resid) in the storage format of the other stages, or --format.
+
+MODELS = ['additive', 'multiplicative']
+VARIABLES = ['temperature_2m_max', 'temperature_2m_min', 'precipitation_sum', 'wind_speed_10m_max',
+             'megatonnes CO2', 'GDP per Capita']
+LEVELS = list(FILTERS) + [ALL]
+
+# The weights of the centred moving average of a period
+def moving_average_weights(period):
+    if period % 2 == 0:
+        return np.concatenate([[0.5], np.ones(period - 1), [0.5]]) / period
+    return np.ones(period) / period
+
+# observed, trend, seasonal and resid (series, time) arrays of every row of values, see above
+def batched_seasonal_decompose(values, period=12, model='additive'):
+    if model not in MODELS:
+        raise ValueError(f'Unknown model {model!r}, expected one of {MODELS}')
+    values = np.atleast_2d(np.asarray(values, dtype=np.float64))
+    n_series, n = values.shape
+    if n < 2 * period:
+        raise ValueError(f'A period of {period} needs at least {2 * period} observations, the series have {n}')
+    if model == 'multiplicative' and (values <= 0).any():
+        raise ValueError('The multiplicative model needs positive values')
+    weights = moving_average_weights(period)
+    half = len(weights) // 2
+    trend = np.full_like(values, np.nan)
+    trend[:, half:n - half] = sliding_window_view(values, len(weights), axis=1) @ weights
+    detrended = values - trend if model == 'additive' else values / trend
+
+    # (series, cycles, period), padded with NaN to whole cycles
+    cycles = -(-n // period)
+    padded = np.full((n_series, cycles * period), np.nan)
+    padded[:, :n] = detrended
+    with warnings.catch_warnings():
+        # positions of the period without any value (e.g. a series missing a whole year) stay NaN
+        warnings.simplefilter('ignore', RuntimeWarning)
+        period_means = np.nanmean(padded.reshape(n_series, cycles, period), axis=1)
+        if model == 'additive':
+            period_means -= np.nanmean(period_means, axis=1, keepdims=True)
+        else:
+            period_means /= np.nanmean(period_means, axis=1, keepdims=True)
+    seasonal = np.tile(period_means, cycles)[:, :n]
+    resid = detrended - seasonal if model == 'additive' else detrended / seasonal
+    return {'observed': values, 'trend': trend, 'seasonal': seasonal, 'resid': resid}
+
+# The monthly series of the variables of every group of levels as one (series, months) array over all the months
+# of the context's years, and the (level, group, variable) of every row
+def monthly_series(context, levels, variables):
+    months = pd.MultiIndex.from_product([range(context.years[0], context.years[1] + 1), range(1, 13)],
+                                        names=['year', 'month'])
+    rows, series = [], []
+    for level in levels:
+        means = context.group_means(level, ['year', 'month'])
+        for variable in variables:
+            table = means.pivot(index='group', columns=['year', 'month'], values=variable).reindex(columns=months)
+            rows.append(pd.DataFrame({'level': level, 'group': table.index, 'variable': variable}))
+            series.append(table.to_numpy(dtype=np.float64))
+    return pd.concat(rows, ignore_index=True), np.vstack(series), months
+
+# The long table of the components of every row of rows (level, group, variable) over months
+def components_table(rows, components, months):
+    n = len(months)
+    table = rows.loc[rows.index.repeat(n)].reset_index(drop=True)
+    table['year'] = np.tile(months.get_level_values('year'), len(rows))
+    table['month'] = np.tile(months.get_level_values('month'), len(rows))
+    for name, values in components.items():
+        table[name] = values.ravel()
+    return table
+
+# How much of the variation left after removing the trend is seasonal, 1 - var(resid) / var(seasonal + resid)
+def seasonal_strength(components):
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.maximum(0, 1 - np.nanvar(components['resid'], axis=1)
+                          / np.nanvar(components['seasonal'] + components['resid'], axis=1))
+
+def main():
+    parser = argparse.ArgumentParser(description='Seasonal decomposition of every variable of every city')
+    parser.add_argument('--levels', nargs='+', choices=LEVELS, default=['city'], help='groupings of the cities to decompose')
+    parser.add_argument('--variables', nargs='+', choices=VARIABLES, default=VARIABLES)
+    parser.add_argument('--period', type=int, default=12, help='months per seasonal cycle')
+    parser.add_argument('--model', choices=MODELS, default='additive')
+    parser.add_argument('--format', choices=list(FORMATS), default=None,
+                        help='storage format of the table, CLIMATE_STORAGE_FORMAT or csv by default (parquet and arrow need pyarrow)')
+    parser.add_argument('--output', default='Seasonal_Components', help='dataset the components are written to (without extension)')
+    args = parser.parse_args()
+
+    context = AnalysisContext()
+    rows, values, months = monthly_series(context, args.levels, args.variables)
+    start = time.perf_counter()
+    components = batched_seasonal_decompose(values, args.period, args.model)
+    print(f'Decomposed {len(rows)} series of {len(months)} months in {time.perf_counter() - start:.3f}s')
+
+    strength = rows.assign(seasonal_strength=seasonal_strength(components))
+    print(strength.groupby(['level', 'variable'])['seasonal_strength'].describe()[['mean', 'min', 'max']]
+          .to_string(float_format=lambda value: f'{value:.3f}'))
+    table = components_table(rows, components, months)
+    print(f'Wrote {write_dataset(table, args.output, schema="seasonal_components", fmt=args.format)}')
+
+if __name__ == '__main__':
+    main()
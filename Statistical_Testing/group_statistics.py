@@ -0,0 +1,161 @@
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from scipy import stats
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.storage import write_dataset
+from analysis_context import AnalysisContext, FILTERS, ALL
+
+# The statistics of 1-Linear_Test.py and 2-Relationship_Testing.py for every city, every state or province, each
+# country and all the cities together, computed for all the groups at once instead of one statsmodels fit each.
+#
+# Every test is a simple linear regression of y on x over the months or years of one group:
+#   trend     monthly means of CO2, GDP, max and min temperature against the month count (1-Linear_Test.py)
+#   relation  yearly means of the average temperature, CO2 and GDP against each other (2-Relationship_Testing.py)
+# The series of all the tests are stacked in two (tests, periods) arrays padded with NaN, and batched_regression
+# computes the slope, intercept, Pearson r and the two-sided p-value of the slope (the same as statsmodels' OLS
+# and as the p-value of r) of every row with a few vectorised sums.
+#
+# With --permutations, the p-values are also estimated without assuming normal residuals: y is shuffled within
+# each series and the share of shuffles whose |r| reaches the observed one is the permutation p-value. The
+# shuffles are done in chunks of PERMUTATION_CHUNK, spread over --workers processes; every chunk has its own
+# seed from --seed, so the result does not depend on the number of workers.
+
+LEVELS = list(FILTERS) + [ALL]
+TREND_COLUMNS = ['megatonnes CO2', 'GDP per Capita', 'temperature_2m_max', 'temperature_2m_min']
+RELATION_PAIRS = [('avg_temperature', 'megatonnes CO2'), ('avg_temperature', 'GDP per Capita'),
+                  ('megatonnes CO2', 'GDP per Capita')]
+PERMUTATION_CHUNK = 50
+
+# Slope, intercept, Pearson r, t statistic and p-value of the regression of y on x along the last axis, for every
+# row of x and y (NaN where either is missing is left out of its row)
+def batched_regression(x, y):
+    x, y = np.broadcast_arrays(np.asarray(x, dtype=np.float64), np.asarray(y, dtype=np.float64))
+    valid = np.isfinite(x) & np.isfinite(y)
+    n = valid.sum(axis=-1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        x_mean = np.where(valid, x, 0).sum(axis=-1) / n
+        y_mean = np.where(valid, y, 0).sum(axis=-1) / n
+        dx = np.where(valid, x - x_mean[..., None], 0)
+        dy = np.where(valid, y - y_mean[..., None], 0)
+        sxx, syy, sxy = (dx * dx).sum(axis=-1), (dy * dy).sum(axis=-1), (dx * dy).sum(axis=-1)
+        slope = sxy / sxx
+        residuals = ((dy - slope[..., None] * dx) ** 2).sum(axis=-1)
+        dof = np.where(n > 2, n - 2, np.nan)
+        t = slope / np.sqrt(residuals / dof / sxx)
+        return {'n': n, 'slope': slope, 'intercept': y_mean - slope * x_mean, 'r': sxy / np.sqrt(sxx * syy),
+                't': t, 'p_value': 2 * stats.t.sf(np.abs(t), dof)}
+
+# (group, periods) arrays of the columns, NaN where a group has no mean for a period
+def _series(means, period, columns):
+    return {column: means.pivot(index='group', columns=period, values=column) for column in columns}
+
+# The tests of every group of levels: their description, and the x and y series stacked in (tests, periods) arrays
+def build_tests(context, levels=LEVELS):
+    tests, xs, ys = [], [], []
+
+    def add(level, analysis, x_name, y_name, x, y):
+        tests.append(pd.DataFrame({'level': level, 'group': y.index, 'analysis': analysis, 'x': x_name, 'y': y_name}))
+        xs.append(x.to_numpy())
+        ys.append(y.to_numpy())
+
+    for level in levels:
+        monthly = context.group_means(level, ['year', 'month'])
+        monthly['period'] = monthly['month_count']
+        series = _series(monthly, 'period', TREND_COLUMNS + ['month_count'])
+        for column in TREND_COLUMNS:
+            add(level, 'trend', 'month_count', column, series['month_count'], series[column])
+        yearly = context.group_means(level, ['year'])
+        series = _series(yearly, 'year', {column for pair in RELATION_PAIRS for column in pair})
+        for x, y in RELATION_PAIRS:
+            add(level, 'relation', x, y, series[x], series[y])
+
+    periods = max(x.shape[1] for x in xs)
+    pad = lambda array: np.pad(array.astype(np.float64), ((0, 0), (0, periods - array.shape[1])), constant_values=np.nan)
+    return pd.concat(tests, ignore_index=True), np.vstack([pad(x) for x in xs]), np.vstack([pad(y) for y in ys])
+
+# x, y with the periods where either is missing moved to the end of their row, and the deviations from the mean
+# of the first n of every row (0 after), which is all the permutations need
+def _compact(x, y):
+    valid = np.isfinite(x) & np.isfinite(y)
+    order = np.argsort(~valid, axis=1, kind='stable')
+    n = valid.sum(axis=1)
+    valid = np.take_along_axis(valid, order, axis=1)
+    x, y = np.take_along_axis(x, order, axis=1), np.take_along_axis(y, order, axis=1)
+    with np.errstate(invalid='ignore'):
+        dx = np.where(valid, x - np.nanmean(np.where(valid, x, np.nan), axis=1, keepdims=True), 0)
+        dy = np.where(valid, y - np.nanmean(np.where(valid, y, np.nan), axis=1, keepdims=True), 0)
+    return dx, dy, n
+
+# dx, dy and n of _compact for the workers of permutation_p_values
+_worker = {}
+
+def _init_worker(dx, dy, n):
+    _worker.update(dx=dx, dy=dy, n=n)
+
+# How many of permutations shuffles of dy (within the first n of every row) have a covariance with dx at least as
+# large in absolute value as the observed one. sxx and syy do not change when dy is shuffled, so comparing the
+# covariances is comparing |r|.
+def _count_extreme(permutations, seed):
+    dx, dy, n = _worker['dx'], _worker['dy'], _worker['n']
+    rng = np.random.default_rng(seed)
+    observed = np.abs((dx * dy).sum(axis=1)) * (1 - 1e-12)
+    padding = np.arange(dx.shape[1]) >= n[:, None]
+    keys = rng.random((permutations,) + dx.shape)
+    keys[:, padding] = 2
+    shuffled = np.take_along_axis(np.broadcast_to(dy, keys.shape), np.argsort(keys, axis=2), axis=2)
+    return (np.abs(np.einsum('tp,ktp->kt', dx, shuffled)) >= observed).sum(axis=0)
+
+# The permutation p-value of every row of x and y, (extreme + 1) / (permutations + 1), see above
+def permutation_p_values(x, y, permutations, workers=1, seed=0, log=print):
+    dx, dy, n = _compact(x, y)
+    sizes = [min(PERMUTATION_CHUNK, permutations - start) for start in range(0, permutations, PERMUTATION_CHUNK)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    extreme = np.zeros(len(dx), dtype=np.int64)
+    if workers == 1:
+        _init_worker(dx, dy, n)
+        for size, chunk_seed in zip(sizes, seeds):
+            extreme += _count_extreme(size, chunk_seed)
+    else:
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker,
+                                 initargs=(dx, dy, n)) as pool:
+            for counts in pool.map(_count_extreme, sizes, seeds):
+                extreme += counts
+    log(f'{permutations} permutations of {len(dx)} tests done')
+    return np.where(n > 2, (extreme + 1) / (permutations + 1), np.nan)
+
+# The tidy table of the tests of every group of levels
+def group_statistics(context, levels=LEVELS, permutations=0, workers=1, seed=0, log=print):
+    tests, x, y = build_tests(context, levels)
+    results = batched_regression(x, y)
+    for name in ['n', 'slope', 'intercept', 'r', 'p_value']:
+        tests[name] = results[name]
+    if permutations:
+        tests['permutation_p_value'] = permutation_p_values(x, y, permutations, workers, seed, log)
+    return tests
+
+def main():
+    parser = argparse.ArgumentParser(description='Trend regressions and correlations for every city, region and country')
+    parser.add_argument('--levels', nargs='+', choices=LEVELS, default=LEVELS, help='groupings of the cities to test')
+    parser.add_argument('--permutations', type=int, default=0, help='shuffles per test for permutation p-values (0 for none)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='processes for the permutations')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='Group_Statistics', help='dataset the table is written to (without extension)')
+    args = parser.parse_args()
+
+    context = AnalysisContext()
+    start = time.perf_counter()
+    table = group_statistics(context, args.levels, args.permutations, args.workers, args.seed)
+    print(f'{len(table)} tests of {table.groupby("level")["group"].nunique().sum()} groups in '
+          f'{time.perf_counter() - start:.2f}s')
+    print(table[table['level'].isin(['country', ALL])].to_string(index=False, float_format=lambda value: f'{value:.4g}'))
+    print(f'Wrote {write_dataset(table, args.output)}')
+
+if __name__ == '__main__':
+    main()
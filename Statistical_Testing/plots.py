@@ -0,0 +1,90 @@
+import matplotlib.pyplot as plt
+import numpy as np
+import seaborn as sns
+
+# The figures of the statistical analyses. The scripts compute what is shown and describe each figure with a
+# common.figures.FigureSpec, and these functions only draw it: each takes the figure's data (and options) and
+# returns the Figure, which common.figures.render_figures saves, possibly in another process.
+
+# One panel of Monthly_Data_Plots_Yearly_Labels_Fixed.png: the monthly averages, their linear regression and LOESS line
+def _regression_panel(ax, panel):
+    ax.scatter(panel['x'], panel['y'], alpha=0.5, label='Data Points')
+    ax.plot(panel['x'], panel['predictions'], color='blue', linestyle='--',
+            label=f"Linear Regression (p={panel['p_value']:.3f})")
+    ax.plot(panel['loess_x'], panel['loess_y'], color='red', label='LOESS Best Fit')
+    ax.set_title(panel['title'])
+    ax.set_xlabel('Year')
+    ax.set_ylabel(panel['y_label'])
+
+    ax.set_xticks(np.arange(0, 121, 12))
+    ax.set_xticklabels(range(2000, 2011))
+    ax.legend()
+
+# The monthly emissions, GDP, max and min temperature over time (1-Linear_Test.py), panels in reading order
+def monthly_regressions(panels):
+    fig, axes = plt.subplots(2, 2, figsize=(15, 10))
+    for ax, panel in zip(axes.flat, panels):
+        _regression_panel(ax, panel)
+    fig.tight_layout()
+    return fig
+
+# The yearly average max and min temperature (1.1-Temp_Test.py)
+def yearly_temperatures(yearly_avg_temp):
+    fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(15, 6))
+
+    # Plot yearly aggregated max temperature
+    ax1.plot(yearly_avg_temp['year'], yearly_avg_temp['temperature_2m_max'], label='Max Temperature (°C)', marker='o')
+    ax1.set_title("Yearly Average Max Temperature (2000-2010)")
+    ax1.set_xlabel("Year")
+    ax1.set_ylabel("Temperature (°C)")
+    ax1.legend()
+    ax1.grid()
+
+    ax2.plot(yearly_avg_temp['year'], yearly_avg_temp['temperature_2m_min'], label='Min Temperature (°C)', marker='o', color='orange')
+    ax2.set_title("Yearly Average Min Temperature (2000-2010)")
+    ax2.set_xlabel("Year")
+    ax2.set_ylabel("Temperature (°C)")
+    ax2.legend()
+    ax2.grid()
+
+    fig.tight_layout()
+    return fig
+
+# The seasonal decomposition of the monthly max and min temperature (1.1-Temp_Test.py), components is a frame of
+# the observed, trend, seasonal and resid series of both, indexed by date
+def temperature_decompositions(components):
+    fig, axes = plt.subplots(4, 2, figsize=(15, 15))
+    for column, (label, name, options) in enumerate([('Max Temperature', 'Max Temp', {}),
+                                                     ('Min Temperature', 'Min Temp', {'color': 'orange'})]):
+        prefix = 'max' if column == 0 else 'min'
+        titles = [f'Observed {label}', f'Trend ({name})', f'Seasonality ({name})', f'Residuals ({name})']
+        for row, (component, title) in enumerate(zip(['observed', 'trend', 'seasonal', 'resid'], titles)):
+            components[f'{prefix}_{component}'].plot(ax=axes[row, column], title=title, legend=False, **options)
+        axes[3, column].set_xlabel("Date")
+    fig.tight_layout()
+    return fig
+
+# The correlation matrix of the yearly average temperature, emissions and GDP (2-Relationship_Testing.py)
+def correlation_matrix(correlations):
+    fig = plt.figure(figsize=(8, 6))
+    sns.heatmap(correlations, annot=True, cmap='coolwarm', fmt=".3f", cbar=True, annot_kws={"size": 12})
+    plt.title("Correlation Matrix (Avg Temp, Emissions, and GDP)")
+    fig.tight_layout()
+    return fig
+
+# The yearly average temperature, emissions and GDP (2.1-Relation_Plots.py)
+def yearly_trends(yearly_data):
+    fig, ax = plt.subplots(1, 3, figsize=(18, 6), sharey=False)
+    panels = [('avg_temperature', 'Avg Temperature', 'blue', "Yearly Average Temperature", "Temperature (°C)"),
+              ('megatonnes CO2', 'Emissions (Megatonnes)', 'green', "Yearly Emissions", "Emissions (Megatonnes)"),
+              ('GDP per Capita', 'GDP per Capita', 'orange', "Yearly GDP per Capita", "GDP per Capita (USD)")]
+    for axis, (column, label, color, title, y_label) in zip(ax, panels):
+        axis.plot(yearly_data['year'], yearly_data[column], marker='o', label=label, color=color)
+        axis.set_title(title)
+        axis.set_xlabel("Year")
+        axis.set_ylabel(y_label)
+        axis.grid()
+        axis.legend()
+
+    fig.tight_layout()
+    return fig
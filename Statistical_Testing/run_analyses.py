@@ -0,0 +1,85 @@
+import argparse
+import contextlib
+import importlib.util
+import io
+import os
+import time
+import sys
+import pandas as pd
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.figures import render_figures
+from analysis_context import AnalysisContext, ALL, expand_subsets, subset_label
+
+# Runs the statistical analyses in one process, for any number of subsets of the cities, e.g.
+#   python run_analyses.py                                  all four analyses of all the cities, like running the scripts
+#   python run_analyses.py --subsets all country=* region=*    and of each country and each state or province
+# The combined data is loaded once and the monthly and yearly averages of every subset are computed once for all
+# the analyses (see analysis_context.py). The figures of a subset are written to --output-dir/<subset>, and
+# 'all' writes to --output-dir itself, so the default run gives the same files as the scripts. What the analyses
+# print goes to --output-dir/<subset>/summary.txt for the other subsets, or to the console with --verbose.
+#
+# The analyses only compute their figures' data; the figures of all the subsets are drawn afterwards on --workers
+# processes, and those whose data has not changed since they were last written are skipped (see
+# common/figures.py), unless --force.
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+ANALYSES = {
+    'linear-test': '1-Linear_Test.py',
+    'temp-test': '1.1-Temp_Test.py',
+    'relationship-testing': '2-Relationship_Testing.py',
+    'relation-plots': '2.1-Relation_Plots.py',
+}
+
+# The scripts' names are not valid module names, so they are loaded from their files
+def load_analysis(script):
+    spec = importlib.util.spec_from_file_location(os.path.splitext(script)[0].replace('-', '_').replace('.', '_'),
+                                                  os.path.join(SCRIPT_DIR, script))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the statistical analyses for subsets of the cities in one process')
+    parser.add_argument('--subsets', nargs='+', default=[ALL],
+                        help="'all', or filters like region=ON,QC, country=Canada or city=Albany; region=* is one subset per region")
+    parser.add_argument('--analyses', nargs='+', choices=list(ANALYSES), default=list(ANALYSES))
+    parser.add_argument('--output-dir', default='.')
+    parser.add_argument('--verbose', action='store_true', help="print every subset's results instead of writing summary.txt")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='processes drawing the figures')
+    parser.add_argument('--force', action='store_true', help='redraw the figures whose data has not changed')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    context = AnalysisContext()
+    load_seconds = time.perf_counter() - start
+    analyses = {name: load_analysis(ANALYSES[name]) for name in args.analyses}
+
+    results, specs = [], []
+    for name, filters in expand_subsets(args.subsets, context):
+        output_dir = args.output_dir if not filters else os.path.join(args.output_dir, subset_label(name))
+        os.makedirs(output_dir, exist_ok=True)
+        summary = io.StringIO()
+        subset_start = time.perf_counter()
+        with contextlib.redirect_stdout(summary) if filters and not args.verbose else contextlib.nullcontext():
+            for analysis_name, analysis in analyses.items():
+                print(f'== {analysis_name} ({name})')
+                specs += analysis.run(context, output_dir, **filters)
+        if summary.getvalue():
+            with open(os.path.join(output_dir, 'summary.txt'), 'w') as f:
+                f.write(summary.getvalue())
+        results.append({'subset': name, 'cities': context.subset(**filters)['city'].nunique(),
+                        'seconds': time.perf_counter() - subset_start, 'output': output_dir})
+
+    analyses_seconds = time.perf_counter() - start
+    render_start = time.perf_counter()
+    figures = pd.DataFrame(render_figures(specs, args.workers, args.force), columns=['figure', 'status', 'seconds'])
+    drawn = figures[figures['status'] == 'rendered']
+
+    print(pd.DataFrame(results).to_string(index=False, float_format=lambda value: f'{value:.3g}'))
+    print(f'Loaded the data in {load_seconds:.2f}s, {len(results)} subsets in {analyses_seconds:.1f}s, '
+          f"aggregates computed {context.stats['misses']} times and reused {context.stats['hits']} times")
+    print(f'Drew {len(drawn)} of {len(figures)} figures ({drawn["seconds"].sum():.1f}s of drawing) in '
+          f'{time.perf_counter() - render_start:.1f}s with {args.workers} workers, {len(figures) - len(drawn)} unchanged')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,183 @@
+import multiprocessing
+import os
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+try:
+    import numba
+except ImportError: # optional, the numpy backend is used without it
+    numba = None
+
+# LOESS smoothing for the trend plots, fast enough for daily series of every city.
+#
+# fast_lowess is the algorithm of statsmodels' lowess (local linear fits over the ceil(frac * n) nearest points
+# with tricube weights, then it robustifying iterations that downweight large residuals with bisquare weights)
+# computed for many fit points at once instead of one point at a time:
+#   - the neighbourhood of every fit point is found with one searchsorted, as the sorted x is a sliding window
+#   - the local fits are computed by a numba kernel spread over the cores when numba is installed (pip install
+#     numba), or otherwise with numpy from (points, k) arrays of ANCHOR_BATCH_SIZE / k points at a time.
+#     Unlike statsmodels, neither touches the points outside a neighbourhood, so a fit costs k and not n.
+#   - with delta > 0 the local fits are only done at the points statsmodels' lowess picks (about one every delta)
+#     and the other points are interpolated linearly between them. A few hundred fits are enough for smooth
+#     trends, so the cost stops growing with the number of distinct x values.
+# Every distinct x is fitted with delta = 0 (the default), and the result is the same as statsmodels' lowess up
+# to rounding with or without delta. smooth_many smooths several series in parallel worker processes.
+
+SMOOTHING_BACKENDS = ['numba', 'numpy']
+# local fits computed together, times the neighbourhood size
+ANCHOR_BATCH_SIZE = 2 ** 20
+
+def _bisquare_weights(residuals):
+    median = np.median(np.abs(residuals))
+    if median == 0:
+        scaled = (np.abs(residuals) > 0).astype(np.float64)
+    else:
+        scaled = np.minimum(np.abs(residuals) / (6 * median), 1)
+    return (1 - scaled ** 2) ** 2
+
+# Indexes of the points the local fits are done at: every distinct x (delta = 0), or the points statsmodels'
+# lowess picks with delta > 0. From a fit at i it skips ahead to the last point within x[i] + delta (the next
+# point after the ties of x[i] when that is x[i] itself), and to the second to last point when every point left
+# is within delta, which then also fits the last one.
+def _anchors(x, delta):
+    if delta <= 0:
+        return np.flatnonzero(np.concatenate([[True], x[1:] != x[:-1]]))
+    n = len(x)
+    anchors = [0]
+    while True:
+        i = anchors[-1]
+        last_tie = np.searchsorted(x, x[i], side='right') - 1
+        if last_tie >= n - 1:
+            return np.array(anchors)
+        beyond = np.searchsorted(x, x[i] + delta, side='right')
+        anchors.append(max(min(beyond, n - 1) - 1, last_tie + 1))
+
+def default_backend():
+    return 'numba' if numba is not None else 'numpy'
+
+if numba is not None:
+    # like fast_trees.py, TBB can hang at exit with daemon threads still running
+    numba.config.THREADING_LAYER_PRIORITY = ['omp', 'tbb', 'workqueue']
+
+    # One pass over every neighbourhood, with the sums taken around the fit point (u = x - value) so they keep
+    # their precision; the fit at u = 0 is then y_mean - u_mean * slope. fastmath lets the sums be vectorized,
+    # which is why a neighbourhood of a single x (radius 0) is handled before any division.
+    @numba.njit(parallel=True, cache=True, fastmath=True)
+    def _local_fits_numba(x, y, anchors, lefts, k, robustness_weights, fits):
+        for a in numba.prange(len(anchors)):
+            left = lefts[a]
+            value = x[anchors[a]]
+            radius = max(value - x[left], x[left + k - 1] - value)
+            if radius <= 0:
+                fits[a] = y[anchors[a]]
+                continue
+            inverse_radius = 1 / radius
+            total = sum_u = sum_uu = sum_y = sum_uy = 0.0
+            nonzero = 0
+            for j in range(left, left + k):
+                u = x[j] - value
+                distance = abs(u) * inverse_radius
+                tricube = 1 - distance * distance * distance
+                weight = tricube * tricube * tricube * robustness_weights[j]
+                weighted_u = weight * u
+                total += weight
+                sum_u += weighted_u
+                sum_uu += weighted_u * u
+                sum_y += weight * y[j]
+                sum_uy += weighted_u * y[j]
+                nonzero += 1 if weight > 1e-12 else 0
+            if nonzero < 2:
+                # too few points with a weight for a line: the point's own y
+                fits[a] = y[anchors[a]]
+                continue
+            u_mean, y_mean = sum_u / total, sum_y / total
+            u_variance = max(sum_uu / total - u_mean * u_mean, 1e-12)
+            fits[a] = y_mean - u_mean * (sum_uy / total - u_mean * y_mean) / u_variance
+
+def _local_fits_numpy(x, y, anchors, lefts, k, robustness_weights, fits):
+    batch = max(1, ANCHOR_BATCH_SIZE // k)
+    offsets = np.arange(k)
+    for start in range(0, len(anchors), batch):
+        left, value = lefts[start:start + batch], x[anchors[start:start + batch]]
+        window = left[:, None] + offsets
+        radius = np.maximum(value - x[left], x[left + k - 1] - value)
+        # the same sums as the numba kernel, from (points, k) arrays
+        u = x[window] - value[:, None]
+        y_window = y[window]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            weights = np.abs(u) / radius[:, None]
+            weights **= 3
+            np.subtract(1, weights, out=weights)
+            weights **= 3
+            weights *= robustness_weights[window]
+            enough = (weights > 1e-12).sum(axis=1) >= 2
+            total = weights.sum(axis=1)
+            weighted_u = weights * u
+            u_mean = weighted_u.sum(axis=1) / total
+            y_mean = np.einsum('ij,ij->i', weights, y_window) / total
+            u_variance = np.maximum(np.einsum('ij,ij->i', weighted_u, u) / total - u_mean ** 2, 1e-12)
+            fit = y_mean - u_mean * (np.einsum('ij,ij->i', weighted_u, y_window) / total - u_mean * y_mean) / u_variance
+        # too few points with a weight for a line: the point's own y
+        fits[start:start + batch] = np.where(enough, fit, y[anchors[start:start + batch]])
+
+# The local linear fits at x[anchors] with the k nearest points of each, weighted by tricube * robustness_weights
+def _local_fits(x, y, anchors, k, robustness_weights, backend):
+    n = len(x)
+    # the neighbourhood [left, left + k) slides right while the point is past the middle of its ends
+    lefts = np.searchsorted((x[:n - k] + x[k:]) / 2, x[anchors], side='left')
+    fits = np.empty(len(anchors))
+    kernel = _local_fits_numba if backend == 'numba' else _local_fits_numpy
+    kernel(x, y, anchors, lefts, k, robustness_weights, fits)
+    return fits
+
+# LOWESS smoothing of y against x, returned like statsmodels' lowess: an (n, 2) array of the sorted x and their
+# smoothed values, without the points where x or y is missing
+def fast_lowess(y, x, frac=2 / 3, it=3, delta=0.0, backend=None):
+    if not 0 <= frac <= 1:
+        raise ValueError(f'frac must be between 0 and 1, not {frac}')
+    backend = backend or default_backend()
+    if backend not in SMOOTHING_BACKENDS:
+        raise ValueError(f'Unknown smoothing backend {backend!r}, expected one of {SMOOTHING_BACKENDS}')
+    if backend == 'numba' and numba is None:
+        raise ImportError('The numba smoothing backend needs numba: pip install numba')
+    x, y = np.asarray(x, dtype=np.float64), np.asarray(y, dtype=np.float64)
+    valid = np.isfinite(x) & np.isfinite(y)
+    x, y = x[valid], y[valid]
+    order = np.argsort(x)
+    x, y = x[order], y[order]
+    n = len(x)
+    if n == 0:
+        return np.empty((0, 2))
+    k = min(max(int(frac * n + 1e-10), 2), n)
+    anchors = _anchors(x, delta)
+    robustness_weights = np.ones(n)
+    for iteration in range(it + 1):
+        fits = _local_fits(x, y, anchors, k, robustness_weights, backend)
+        fitted = np.interp(x, x[anchors], fits)
+        if iteration < it:
+            robustness_weights = _bisquare_weights(y - fitted)
+    return np.column_stack([x, fitted])
+
+def _smooth(series, frac, it, delta, backend):
+    x, y = series
+    return fast_lowess(y, x, frac, it, delta, backend)
+
+def _init_worker(threads):
+    if numba is not None:
+        numba.set_num_threads(threads)
+
+# fast_lowess of every (x, y) of series, in workers processes (in this one for a single worker) sharing the cores
+def smooth_many(series, frac=2 / 3, it=3, delta=0.0, workers=1, backend=None):
+    series = list(series)
+    if workers == 1 or len(series) == 1:
+        return [_smooth(one, frac, it, delta, backend) for one in series]
+    workers = min(workers, len(series))
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker,
+                             initargs=(max(1, os.cpu_count() // workers),)) as pool:
+        n = len(series)
+        return list(pool.map(_smooth, series, [frac] * n, [it] * n, [delta] * n, [backend] * n))
+
+# delta of about bins local fits over the range of x
+def delta_for_bins(x, bins):
+    x = np.asarray(x, dtype=np.float64)
+    return (np.nanmax(x) - np.nanmin(x)) / bins if bins else 0.0
@@ -1,62 +1,76 @@
-import requests
-import pandas as pd
 import json
-import time
 import os
+import argparse
+from weather_fetcher import ARCHIVE_URL, fetch_cities
+from incremental_store import load_manifest, save_manifest, city_entry, next_start_date, append_new_rows, replace_rows
 
-with open("capitals.json", "r") as f:
-    capitals = json.load(f)
-
-url = "https://archive-api.open-meteo.com/v1/archive"
-request_delay = 5
-years = range(2011, 2014)
-output_folder = "weather_data_ML_testing"
-os.makedirs(output_folder, exist_ok=True)
-
-for city_name, info in capitals.items():
-    print(f"Processing data for {city_name}...")
-
-    city_data = pd.DataFrame()
-
-    for year in years:
-        params = {
-            "latitude": info['latitude'],
-            "longitude": info['longitude'],
-            "start_date": f"{year}-01-01",
-            "end_date": f"{year}-12-31",
-            "daily": "temperature_2m_max,temperature_2m_min,precipitation_sum,wind_speed_10m_max",
-            "timezone": "auto"
-        }
-
-        try:
-            response = requests.get(url, params=params)
-            response.raise_for_status()
-            data = response.json()
-
-            if 'daily' in data:
-                df = pd.DataFrame(data['daily'])
-                df['year'] = year
-                df['city'] = city_name
-                df['state_or_province'] = info.get('state', info.get('province', ''))
-                city_data = pd.concat([city_data, df], ignore_index=True)
-                print(f"Data for {city_name} in {year} processed.")
-            else:
-                print(f"No daily data available for {city_name} in {year}")
-
-        except requests.exceptions.RequestException as e:
-            print(f"Failed to retrieve data for {city_name} in {year}: {e}")
-
-        time.sleep(request_delay)
-
-    if not city_data.empty:
-        file_path = os.path.join(output_folder, f"{city_name}_daily_weather_2011_2013.csv")
-        try:
-            existing_data = pd.read_csv(file_path)
-            updated_data = pd.concat([existing_data, city_data], ignore_index=True)
-        except FileNotFoundError:
-            updated_data = city_data
-
-        updated_data.to_csv(file_path, index=False)
-        print(f"Daily weather data for {city_name} saved to {file_path}")
-    else:
-        print(f"No new data available for {city_name}.")
+def main():
+    parser = argparse.ArgumentParser(description='Download daily weather for every capital from Open-Meteo')
+    parser.add_argument('--start-year', type=int, default=2011)
+    parser.add_argument('--end-year', type=int, default=2013)
+    parser.add_argument('--end-date', default=None,
+                        help='last day to fetch (YYYY-MM-DD), defaults to the end of --end-year')
+    parser.add_argument('--incremental', action='store_true',
+                        help='only fetch the days after the last stored date of each city and append them')
+    parser.add_argument('--output-folder', default='weather_data_ML_testing')
+    parser.add_argument('--url', default=ARCHIVE_URL, help='archive API endpoint (e.g. a local stub server)')
+    parser.add_argument('--cache', default='weather_cache', help='on-disk response cache, reused by later runs')
+    parser.add_argument('--workers', type=int, default=4, help='concurrent requests')
+    parser.add_argument('--rate', type=float, default=0.5, help='average API requests per second')
+    parser.add_argument('--burst', type=int, default=4, help='requests allowed back to back before rate limiting')
+    parser.add_argument('--retries', type=int, default=5)
+    args = parser.parse_args()
+    # the city files are named after --start-year and --end-year, so they cannot hold later days
+    if args.end_date is not None and int(args.end_date[:4]) > args.end_year:
+        parser.error(f'--end-date {args.end_date} is after --end-year {args.end_year}, raise --end-year as well')
+
+    with open("capitals.json", "r") as f:
+        capitals = json.load(f)
+    os.makedirs(args.output_folder, exist_ok=True)
+    manifest = load_manifest(args.output_folder)
+
+    start_date = f"{args.start_year}-01-01"
+    end_date = args.end_date or f"{args.end_year}-12-31"
+    def city_file(city_name):
+        return os.path.join(args.output_folder, f"{city_name}_daily_weather_{args.start_year}_{args.end_year}.csv")
+
+    # In incremental mode each city only asks for the days after the last date in the manifest
+    date_ranges = {}
+    for city_name in capitals:
+        city_start = start_date
+        if args.incremental:
+            city_start = next_start_date(city_entry(manifest, city_name, city_file(city_name)), start_date)
+        if city_start > end_date:
+            print(f"{city_name} is already up to date.")
+            continue
+        date_ranges[city_name] = (city_start, end_date)
+    save_manifest(args.output_folder, manifest)
+
+    # One request per city covers the whole date range, requests run concurrently under a shared
+    # rate limit, and anything already in the cache is not downloaded again
+    results = fetch_cities(capitals, date_ranges, args.cache, url=args.url,
+                           workers=args.workers, rate=args.rate, burst=args.burst, retries=args.retries)
+    failed = []
+    for city_name, city_data, error in results:
+        if error is not None:
+            print(f"Failed to retrieve data for {city_name}: {error}")
+            failed.append(city_name)
+            continue
+        if city_data is None or city_data.empty:
+            print(f"No new data available for {city_name}.")
+            continue
+
+        file_path = city_file(city_name)
+        if args.incremental:
+            added = append_new_rows(manifest, city_name, file_path, city_data)
+            print(f"Appended {added} new days of weather data for {city_name} to {file_path}")
+        else:
+            replace_rows(manifest, city_name, file_path, city_data)
+            print(f"Daily weather data for {city_name} saved to {file_path}")
+        save_manifest(args.output_folder, manifest)
+
+    if failed:
+        print(f"{len(failed)} cities failed and can be resumed by running this script again: {', '.join(sorted(failed))}")
+
+if __name__ == '__main__':
+    main()
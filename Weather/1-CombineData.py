@@ -1,36 +1,59 @@
 import pandas as pd
 import os
-
-data_folder = "weather_data_ML_testing"
-
-dataframes = []
-
-# Loop through each CSV file in the data folder
-for filename in os.listdir(data_folder):
-    if filename.endswith(".csv"):
-        file_path = os.path.join(data_folder, filename)
-        city_name = filename.replace("_daily_weather_2011_2013.csv", "")  
-        print(f"Processing {city_name}...")
-
-        # Read the CSV file
-        df = pd.read_csv(file_path)
-
-        # Check if 'time' column exists
-        if 'time' not in df.columns:
-            print(f"Skipping {city_name} due to missing 'time' column.")
-            continue
-
-        # Rename 'time' column to 'date' for consistency
-        df = df.rename(columns={'time': 'date'})
-        
-        # Add 'city' column
-        df['city'] = city_name
-
-        # Append to list of dataframes
-        dataframes.append(df)
-
-combined_data = pd.concat(dataframes, ignore_index=True)
-
-output_file = "combined_weather_data_2011_2013.csv"
-combined_data.to_csv(output_file, index=False)
-print(f"All data combined and saved to {output_file}")
+import sys
+import argparse
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.storage import write_dataset
+from common.weather_aggregation import stream_monthly_weather
+
+def combine_daily(data_folder):
+    dataframes = []
+
+    # Loop through each CSV file in the data folder
+    for filename in os.listdir(data_folder):
+        if filename.endswith(".csv"):
+            file_path = os.path.join(data_folder, filename)
+            city_name = filename.replace("_daily_weather_2011_2013.csv", "")  
+            print(f"Processing {city_name}...")
+
+            # Read the CSV file
+            df = pd.read_csv(file_path)
+
+            # Check if 'time' column exists
+            if 'time' not in df.columns:
+                print(f"Skipping {city_name} due to missing 'time' column.")
+                continue
+
+            # Rename 'time' column to 'date' for consistency
+            df = df.rename(columns={'time': 'date'})
+            
+            # Add 'city' column
+            df['city'] = city_name
+
+            # Append to list of dataframes
+            dataframes.append(df)
+
+    return pd.concat(dataframes, ignore_index=True)
+
+def main():
+    parser = argparse.ArgumentParser(description='Combine the per-city daily weather files')
+    parser.add_argument('--data-folder', default='weather_data_ML_testing')
+    parser.add_argument('--output', default='combined_weather_data_2011_2013')
+    parser.add_argument('--monthly', action='store_true',
+                        help='stream the daily files straight to monthly rows (written to <output>_monthly) '
+                             'instead of combining every daily row in memory')
+    parser.add_argument('--chunksize', type=int, default=100_000, help='daily rows read at a time with --monthly')
+    args = parser.parse_args()
+
+    if args.monthly:
+        monthly_data = stream_monthly_weather(args.data_folder, chunksize=args.chunksize)
+        output_file = write_dataset(monthly_data, f"{args.output}_monthly", schema='weather_monthly')
+        print(f"Monthly weather data saved to {output_file}")
+        return
+
+    combined_data = combine_daily(args.data_folder)
+    output_file = write_dataset(combined_data, args.output, schema='weather_daily')
+    print(f"All data combined and saved to {output_file}")
+
+if __name__ == '__main__':
+    main()
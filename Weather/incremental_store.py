@@ -0,0 +1,99 @@
+import json
+import os
+import pandas as pd
+from weather_fetcher import DAILY_VARIABLES
+
+MANIFEST_FILE = 'manifest.json'
+DATE_COLUMN = 'time'
+
+
+# The manifest keeps, for every city file in an output folder, the last date it holds, its row count
+# and its column order. With it a refresh knows which days are missing without reading the CSV.
+def load_manifest(folder):
+    try:
+        with open(os.path.join(folder, MANIFEST_FILE), 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+def save_manifest(folder, manifest):
+    # write to a temporary file first so an interrupted run never leaves a half written manifest
+    path = os.path.join(folder, MANIFEST_FILE)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(path + '.tmp', path)
+
+# Returns the manifest entry for a city file. Files written before the manifest existed are scanned
+# once (date column only) to build their entry; a missing file has no entry.
+def city_entry(manifest, city_name, file_path):
+    entry = manifest.get(city_name)
+    if entry is not None and entry.get('file') == os.path.basename(file_path) and os.path.exists(file_path):
+        return entry
+    if not os.path.exists(file_path):
+        return None
+    columns = list(pd.read_csv(file_path, nrows=0).columns)
+    dates = pd.read_csv(file_path, usecols=[DATE_COLUMN], parse_dates=[DATE_COLUMN])[DATE_COLUMN]
+    entry = {
+        'file': os.path.basename(file_path),
+        'last_date': dates.max().strftime('%Y-%m-%d') if len(dates) > 0 else None,
+        'rows': len(dates),
+        'columns': columns,
+    }
+    manifest[city_name] = entry
+    return entry
+
+# First day that still has to be fetched for a city, or start_date if nothing is stored yet
+def next_start_date(entry, start_date):
+    if entry is None or entry['last_date'] is None:
+        return start_date
+    next_date = pd.Timestamp(entry['last_date']) + pd.Timedelta(days=1)
+    return max(next_date, pd.Timestamp(start_date)).strftime('%Y-%m-%d')
+
+# Drops the trailing days without any value: the archive returns the last few days before they are filled as
+# rows of nulls, and storing them would move last_date past days that are never fetched again
+def drop_unfilled_days(data):
+    variables = [column for column in DAILY_VARIABLES.split(',') if column in data.columns]
+    filled = data[variables].notna().any(axis=1).to_numpy()
+    if not variables or filled.all():
+        return data
+    return data.iloc[:filled.nonzero()[0][-1] + 1] if filled.any() else data.iloc[:0]
+
+# Appends only the rows newer than the last stored date to the end of the file, deduplicated on (city, date),
+# and updates the manifest entry. Nothing already on disk is read or rewritten.
+def append_new_rows(manifest, city_name, file_path, new_data):
+    entry = city_entry(manifest, city_name, file_path)
+    new_data = new_data.drop_duplicates(subset=['city', DATE_COLUMN], keep='last')
+    if entry is not None and entry['last_date'] is not None:
+        new_data = new_data[pd.to_datetime(new_data[DATE_COLUMN]) > pd.Timestamp(entry['last_date'])]
+    new_data = drop_unfilled_days(new_data.sort_values(DATE_COLUMN))
+    if new_data.empty:
+        return 0
+
+    if entry is None:
+        new_data.to_csv(file_path, index=False)
+        entry = {'file': os.path.basename(file_path), 'rows': 0, 'columns': list(new_data.columns)}
+        manifest[city_name] = entry
+    else:
+        new_data[entry['columns']].to_csv(file_path, mode='a', header=False, index=False)
+    entry['rows'] += len(new_data)
+    entry['last_date'] = pd.Timestamp(new_data[DATE_COLUMN].iloc[-1]).strftime('%Y-%m-%d')
+    return len(new_data)
+
+# Full refresh: merges fetched rows with what is already stored, keeping the newest copy of each (city, date)
+def replace_rows(manifest, city_name, file_path, new_data):
+    new_data = drop_unfilled_days(new_data.sort_values(DATE_COLUMN))
+    try:
+        existing_data = pd.read_csv(file_path)
+        updated_data = pd.concat([existing_data, new_data], ignore_index=True)
+    except FileNotFoundError:
+        updated_data = new_data
+    updated_data = updated_data.drop_duplicates(subset=['city', DATE_COLUMN], keep='last')
+    updated_data = updated_data.sort_values(DATE_COLUMN)
+    updated_data.to_csv(file_path, index=False)
+    manifest[city_name] = {
+        'file': os.path.basename(file_path),
+        'last_date': pd.Timestamp(updated_data[DATE_COLUMN].iloc[-1]).strftime('%Y-%m-%d'),
+        'rows': len(updated_data),
+        'columns': list(updated_data.columns),
+    }
+    return len(updated_data)
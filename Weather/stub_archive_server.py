@@ -0,0 +1,107 @@
+import argparse
+import json
+import threading
+import zlib
+import numpy as np
+import pandas as pd
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+# A local stand-in for archive-api.open-meteo.com so the weather fetcher can be run and checked offline.
+# It answers /v1/archive with deterministic made-up daily values for the requested location, date range
+# and variables, counts the requests it served, and can fail every Nth request to exercise the retries.
+# Run it with `python stub_archive_server.py --port 8000` and point 0-ExtractData.py at it with
+# `--url http://127.0.0.1:8000/v1/archive`.
+
+NOISE_DAYS = 40000
+
+def fake_daily_values(variable, latitude, longitude, dates):
+    day_of_year = dates.dayofyear.to_numpy()
+    seed = zlib.crc32(f'{variable},{latitude:.4f},{longitude:.4f}'.encode())
+    # noise is drawn once per location and indexed by day, so a day has the same value whatever range asks for it
+    days = (dates - pd.Timestamp('1940-01-01')).days.to_numpy() % NOISE_DAYS
+    noise = np.random.default_rng(seed).normal(0, 2, NOISE_DAYS)[days]
+    season = np.sin(2 * np.pi * (day_of_year - 100) / 365.25)
+    if variable == 'temperature_2m_max':
+        values = 15 + 12 * season - abs(latitude - 40) / 2 + noise
+    elif variable == 'temperature_2m_min':
+        values = 3 + 12 * season - abs(latitude - 40) / 2 + noise
+    elif variable == 'precipitation_sum':
+        values = np.clip(noise, 0, None)
+    else:
+        values = 15 + 3 * abs(noise)
+    return np.round(values, 1).tolist()
+
+class StubArchiveHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.request_count += 1
+            request_number = server.request_count
+        if server.fail_every and request_number % server.fail_every == 0:
+            self.send_json(503, {'error': True, 'reason': 'stub server injected failure'})
+            return
+
+        url = urlparse(self.path)
+        if url.path != '/v1/archive':
+            self.send_json(404, {'error': True, 'reason': f'unknown path {url.path}'})
+            return
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        try:
+            latitude = float(query['latitude'])
+            longitude = float(query['longitude'])
+            dates = pd.date_range(query['start_date'], query['end_date'], freq='D')
+            variables = query['daily'].split(',')
+        except (KeyError, ValueError) as e:
+            self.send_json(400, {'error': True, 'reason': f'bad request: {e}'})
+            return
+
+        daily = {'time': dates.strftime('%Y-%m-%d').tolist()}
+        for variable in variables:
+            daily[variable] = fake_daily_values(variable, latitude, longitude, dates)
+        self.send_json(200, {
+            'latitude': latitude,
+            'longitude': longitude,
+            'timezone': query.get('timezone', 'GMT'),
+            'daily_units': {variable: '' for variable in variables},
+            'daily': daily,
+        })
+
+    def send_json(self, status, body):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+def make_stub_server(port=0, fail_every=0, verbose=False):
+    server = ThreadingHTTPServer(('127.0.0.1', port), StubArchiveHandler)
+    server.lock = threading.Lock()
+    server.request_count = 0
+    server.fail_every = fail_every
+    server.verbose = verbose
+    return server
+
+# Starts the stub server on a background thread and returns it; call .shutdown() when done
+def start_stub_server(port=0, fail_every=0, verbose=False):
+    server = make_stub_server(port, fail_every, verbose)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description='Local stub of the Open-Meteo archive API')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--fail-every', type=int, default=0, help='answer every Nth request with a 503')
+    args = parser.parse_args()
+
+    server = make_stub_server(args.port, args.fail_every, verbose=True)
+    print(f'Stub archive API listening on http://127.0.0.1:{args.port}/v1/archive')
+    server.serve_forever()
+
+if __name__ == '__main__':
+    main()
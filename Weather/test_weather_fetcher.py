@@ -0,0 +1,47 @@
+import weather_fetcher
+from stub_archive_server import start_stub_server
+from weather_fetcher import fetch_cities
+
+# Runs the fetcher against the local stub of the archive API (stub_archive_server.py): injected 503s are
+# retried, and a second run over the same ranges is answered from the response cache without touching the API
+# or the rate limiter. Run with python -m pytest from the Weather folder.
+
+CAPITALS = {
+    'Albany': {'latitude': 42.6526, 'longitude': -73.7562, 'state': 'NY'},
+    'Toronto': {'latitude': 43.6532, 'longitude': -79.3832, 'province': 'ON'},
+    'Austin': {'latitude': 30.2672, 'longitude': -97.7431, 'state': 'TX'},
+}
+DATE_RANGES = {city_name: ('2013-01-01', '2013-01-31') for city_name in CAPITALS}
+
+def fetch_all(server, cache_path):
+    return {city_name: (data, error) for city_name, data, error in
+            fetch_cities(CAPITALS, DATE_RANGES, cache_path, url=f'http://127.0.0.1:{server.server_port}/v1/archive',
+                         workers=2, rate=100, burst=len(CAPITALS), retries=3, backoff_factor=0)}
+
+def test_retries_then_serves_from_cache(tmp_path, monkeypatch):
+    tokens = []
+    acquire = weather_fetcher.TokenBucket.acquire
+    monkeypatch.setattr(weather_fetcher.TokenBucket, 'acquire', lambda bucket: tokens.append(1) or acquire(bucket))
+    server = start_stub_server(fail_every=2)
+    try:
+        cache_path = str(tmp_path / 'weather_cache')
+        results = fetch_all(server, cache_path)
+        assert {city_name: error for city_name, (data, error) in results.items()} == dict.fromkeys(CAPITALS)
+        for city_name, (data, error) in results.items():
+            assert len(data) == 31
+            assert (data['city'] == city_name).all()
+            assert data[weather_fetcher.DAILY_VARIABLES.split(',')].notna().all().all()
+        # every other request failed, so some cities only got their data on a retry
+        assert server.request_count > len(CAPITALS)
+        assert len(tokens) == len(CAPITALS)
+
+        served = server.request_count
+        tokens.clear()
+        cached = fetch_all(server, cache_path)
+        assert server.request_count == served
+        assert tokens == []
+        for city_name, (data, error) in cached.items():
+            assert error is None
+            assert data.equals(results[city_name][0])
+    finally:
+        server.shutdown()
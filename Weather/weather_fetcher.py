@@ -0,0 +1,105 @@
+import threading
+import time
+import pandas as pd
+import requests
+import requests_cache
+from retry_requests import retry
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+ARCHIVE_URL = "https://archive-api.open-meteo.com/v1/archive"
+DAILY_VARIABLES = "temperature_2m_max,temperature_2m_min,precipitation_sum,wind_speed_10m_max"
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+# the archive fills its last days with a lag, responses for ranges ending that recently are only cached for
+# RECENT_EXPIRE so the missing days are fetched again later
+ARCHIVE_LAG_DAYS = 7
+RECENT_EXPIRE = pd.Timedelta(hours=12)
+
+
+# Token bucket shared by all worker threads, so the API only sees `rate` requests per second
+# on average with at most `capacity` requests sent back to back
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+# Responses are kept in an on-disk SQLite cache. requests-cache keys each entry on the full query
+# (latitude, longitude, start/end date and daily variables), and only successful responses are
+# stored, so a rerun after an interruption or a failed city only goes to the network for what is missing.
+# Ranges ending within the archive's lag expire after RECENT_EXPIRE (see cache_expiry), the others never do.
+# Failed requests are retried with exponential backoff, honouring Retry-After on 429s.
+def make_session(cache_path, retries=5, backoff_factor=1):
+    session = requests_cache.CachedSession(cache_path, backend='sqlite', expire_after=-1, allowable_codes=(200,))
+    return retry(session, retries=retries, backoff_factor=backoff_factor, status_to_retry=RETRY_STATUS_CODES)
+
+def cache_expiry(end_date, today=None):
+    today = pd.Timestamp.today().normalize() if today is None else pd.Timestamp(today)
+    if pd.Timestamp(end_date) >= today - pd.Timedelta(days=ARCHIVE_LAG_DAYS):
+        return RECENT_EXPIRE.to_pytimedelta()
+    return -1
+
+def city_params(info, start_date, end_date, variables=DAILY_VARIABLES):
+    # The whole date range is fetched in one request per city instead of one request per year
+    return {
+        "latitude": info['latitude'],
+        "longitude": info['longitude'],
+        "start_date": start_date,
+        "end_date": end_date,
+        "daily": variables,
+        "timezone": "auto"
+    }
+
+def fetch_city(session, bucket, url, city_name, info, start_date, end_date, variables=DAILY_VARIABLES, timeout=60):
+    params = city_params(info, start_date, end_date, variables)
+
+    # cached responses don't touch the API, so they don't need a token
+    request = requests.Request('GET', url, params=params).prepare()
+    if not session.cache.contains(request=request):
+        bucket.acquire()
+
+    response = session.get(url, params=params, timeout=timeout, expire_after=cache_expiry(end_date))
+    response.raise_for_status()
+    data = response.json()
+
+    if 'daily' not in data:
+        return None
+    df = pd.DataFrame(data['daily'])
+    df['year'] = pd.to_datetime(df['time']).dt.year
+    df['city'] = city_name
+    df['state_or_province'] = info.get('state', info.get('province', ''))
+    return df
+
+# Fetches every city in date_ranges ({city: (start date, end date)}) concurrently and
+# yields (city name, data or None, error or None) as each one finishes
+def fetch_cities(capitals, date_ranges, cache_path, url=ARCHIVE_URL, variables=DAILY_VARIABLES,
+                 workers=4, rate=0.5, burst=4, retries=5, backoff_factor=1, timeout=60):
+    session = make_session(cache_path, retries=retries, backoff_factor=backoff_factor)
+    bucket = TokenBucket(rate, burst)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(fetch_city, session, bucket, url, city_name, capitals[city_name], start_date, end_date,
+                            variables, timeout): city_name
+            for city_name, (start_date, end_date) in date_ranges.items()
+        }
+        for future in as_completed(futures):
+            city_name = futures[future]
+            try:
+                yield city_name, future.result(), None
+            # a failed request, a body that is not JSON or a malformed daily payload only fails its city
+            except (requests.exceptions.RequestException, ValueError, KeyError) as e:
+                yield city_name, None, e
@@ -0,0 +1,120 @@
+import hashlib
+import json
+import os
+import pickle
+import pandas as pd
+
+# Cache of parsed Excel workbooks shared by all the stages.
+#
+# read_excel_cached takes the same arguments as pd.read_excel. Entries are keyed on the sha256 of the
+# workbook's content plus the read arguments (sheet, usecols, skiprows, ...) and the pandas version, so
+# an unchanged source is returned without touching openpyxl/xlrd, and any edit to the file is a miss.
+# Frames are stored as Arrow IPC files when pyarrow is available and the frame round-trips exactly
+# (pickle otherwise). The cache directory is kept under a size limit by evicting the least recently used
+# entries. Both can be changed with CLIMATE_EXCEL_CACHE_DIR and CLIMATE_EXCEL_CACHE_MAX_MB.
+
+CACHE_DIR_ENV = 'CLIMATE_EXCEL_CACHE_DIR'
+CACHE_MAX_MB_ENV = 'CLIMATE_EXCEL_CACHE_MAX_MB'
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '.excel_cache')
+DEFAULT_CACHE_MAX_MB = 256
+
+_stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+
+def cache_dir():
+    return os.environ.get(CACHE_DIR_ENV, DEFAULT_CACHE_DIR)
+
+def cache_max_bytes():
+    return float(os.environ.get(CACHE_MAX_MB_ENV, DEFAULT_CACHE_MAX_MB)) * 1024 * 1024
+
+def cache_stats():
+    return dict(_stats)
+
+# Adds hit/miss counts gathered in another process (e.g. a worker of a process pool)
+def add_cache_stats(stats):
+    for name, count in stats.items():
+        _stats[name] += count
+
+def cache_report():
+    directory = cache_dir()
+    entries = _entries(directory)
+    size = sum(entry.stat().st_size for entry in entries) / (1024 * 1024)
+    return (f"Excel cache: {_stats['hits']} hits, {_stats['misses']} misses, {_stats['evictions']} evictions, "
+            f"{len(entries)} entries ({size:.1f} MB) in {directory}")
+
+def _entries(directory):
+    if not os.path.isdir(directory):
+        return []
+    return [entry for entry in os.scandir(directory) if entry.name.endswith(('.arrow', '.pkl'))]
+
+def cache_key(file_path, read_kwargs):
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    digest.update(json.dumps(read_kwargs, sort_keys=True, default=repr).encode())
+    digest.update(pd.__version__.encode())
+    return digest.hexdigest()
+
+def _load(entry_path):
+    if entry_path.endswith('.arrow'):
+        import pyarrow.feather
+        return pyarrow.feather.read_table(entry_path).to_pandas()
+    with open(entry_path, 'rb') as f:
+        return pickle.load(f)
+
+# Writes the frame as Arrow if it comes back identical, otherwise as a pickle. Writes go to a temporary
+# file first so concurrent workers never read half written entries.
+def _store(data, directory, key):
+    os.makedirs(directory, exist_ok=True)
+    arrow_path = os.path.join(directory, key + '.arrow')
+    try:
+        import pyarrow.feather
+        pyarrow.feather.write_feather(data, arrow_path + '.tmp', compression='uncompressed')
+        if pyarrow.feather.read_table(arrow_path + '.tmp').to_pandas().equals(data):
+            os.replace(arrow_path + '.tmp', arrow_path)
+            return arrow_path
+    except (ImportError, ValueError, TypeError, NotImplementedError):
+        pass # mixed type columns or non string column names can't be stored as Arrow
+    if os.path.exists(arrow_path + '.tmp'):
+        os.remove(arrow_path + '.tmp')
+
+    entry_path = os.path.join(directory, key + '.pkl')
+    with open(entry_path + '.tmp', 'wb') as f:
+        pickle.dump(data, f, protocol=5)
+    os.replace(entry_path + '.tmp', entry_path)
+    return entry_path
+
+def _evict(directory, max_bytes):
+    entries = sorted(_entries(directory), key=lambda entry: entry.stat().st_mtime)
+    total = sum(entry.stat().st_size for entry in entries)
+    for entry in entries:
+        if total <= max_bytes:
+            break
+        total -= entry.stat().st_size
+        try:
+            os.remove(entry.path)
+            _stats['evictions'] += 1
+        except FileNotFoundError:
+            pass # another process evicted it first
+
+def read_excel_cached(file_path, **read_kwargs):
+    file_path = os.fspath(file_path)
+    directory = cache_dir()
+    key = cache_key(file_path, read_kwargs)
+    for extension in ('.arrow', '.pkl'):
+        entry_path = os.path.join(directory, key + extension)
+        if os.path.exists(entry_path):
+            try:
+                data = _load(entry_path)
+            except FileNotFoundError:
+                break # evicted while we were looking at it, parse the workbook again
+            os.utime(entry_path) # mark as recently used for the eviction order
+            _stats['hits'] += 1
+            return data
+
+    _stats['misses'] += 1
+    data = pd.read_excel(file_path, **read_kwargs)
+    _store(data, directory, key)
+    _evict(directory, cache_max_bytes())
+    return data
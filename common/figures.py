@@ -0,0 +1,136 @@
+import hashlib
+import importlib
+import inspect
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import matplotlib
+# no interactive backend: the figures are only ever saved, and Agg also works in worker processes without a display
+matplotlib.use('Agg')
+import numpy as np
+import pandas as pd
+
+# Rendering of the figures of the statistics and machine learning scripts, apart from computing what they show.
+#
+# A script computes the data of each figure and describes it with a FigureSpec: the PNG to write, the function
+# that draws it (draw(data, **options) -> matplotlib Figure, a plain module level function so it can be imported
+# in another process) and the data it needs (arrays, frames and numbers). render_figures draws the specs on a
+# pool of processes with the Agg backend, each inside its own rc_context so styles set by one (e.g. seaborn's
+# set_theme) do not leak into the next.
+#
+# Every spec has a hash of its data, options and drawing code (the source file of the draw function). The hashes
+# of the figures written are kept in FIGURE_HASHES next to them, and a figure whose PNG exists with the same hash
+# is skipped, so rerunning a report only draws the figures whose data changed.
+
+FIGURE_HASHES = '.figure_hashes.json'
+
+class FigureSpec:
+    def __init__(self, output, draw, data, **options):
+        self.output = output
+        self.module = draw.__module__
+        self.function = draw.__name__
+        self.source = inspect.getsourcefile(draw)
+        self.data = data
+        self.options = options
+
+    def draw_function(self):
+        folder = os.path.dirname(self.source)
+        if folder not in sys.path:
+            sys.path.append(folder)
+        return getattr(importlib.import_module(self.module), self.function)
+
+    def digest(self):
+        digest = hashlib.sha256()
+        digest.update(f'{self.module}:{self.function}'.encode())
+        with open(self.source, 'rb') as f:
+            digest.update(f.read())
+        _hash_value(digest, self.data)
+        _hash_value(digest, self.options)
+        return digest.hexdigest()
+
+# Adds a value made of dicts, lists, tuples, numpy arrays, pandas objects and scalars to digest
+def _hash_value(digest, value):
+    if isinstance(value, dict):
+        digest.update(b'dict')
+        for key in sorted(value, key=str):
+            digest.update(repr(key).encode())
+            _hash_value(digest, value[key])
+    elif isinstance(value, (list, tuple)):
+        digest.update(f'{type(value).__name__}{len(value)}'.encode())
+        for item in value:
+            _hash_value(digest, item)
+    elif isinstance(value, (pd.DataFrame, pd.Series, pd.Index)):
+        digest.update(repr((type(value).__name__, getattr(value, 'columns', None), value.index.names
+                            if not isinstance(value, pd.Index) else value.names)).encode())
+        digest.update(pd.util.hash_pandas_object(value if not isinstance(value, pd.Index) else value.to_series(),
+                                                 index=True).to_numpy().tobytes())
+    elif isinstance(value, np.ndarray):
+        digest.update(f'{value.dtype}{value.shape}'.encode())
+        digest.update(np.ascontiguousarray(value).tobytes() if value.dtype != object else repr(value.tolist()).encode())
+    else:
+        digest.update(repr(value).encode())
+
+def _read_hashes(folder):
+    try:
+        with open(os.path.join(folder, FIGURE_HASHES)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _write_hashes(folder, hashes):
+    path = os.path.join(folder, FIGURE_HASHES)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(hashes, f, indent=1, sort_keys=True)
+    os.replace(path + '.tmp', path)
+
+# Draws spec and saves it to its output, in this process
+def render(spec):
+    import matplotlib.pyplot as plt
+    start = time.perf_counter()
+    with plt.rc_context():
+        figure = spec.draw_function()(spec.data, **spec.options)
+        figure.savefig(spec.output)
+        plt.close(figure)
+    return time.perf_counter() - start
+
+# Renders the specs whose output is missing or whose hash changed (all of them with force) in workers processes
+# (in this one for a single worker), and returns a row per spec with whether it was drawn and how long it took
+def render_figures(specs, workers=1, force=False):
+    specs = list(specs)
+    digests = [spec.digest() for spec in specs]
+    hashes = {}
+    results = []
+    pending = []
+    for spec, digest in zip(specs, digests):
+        folder, name = os.path.split(os.path.abspath(spec.output))
+        if folder not in hashes:
+            hashes[folder] = _read_hashes(folder)
+        if not force and os.path.exists(spec.output) and hashes[folder].get(name) == digest:
+            results.append({'figure': spec.output, 'status': 'unchanged', 'seconds': 0.0})
+        else:
+            pending.append((spec, digest))
+
+    def done(spec, digest, seconds):
+        folder, name = os.path.split(os.path.abspath(spec.output))
+        hashes[folder][name] = digest
+        results.append({'figure': spec.output, 'status': 'rendered', 'seconds': seconds})
+
+    try:
+        if workers == 1 or len(pending) <= 1:
+            for spec, digest in pending:
+                done(spec, digest, render(spec))
+        else:
+            context = multiprocessing.get_context('spawn')
+            with ProcessPoolExecutor(max_workers=min(workers, len(pending)), mp_context=context) as pool:
+                futures = {pool.submit(render, spec): (spec, digest) for spec, digest in pending}
+                for future in as_completed(futures):
+                    done(*futures[future], future.result())
+    finally:
+        # the figures drawn before a failure are kept
+        for folder, folder_hashes in hashes.items():
+            if folder_hashes:
+                _write_hashes(folder, folder_hashes)
+    return results
@@ -0,0 +1,114 @@
+import numpy as np
+import pandas as pd
+
+INTERPOLATION_METHODS = ('linear', 'time')
+
+
+# Converts a count of months since year 0 into first-of-the-month timestamps
+def months_to_dates(months):
+    return (months - 1970 * 12).astype('datetime64[M]').astype('datetime64[ns]')
+
+
+# Interpolates yearly values to monthly values for every group at once.
+#
+# Every group is laid out on one shared monthly grid (from its first to its last year, anchored on
+# anchor_month) and the missing months are filled with np.interp style math done on flat NumPy arrays,
+# so there is no per-group reindex/interpolate/concat. The output matches the old per-group loops:
+#   - one row per group and month, groups in sorted order, with date, year and month filled in
+#   - method='linear' spaces the months evenly, method='time' uses the real number of days between them
+#   - values before the first known value of a group stay NaN, values after the last one repeat it
+#   - any other columns keep their value on the original rows and are NaN on the new ones
+def interpolate_monthly(data, group_col, value_cols, method='linear', anchor_month=1,
+                        year_col='year', month_col='month', date_col='date'):
+    if method not in INTERPOLATION_METHODS:
+        raise ValueError(f'Unsupported interpolation method {method!r}, expected one of {INTERPOLATION_METHODS}')
+    if isinstance(value_cols, str):
+        value_cols = [value_cols]
+    anchor_month = int(anchor_month)
+
+    data = data.reset_index(drop=True)
+    codes, groups = pd.factorize(data[group_col], sort=True)
+    data = data[codes >= 0].reset_index(drop=True) # groupby drops rows without a group, so do the same
+    codes = codes[codes >= 0]
+
+    # months since year 0 for each of the yearly rows
+    months = data[year_col].to_numpy().astype(np.int64) * 12 + (anchor_month - 1)
+
+    # each group spans its own first to last month on the shared grid
+    n_groups = len(groups)
+    start = np.full(n_groups, np.iinfo(np.int64).max)
+    end = np.full(n_groups, np.iinfo(np.int64).min)
+    np.minimum.at(start, codes, months)
+    np.maximum.at(end, codes, months)
+    lengths = end - start + 1
+    offsets = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    total = int(lengths.sum())
+
+    out_codes = np.repeat(np.arange(n_groups), lengths)
+    out_months = np.repeat(start, lengths) + np.arange(total) - np.repeat(offsets, lengths)
+
+    # position of each yearly row in the monthly output
+    positions = offsets[codes] + (months - start[codes])
+    if len(np.unique(positions)) != len(positions):
+        raise ValueError(f'Found more than one row for the same {group_col} and {year_col}')
+
+    # a single sortable key per (group, month) so every group can be searched in one go
+    stride = int(out_months.max() - out_months.min()) + 1 if total > 0 else 1
+    base = out_months.min() if total > 0 else 0
+    keys = codes * stride + (months - base)
+    out_keys = out_codes * stride + (out_months - base)
+
+    out_dates = months_to_dates(out_months)
+    if method == 'time':
+        coords = months_to_dates(months).astype('datetime64[D]').astype(np.int64)
+        out_coords = out_dates.astype('datetime64[D]').astype(np.int64)
+    else:
+        coords = months
+        out_coords = out_months
+
+    # the untouched columns land on their original rows, everything else is NaN like a reindex
+    other_cols = [c for c in data.columns if c not in (date_col, group_col, year_col, month_col) and c not in value_cols]
+    result = data[other_cols].set_axis(positions).reindex(np.arange(total))
+    for value_col in value_cols:
+        values = data[value_col].to_numpy(dtype=np.float64)
+        result[value_col] = _interpolate_sorted(keys, codes, coords, values, out_keys, out_codes, out_coords)
+    result[group_col] = np.asarray(groups)[out_codes]
+    result[year_col] = out_months // 12
+    result[month_col] = out_months % 12 + 1
+    result[date_col] = out_dates
+
+    # same column order as the old loops: date first, the original columns, then month if it was added
+    columns = [date_col] + [c for c in data.columns if c != date_col]
+    if month_col not in columns:
+        columns.append(month_col)
+    return result[columns]
+
+
+# np.interp for many groups at once: each output key is placed between the closest known keys of its own group
+def _interpolate_sorted(keys, codes, coords, values, out_keys, out_codes, out_coords):
+    valid = ~np.isnan(values)
+    order = np.argsort(keys[valid], kind='stable')
+    xk = keys[valid][order]
+    xcode = codes[valid][order]
+    xp = coords[valid][order]
+    fp = values[valid][order]
+
+    result = np.full(len(out_keys), np.nan)
+    if len(xk) == 0:
+        return result
+
+    left = np.searchsorted(xk, out_keys, side='right') - 1
+    left_clipped = np.clip(left, 0, len(xk) - 1)
+    right_clipped = np.clip(left + 1, 0, len(xk) - 1)
+    has_left = (left >= 0) & (xcode[left_clipped] == out_codes)
+    has_right = (left + 1 < len(xk)) & (xcode[right_clipped] == out_codes)
+
+    # past the last known value of the group: repeat it
+    result[has_left] = fp[left_clipped[has_left]]
+
+    # between two known values of the group: straight line, same formula as np.interp
+    between = has_left & has_right & (xk[left_clipped] != out_keys)
+    lo, hi = left_clipped[between], right_clipped[between]
+    slope = (fp[hi] - fp[lo]) / (xp[hi] - xp[lo])
+    result[between] = slope * (out_coords[between] - xp[lo]) + fp[lo]
+    return result
@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+
+JOIN_KEYS = ['city', 'year', 'month']
+# room for every year or month value in a composite key
+KEY_RANGE = 10_000
+
+# Inner joins any number of sources onto a driver frame on (city, year, month).
+#
+# Each source is indexed once on its key columns (KeyIndex) and the index can be reused for several drivers,
+# e.g. the population and GDP data for both the 2000-2010 and the 2011-2013 periods. The driver's keys are
+# looked up in every index, the rows found in all of them are kept, and the output frame is assembled once
+# from the driver's and the sources' columns, so no intermediate merged frame is built per source. Rows keep
+# the driver's order, like a chain of pd.merge(..., how='inner') calls.
+
+class KeyIndex:
+    # data: the source frame, columns: {source column: output column} of the columns the join adds
+    def __init__(self, name, data, columns, keys=JOIN_KEYS):
+        self.name = name
+        self.data = data
+        self.columns = columns
+        self.keys = keys
+        city_key, *number_keys = keys
+        self.cities = pd.Index(data[city_key].unique())
+        self.index = pd.Index(composite_keys(self.cities.get_indexer(data[city_key]), data, number_keys))
+        if not self.index.is_unique:
+            duplicated = data.loc[self.index.duplicated(), keys].head(3).to_dict('records')
+            raise ValueError(f'{name} has more than one row per {keys}, e.g. {duplicated}')
+
+    # Row of this source for every row of driver, -1 where the source has no row with its keys
+    def positions(self, driver):
+        city_key, *number_keys = self.keys
+        city_codes = self.cities.get_indexer(driver[city_key])
+        found = self.index.get_indexer(composite_keys(city_codes, driver, number_keys))
+        found[city_codes < 0] = -1
+        return found
+
+# Packs a city code and the numeric keys (year, month) into one int64 per row, which is much cheaper
+# to hash and look up than a MultiIndex of strings and numbers
+def composite_keys(city_codes, data, number_keys):
+    keys = city_codes.astype(np.int64)
+    for key in number_keys:
+        values = data[key].to_numpy(dtype=np.int64)
+        keys = keys * KEY_RANGE + values
+    return keys
+
+# Returns the joined frame and {source name: driver rows without a match in that source}.
+# A driver row missing from several sources is counted for each of them.
+def join_sources(driver, sources):
+    keep = np.ones(len(driver), dtype=bool)
+    positions = []
+    dropped = {}
+    for source in sources:
+        found = source.positions(driver)
+        dropped[source.name] = int((found < 0).sum())
+        keep &= found >= 0
+        positions.append(found)
+
+    rows = np.flatnonzero(keep)
+    joined = {column: driver[column].array.take(rows) for column in driver.columns}
+    for source, found in zip(sources, positions):
+        for column, output_column in source.columns.items():
+            if output_column in joined:
+                raise ValueError(f'{source.name} adds column {output_column!r} which is already in the output')
+            joined[output_column] = source.data[column].array.take(found[rows])
+    # copy=False keeps the gathered columns as they are instead of copying them into blocks again
+    return pd.DataFrame(joined, copy=False), dropped
+
+def dropped_report(name, driver_rows, joined_rows, dropped):
+    per_source = ', '.join(f'{source}: {count}' for source, count in dropped.items())
+    return f'{name}: kept {joined_rows} of {driver_rows} rows, rows without a match per source ({per_source})'
@@ -0,0 +1,299 @@
+import ast
+import hashlib
+import json
+import os
+import subprocess
+import sys
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from common.storage import FORMATS, dataset_path, storage_format
+
+# Runs the stage scripts as a dependency graph.
+#
+# Every stage declares the files and folders it reads and writes (paths relative to the root of the repo).
+# A stage depends on the stages that write what it reads, independent stages run at the same time, and a
+# stage is skipped when its inputs, its code (the script plus the local and common modules it imports),
+# its arguments and the storage format are the same as in its last successful run and its outputs are
+# still what that run wrote. The hashes of every successful run are kept in .pipeline/state.json and
+# each stage's output goes to .pipeline/logs/<stage>.log.
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PIPELINE_DIR = os.path.join(ROOT, '.pipeline')
+STATE_FILE = os.path.join(PIPELINE_DIR, 'state.json')
+LOG_DIR = os.path.join(PIPELINE_DIR, 'logs')
+IGNORED_NAMES = ('__pycache__', '.ipynb_checkpoints', 'manifest.json.tmp')
+
+
+# A dataset written with common.storage.write_dataset, addressed without its extension like in the scripts.
+# It resolves to the file of the current storage format, or whichever format exists.
+class Dataset:
+    def __init__(self, path):
+        self.path = path
+
+    def resolve(self):
+        path = os.path.join(ROOT, self.path)
+        if os.path.exists(dataset_path(path)):
+            return dataset_path(path)
+        return next((dataset_path(path, f) for f in FORMATS if os.path.exists(dataset_path(path, f))), dataset_path(path))
+
+    def __repr__(self):
+        return f'Dataset({self.path!r})'
+
+class Stage:
+    # name: unique stage name, script: path of the script from the root (run from its own directory)
+    # inputs/outputs: files, folders or Datasets, args: command line arguments for the script
+    # external: the stage downloads its data, so it only runs when its outputs are missing or it is forced
+    # manual: nothing depends on the stage and it is long, so it is left out of the default targets and only
+    # runs when named as a target (or as a dependency of one)
+    def __init__(self, name, script, inputs=(), outputs=(), args=(), external=False, manual=False):
+        self.name = name
+        self.script = script
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.args = list(args)
+        self.external = external
+        self.manual = manual
+
+    def __repr__(self):
+        return f'Stage({self.name!r})'
+
+def _declared_path(entry):
+    return entry.path if isinstance(entry, Dataset) else entry
+
+def _resolve(entry):
+    return entry.resolve() if isinstance(entry, Dataset) else os.path.join(ROOT, entry)
+
+def _overlaps(path, other):
+    path, other = os.path.normpath(path), os.path.normpath(other)
+    return path == other or path.startswith(other + os.sep) or other.startswith(path + os.sep)
+
+# Maps every stage name to the names of the stages that write one of its inputs
+def stage_dependencies(stages):
+    names = [stage.name for stage in stages]
+    if len(set(names)) != len(names):
+        raise ValueError('Stage names must be unique')
+    writers = {}
+    for stage in stages:
+        for output in stage.outputs:
+            path = _declared_path(output)
+            if path in writers:
+                raise ValueError(f'{path} is written by both {writers[path]} and {stage.name}')
+            writers[path] = stage.name
+
+    dependencies = {}
+    for stage in stages:
+        dependencies[stage.name] = sorted({
+            writer for input in stage.inputs for path, writer in writers.items()
+            if writer != stage.name and _overlaps(_declared_path(input), path)
+        })
+    _check_acyclic(dependencies)
+    return dependencies
+
+def _check_acyclic(dependencies):
+    visiting, done = set(), set()
+    def visit(name, chain):
+        if name in done:
+            return
+        if name in visiting:
+            raise ValueError('Stage dependency cycle: ' + ' -> '.join(chain + [name]))
+        visiting.add(name)
+        for dependency in dependencies[name]:
+            visit(dependency, chain + [name])
+        visiting.discard(name)
+        done.add(name)
+    for name in dependencies:
+        visit(name, [])
+
+# The selected stages and everything upstream of them
+def upstream_closure(dependencies, targets):
+    selected = set()
+    pending = list(targets)
+    while pending:
+        name = pending.pop()
+        if name in selected:
+            continue
+        if name not in dependencies:
+            raise KeyError(f'Unknown stage {name!r}, expected one of {sorted(dependencies)}')
+        selected.add(name)
+        pending.extend(dependencies[name])
+    return selected
+
+def load_state():
+    try:
+        with open(STATE_FILE, 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {'stages': {}, 'files': {}}
+
+def save_state(state):
+    # write to a temporary file first so an interrupted run never leaves a half written state file
+    os.makedirs(PIPELINE_DIR, exist_ok=True)
+    with open(STATE_FILE + '.tmp', 'w') as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+    os.replace(STATE_FILE + '.tmp', STATE_FILE)
+
+# sha256 of a file's content. Hashes are remembered in file_cache by (size, mtime) so unchanged
+# files, such as the hundreds of daily weather files, are not read again on every run.
+def file_digest(path, file_cache):
+    stat = os.stat(path)
+    key = os.path.relpath(path, ROOT)
+    cached = file_cache.get(key)
+    if cached is not None and cached['size'] == stat.st_size and cached['mtime_ns'] == stat.st_mtime_ns:
+        return cached['sha256']
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    file_cache[key] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': digest.hexdigest()}
+    return digest.hexdigest()
+
+# Hash of a file or of every file in a folder (names included); None if it does not exist
+def path_digest(path, file_cache):
+    if os.path.isfile(path):
+        return file_digest(path, file_cache)
+    if not os.path.isdir(path):
+        return None
+    digest = hashlib.sha256()
+    for folder, subfolders, files in os.walk(path):
+        subfolders[:] = sorted(d for d in subfolders if d not in IGNORED_NAMES)
+        for name in sorted(files):
+            if name in IGNORED_NAMES:
+                continue
+            file_path = os.path.join(folder, name)
+            digest.update(os.path.relpath(file_path, path).encode())
+            digest.update(file_digest(file_path, file_cache).encode())
+    return digest.hexdigest()
+
+# The script plus every module it imports from its own folder or from the repo (e.g. common.storage)
+def code_files(script):
+    found = []
+    pending = [os.path.join(ROOT, script)]
+    while pending:
+        path = pending.pop()
+        if path in found:
+            continue
+        found.append(path)
+        with open(path, 'r') as f:
+            tree = ast.parse(f.read(), filename=path)
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                modules = [alias.name for alias in node.names]
+            elif isinstance(node, ast.ImportFrom) and node.module and node.level == 0:
+                modules = [node.module]
+            else:
+                continue
+            for module in modules:
+                relative = module.replace('.', os.sep) + '.py'
+                for base in (os.path.dirname(path), os.path.dirname(os.path.join(ROOT, script)), ROOT):
+                    if os.path.isfile(os.path.join(base, relative)):
+                        pending.append(os.path.normpath(os.path.join(base, relative)))
+                        break
+    return sorted(found)
+
+def stage_key(stage, file_cache):
+    code = {os.path.relpath(path, ROOT): file_digest(path, file_cache) for path in code_files(stage.script)}
+    inputs = {_declared_path(entry): path_digest(_resolve(entry), file_cache) for entry in stage.inputs}
+    return {
+        'code': code,
+        'inputs': inputs,
+        'args': stage.args,
+        'storage_format': storage_format(),
+    }
+
+def output_digests(stage, file_cache):
+    return {_declared_path(entry): path_digest(_resolve(entry), file_cache) for entry in stage.outputs}
+
+# Why the stage has to run, or None when the last successful run is still valid
+def run_reason(stage, key, state, file_cache, force=False):
+    if force:
+        return 'forced'
+    outputs = output_digests(stage, file_cache)
+    missing = [path for path, digest in outputs.items() if digest is None]
+    if missing:
+        return 'missing ' + ', '.join(missing)
+    if stage.external:
+        return None
+    previous = state['stages'].get(stage.name)
+    if previous is None:
+        return 'never run'
+    if previous['key']['code'] != key['code']:
+        return 'code changed'
+    if previous['key']['inputs'] != key['inputs']:
+        changed = [path for path, digest in key['inputs'].items() if previous['key']['inputs'].get(path) != digest]
+        return 'inputs changed: ' + ', '.join(changed)
+    if previous['key'] != key:
+        return 'arguments or storage format changed'
+    if previous['outputs'] != outputs:
+        return 'outputs modified since the last run'
+    return None
+
+def run_stage(stage):
+    os.makedirs(LOG_DIR, exist_ok=True)
+    log_path = os.path.join(LOG_DIR, stage.name + '.log')
+    script = os.path.join(ROOT, stage.script)
+    # figures are only saved, never shown, so nothing blocks waiting for a window
+    env = dict(os.environ, MPLBACKEND='Agg')
+    with open(log_path, 'w') as log:
+        process = subprocess.run([sys.executable, os.path.basename(script)] + stage.args,
+                                 cwd=os.path.dirname(script), stdout=log, stderr=subprocess.STDOUT, env=env)
+    return process.returncode, log_path
+
+# Runs the targets (all the stages but the manual ones by default) and the stages they depend on. Stages whose dependencies
+# are done are started as soon as a worker is free, up to jobs at a time. A failed stage stops the
+# stages downstream of it but not the independent branches. Returns {stage name: status}.
+def run_pipeline(stages, targets=None, jobs=4, force=(), force_all=False, dry_run=False, log=print):
+    dependencies = stage_dependencies(stages)
+    by_name = {stage.name: stage for stage in stages}
+    selected = upstream_closure(dependencies, targets or [stage.name for stage in stages if not stage.manual])
+    order = [stage.name for stage in stages if stage.name in selected]
+    state = load_state()
+    file_cache = state.setdefault('files', {})
+    status = {}
+    running = {}
+
+    def ready(name):
+        return all(status.get(dependency) in ('ran', 'skipped', 'would run') for dependency in dependencies[name])
+
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        while len(status) < len(order):
+            for name in order:
+                if name in status or name in running:
+                    continue
+                if any(status.get(dependency) in ('failed', 'blocked') for dependency in dependencies[name]):
+                    status[name] = 'blocked'
+                    log(f'[blocked] {name}: an upstream stage failed')
+                    continue
+                if not ready(name):
+                    continue
+                stage = by_name[name]
+                key = stage_key(stage, file_cache)
+                reason = run_reason(stage, key, state, file_cache, force=force_all or name in force)
+                if reason is None and dry_run and any(status[d] == 'would run' for d in dependencies[name]):
+                    reason = 'upstream stage would run'
+                if reason is None:
+                    status[name] = 'skipped'
+                    log(f'[skip] {name}: up to date')
+                elif dry_run:
+                    status[name] = 'would run'
+                    log(f'[would run] {name}: {reason}')
+                else:
+                    log(f'[run] {name}: {reason}')
+                    running[name] = (executor.submit(run_stage, stage), key)
+
+            if not running:
+                continue
+            finished, _ = wait([future for future, key in running.values()], return_when=FIRST_COMPLETED)
+            for name in [name for name, (future, key) in running.items() if future in finished]:
+                future, key = running.pop(name)
+                returncode, log_path = future.result()
+                if returncode != 0:
+                    status[name] = 'failed'
+                    log(f'[failed] {name}: exit code {returncode}, see {os.path.relpath(log_path, ROOT)}')
+                    continue
+                status[name] = 'ran'
+                stage = by_name[name]
+                state['stages'][name] = {'key': key, 'outputs': output_digests(stage, file_cache)}
+                save_state(state)
+                log(f'[done] {name}')
+
+    save_state(state)
+    return status
@@ -0,0 +1,12 @@
+import numpy as np
+
+# The countries of the capitals' states and provinces. The data only has the state_or_province code of every city:
+# the Canadian ones are the province and territory codes below, every other code is a US state.
+
+CANADIAN_PROVINCES = {'AB', 'BC', 'MB', 'NB', 'NL', 'NS', 'NT', 'NU', 'ON', 'PE', 'QC', 'SK', 'YT'}
+COUNTRIES = ['United States', 'Canada']
+CONTINENTS = {'United States': 'North America', 'Canada': 'North America'}
+
+# The country of every state_or_province code of regions
+def country_of(regions):
+    return np.where(np.isin(np.asarray(regions, dtype=object), list(CANADIAN_PROVINCES)), 'Canada', 'United States')
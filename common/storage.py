@@ -0,0 +1,185 @@
+import os
+import pandas as pd
+
+# Storage layer for the datasets the stages hand to each other.
+#
+# Every dataset is addressed by its path without an extension (e.g. '../Combined_Data') and stored as
+# csv (the default, what is committed in the repo), parquet or arrow (Arrow IPC / Feather v2). The format
+# is picked per run with the CLIMATE_STORAGE_FORMAT environment variable or the fmt argument. Parquet and
+# arrow need pyarrow (pip install pyarrow) and are written zstd compressed with the explicit schemas below,
+# so readers get typed columns back without any text or date parsing, and can load just the columns they use.
+
+STORAGE_FORMAT_ENV = 'CLIMATE_STORAGE_FORMAT'
+FORMATS = {'csv': '.csv', 'parquet': '.parquet', 'arrow': '.arrow'}
+DEFAULT_FORMAT = 'csv'
+COMPRESSION = 'zstd'
+
+# Column types of the datasets exchanged between stages. Columns that are not listed are inferred.
+SCHEMAS = {
+    'weather_daily': {
+        'date': 'datetime64[ns]',
+        'temperature_2m_max': 'float64',
+        'temperature_2m_min': 'float64',
+        'precipitation_sum': 'float64',
+        'wind_speed_10m_max': 'float64',
+        'year': 'int64',
+        'city': 'str',
+        'state_or_province': 'str',
+    },
+    'weather_monthly': {
+        'year': 'int64',
+        'month': 'int64',
+        'city': 'str',
+        'state_or_province': 'str',
+        'temperature_2m_max': 'float64',
+        'temperature_2m_min': 'float64',
+        'precipitation_sum': 'float64',
+        'wind_speed_10m_max': 'float64',
+    },
+    'city_emissions': {
+        'date': 'datetime64[ns]',
+        'city': 'str',
+        'megatonnes CO2': 'float64',
+        'year': 'int64',
+        'month': 'int64',
+    },
+    'population_density': {
+        'date': 'datetime64[ns]',
+        'City': 'str',
+        'Year': 'int64',
+        'Population': 'float64',
+        'Month': 'int64',
+        'State': 'str',
+        'Area(km^2)': 'float64',
+        'Population Density': 'float64',
+    },
+    'gdp_per_capita': {
+        'date': 'datetime64[ns]',
+        'GDP per Capita': 'float64',
+        'city': 'str',
+        'year': 'int64',
+        'month': 'int64',
+    },
+    'combined': {
+        'year': 'int64',
+        'month': 'int64',
+        'city': 'str',
+        'state_or_province': 'str',
+        'temperature_2m_max': 'float64',
+        'temperature_2m_min': 'float64',
+        'precipitation_sum': 'float64',
+        'wind_speed_10m_max': 'float64',
+        'megatonnes CO2': 'float64',
+        'date': 'datetime64[ns]',
+        'Population': 'float64',
+        'Area(km^2)': 'float64',
+        'Population Density': 'float64',
+        'GDP per Capita': 'float64',
+    },
+    'seasonal_components': {
+        'level': 'str',
+        'group': 'str',
+        'variable': 'str',
+        'year': 'int64',
+        'month': 'int64',
+        'observed': 'float64',
+        'trend': 'float64',
+        'seasonal': 'float64',
+        'resid': 'float64',
+    },
+}
+
+
+def storage_format(fmt=None):
+    fmt = fmt or os.environ.get(STORAGE_FORMAT_ENV) or DEFAULT_FORMAT
+    if fmt not in FORMATS:
+        raise ValueError(f'Unknown storage format {fmt!r}, expected one of {list(FORMATS)}')
+    return fmt
+
+def dataset_path(path, fmt=None):
+    return path + FORMATS[storage_format(fmt)]
+
+def _schema(schema):
+    if schema is None:
+        return {}
+    return SCHEMAS[schema] if isinstance(schema, str) else schema
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.feather
+        import pyarrow.parquet
+    except ImportError as e:
+        raise ImportError('The parquet and arrow storage formats need pyarrow: pip install pyarrow') from e
+    return pyarrow
+
+def _arrow_type(pa, dtype):
+    return {
+        'int64': pa.int64(),
+        'float64': pa.float64(),
+        'str': pa.string(),
+        'datetime64[ns]': pa.timestamp('ns'),
+    }[dtype]
+
+# Casts the schema columns of data to their declared types
+def apply_schema(data, schema):
+    schema = _schema(schema)
+    data = data.copy()
+    for column, dtype in schema.items():
+        if column not in data.columns:
+            continue
+        if dtype == 'datetime64[ns]':
+            data[column] = pd.to_datetime(data[column])
+        elif dtype == 'str':
+            data[column] = data[column].astype(object)
+        else:
+            data[column] = data[column].astype(dtype)
+    return data
+
+# Writes data to path + the extension of the chosen format and returns the file name
+def write_dataset(data, path, schema=None, fmt=None):
+    fmt = storage_format(fmt)
+    file_path = dataset_path(path, fmt)
+    data = apply_schema(data.reset_index(drop=True), schema)
+    if fmt == 'csv':
+        data.to_csv(file_path, index=False)
+        return file_path
+
+    pa = _pyarrow()
+    types = _schema(schema)
+    fields = [
+        pa.field(column, _arrow_type(pa, types[column])) if column in types
+        else pa.Schema.from_pandas(data[[column]], preserve_index=False).field(column)
+        for column in data.columns
+    ]
+    table = pa.Table.from_pandas(data, schema=pa.schema(fields), preserve_index=False)
+    if fmt == 'parquet':
+        pa.parquet.write_table(table, file_path, compression=COMPRESSION)
+    else:
+        pa.feather.write_feather(table, file_path, compression=COMPRESSION)
+    return file_path
+
+# Reads a dataset written by write_dataset. Only the requested columns are loaded, and csv files are
+# parsed with the schema types (including dates) so every format returns the same frame.
+# If the dataset does not exist in the chosen format, any other format that exists is used instead.
+def read_dataset(path, columns=None, schema=None, fmt=None):
+    fmt = storage_format(fmt)
+    if not os.path.exists(dataset_path(path, fmt)):
+        fmt = next((f for f in FORMATS if os.path.exists(dataset_path(path, f))), fmt)
+    file_path = dataset_path(path, fmt)
+    columns = list(columns) if columns is not None else None
+
+    if fmt == 'csv':
+        types = _schema(schema)
+        if columns is not None:
+            types = {column: dtype for column, dtype in types.items() if column in columns}
+        dates = [column for column, dtype in types.items() if dtype == 'datetime64[ns]']
+        dtypes = {column: (object if dtype == 'str' else dtype) for column, dtype in types.items() if column not in dates}
+        data = pd.read_csv(file_path, usecols=columns, dtype=dtypes, parse_dates=dates or False)
+    elif fmt == 'parquet':
+        data = _pyarrow().parquet.read_table(file_path, columns=columns).to_pandas()
+    else:
+        data = _pyarrow().feather.read_table(file_path, columns=columns, memory_map=True).to_pandas()
+
+    # keep the requested column order (usecols returns file order)
+    return data[columns] if columns is not None else data
@@ -0,0 +1,61 @@
+import os
+import pandas as pd
+
+MONTHLY_KEYS = ['year', 'month', 'city', 'state_or_province']
+MONTHLY_AGGREGATIONS = {
+    'temperature_2m_max': 'max',
+    'temperature_2m_min': 'min',
+    'precipitation_sum': 'sum',
+    'wind_speed_10m_max': 'max'
+}
+DAILY_FILE_MARKER = '_daily_weather_'
+
+
+# Aggregates a frame of daily weather rows that is already in memory to monthly rows
+def monthly_weather(data):
+    data['year'] = data['date'].dt.year
+    data['month'] = data['date'].dt.month
+    monthly_grouped = data.groupby(MONTHLY_KEYS).agg(MONTHLY_AGGREGATIONS).reset_index()
+    return monthly_grouped
+
+# Folds the monthly aggregates of one more chunk into the running accumulator. Max of maxes,
+# min of mins and sum of sums give the same result as aggregating all the daily rows at once.
+def _combine(accumulator, partial):
+    if accumulator is None:
+        return partial
+    return pd.concat([accumulator, partial]).groupby(level=MONTHLY_KEYS).agg(MONTHLY_AGGREGATIONS)
+
+def _monthly_chunk(chunk, city_name):
+    chunk = chunk.rename(columns={'time': 'date'})
+    chunk['city'] = city_name
+    dates = pd.to_datetime(chunk['date'])
+    chunk['year'] = dates.dt.year
+    chunk['month'] = dates.dt.month
+    return chunk.groupby(MONTHLY_KEYS).agg(MONTHLY_AGGREGATIONS)
+
+# Streams the per-city daily files in data_folder (e.g. Weather/weather_data) straight to monthly rows.
+#
+# Each file is read chunksize rows at a time and only running monthly max/min/sum accumulators are kept,
+# so peak memory is one chunk plus the monthly output rather than the whole daily history. The result is
+# the same as monthly_weather on the combined daily data: one row per year, month, city and state/province.
+def stream_monthly_weather(data_folder, chunksize=100_000):
+    monthly = []
+    for filename in sorted(os.listdir(data_folder)):
+        if not filename.endswith('.csv'):
+            continue
+        # the city comes from the file name, like in Weather/1-CombineData.py
+        city_name = filename.split(DAILY_FILE_MARKER)[0]
+        file_path = os.path.join(data_folder, filename)
+        if not {'time', 'date'} & set(pd.read_csv(file_path, nrows=0).columns):
+            print(f"Skipping {city_name} due to missing 'time' column.")
+            continue
+
+        accumulator = None
+        for chunk in pd.read_csv(file_path, chunksize=chunksize):
+            accumulator = _combine(accumulator, _monthly_chunk(chunk, city_name))
+        if accumulator is not None:
+            monthly.append(accumulator)
+
+    # a city spread over several files is merged here, which also sorts the rows like a groupby would
+    combined = pd.concat(monthly).groupby(level=MONTHLY_KEYS).agg(MONTHLY_AGGREGATIONS)
+    return combined.reset_index()
@@ -0,0 +1,122 @@
+import argparse
+from common.pipeline import Stage, Dataset, stage_dependencies, run_pipeline
+
+# Every script of the project with the files it reads and writes, in the order of the README.
+# The dependencies between stages follow from these paths, see common/pipeline.py.
+STAGES = [
+    # Population
+    Stage('population-extract', 'Population/0-Extract_Data_And_Interpolation.py',
+          inputs=['Population/Manual_Population_data_collection.xlsx', 'Population/population_datasets'],
+          outputs=['Population/Population_data.csv']),
+    Stage('population-density', 'Population/1-Population_Density.py',
+          inputs=['Population/Manual_area_collection.xlsx', 'Population/Population_data.csv'],
+          outputs=[Dataset('Population/Population_density')]),
+    Stage('state-province-population', 'Population/2-State_and_Province_Population.py',
+          inputs=['Population/State_Population'],
+          outputs=['Population/state_province_population.csv']),
+
+    # Emissions
+    Stage('emissions-extract', 'Emissions/0-ExtractData.py',
+          inputs=['Emissions/state_emissions_data', 'Emissions/province_emissions_data'],
+          outputs=['Emissions/extracted_data']),
+    Stage('emissions-transform', 'Emissions/1-TransformData.py',
+          inputs=['Emissions/extracted_data', 'Emissions/national_population_data', 'capitals.json',
+                  'Population/Population_data.csv'],
+          outputs=[Dataset('Emissions/city_emissions_data')]),
+    Stage('emissions-transform-2011-2013', 'Emissions/1.1-TransformData_ML_Testing.py',
+          inputs=['Emissions/interpolated_state_emissions_2011_2013.csv',
+                  'Emissions/interpolated_province_emissions_2011_2013.csv', 'capitals.json',
+                  'Population/Population_data.csv', 'Population/state_province_population.csv',
+                  Dataset('Emissions/city_emissions_data')],
+          outputs=[Dataset('Emissions/city_emissions_2011_2013')]),
+
+    # GDP_Data
+    Stage('gdp-usa', 'GDP_Data/0-USA_GDP_per_capita.py',
+          inputs=['GDP_Data/USA'],
+          outputs=['GDP_Data/GDP_per_Capita_USA.csv']),
+    Stage('gdp-canada', 'GDP_Data/1-CanadaGDP_to_per_capita.py',
+          inputs=['GDP_Data/Canada', 'Population/state_province_population.csv'],
+          outputs=['GDP_Data/GDP_per_Capita_Canada.csv']),
+    Stage('gdp-combine', 'GDP_Data/2-Combine_US_Canada_GDP_Data.py',
+          inputs=['GDP_Data/GDP_per_Capita_USA.csv', 'GDP_Data/GDP_per_Capita_Canada.csv'],
+          outputs=[Dataset('GDP_Data/GDP_per_Capita_Data')]),
+
+    # Weather: the downloads take over an hour, so they only run when their folder is missing or they are forced
+    Stage('weather-download-2000-2010', 'Weather/0-ExtractData.py',
+          args=['--start-year', '2000', '--end-year', '2010', '--output-folder', 'weather_data'],
+          inputs=['Weather/capitals.json'],
+          outputs=['Weather/weather_data'], external=True),
+    Stage('weather-download-2011-2013', 'Weather/0-ExtractData.py',
+          args=['--start-year', '2011', '--end-year', '2013', '--output-folder', 'weather_data_ML_testing'],
+          inputs=['Weather/capitals.json'],
+          outputs=['Weather/weather_data_ML_testing'], external=True),
+    Stage('weather-combine-2011-2013', 'Weather/1-CombineData.py',
+          inputs=['Weather/weather_data_ML_testing'],
+          outputs=[Dataset('Weather/combined_weather_data_2011_2013')]),
+
+    # Combining Data: the monthly weather is aggregated straight from the daily files of both periods
+    Stage('combine-all', '3-CombineAllData.py',
+          args=['--stream-weather'],
+          inputs=['Weather/weather_data', 'Weather/weather_data_ML_testing',
+                  Dataset('Emissions/city_emissions_data'), Dataset('Emissions/city_emissions_2011_2013'),
+                  Dataset('Population/Population_density'), Dataset('GDP_Data/GDP_per_Capita_Data')],
+          outputs=[Dataset('Combined_Data'), Dataset('Combined_Data_2011_2013')]),
+
+    # Statistical Tests
+    Stage('linear-test', 'Statistical_Testing/1-Linear_Test.py',
+          inputs=[Dataset('Combined_Data')],
+          outputs=['Statistical_Testing/Monthly_Data_Plots_Yearly_Labels_Fixed.png']),
+    Stage('temp-test', 'Statistical_Testing/1.1-Temp_Test.py',
+          inputs=[Dataset('Combined_Data')],
+          outputs=['Statistical_Testing/Yearly_Temperature_Trend.png',
+                   'Statistical_Testing/Monthly_Temperature_Time_Series.png']),
+    Stage('relationship-testing', 'Statistical_Testing/2-Relationship_Testing.py',
+          inputs=[Dataset('Combined_Data')],
+          outputs=['Statistical_Testing/Correlation_Matrix_Avg_Temp_Emissions_GDP.png']),
+    Stage('relation-plots', 'Statistical_Testing/2.1-Relation_Plots.py',
+          inputs=[Dataset('Combined_Data')],
+          outputs=['Statistical_Testing/Yearly_Trends_Temperature_Emissions_GDP.png']),
+
+    # Machine Learning Model
+    Stage('ml-model-testing', 'Machine_Learning/0-RegressionModelTesting.py',
+          inputs=[Dataset('Combined_Data'), Dataset('Combined_Data_2011_2013')],
+          outputs=['Machine_Learning/Model_Comparison.csv']),
+    Stage('ml-hyperparameter-tuning', 'Machine_Learning/1-HyperparameterTuning.py',
+          inputs=[Dataset('Combined_Data')], outputs=['Machine_Learning/tuning_trials.jsonl'],
+          args=['--search', 'halving', '--time-budget', '60'], manual=True),
+    Stage('ml-final-training', 'Machine_Learning/2-FinalModelTraining.py',
+          inputs=[Dataset('Combined_Data'), Dataset('Combined_Data_2011_2013')],
+          outputs=['Machine_Learning/model_YearMonthCO2GDP.model']),
+    Stage('ml-final-results', 'Machine_Learning/3-FinalModelResults.py',
+          inputs=[Dataset('Combined_Data'), Dataset('Combined_Data_2011_2013'),
+                  'Machine_Learning/model_YearMonthCO2GDP.model', 'Machine_Learning/model_OnlyYearMonth.xz',
+                  'Machine_Learning/model_OnlyCO2GDP.xz'],
+          outputs=['Machine_Learning/BestModelAveragedResidualsHistogram.png',
+                   'Machine_Learning/Predictions_vs_Actual_and_Residuals_Aggregated.png']),
+]
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the project scripts in dependency order, skipping the up to date ones')
+    parser.add_argument('stages', nargs='*', help='stages to bring up to date along with everything they depend on (default: all)')
+    parser.add_argument('--jobs', type=int, default=4, help='stages run at the same time')
+    parser.add_argument('--force', action='append', default=[], metavar='STAGE', help='run this stage even if it is up to date')
+    parser.add_argument('--force-all', action='store_true', help='run every selected stage')
+    parser.add_argument('--dry-run', action='store_true', help='only print which stages would run and why')
+    parser.add_argument('--list', action='store_true', help='print the stages and their dependencies')
+    args = parser.parse_args()
+
+    if args.list:
+        for name, dependencies in stage_dependencies(STAGES).items():
+            print(f"{name}: {', '.join(dependencies) or '-'}")
+        return
+
+    status = run_pipeline(STAGES, targets=args.stages, jobs=args.jobs, force=args.force,
+                          force_all=args.force_all, dry_run=args.dry_run)
+    failed = [name for name, result in status.items() if result in ('failed', 'blocked')]
+    counts = {result: list(status.values()).count(result) for result in sorted(set(status.values()))}
+    print(', '.join(f'{count} {result}' for result, count in counts.items()))
+    if failed:
+        raise SystemExit(1)
+
+if __name__ == '__main__':
+    main()